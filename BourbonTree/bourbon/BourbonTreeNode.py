@@ -3,17 +3,20 @@ import lumberjack, os, lx
 
 class BourbonTreeNode(lumberjack.TreeNode):
 
+    # TreeNode uses __slots__ to keep big trees small. Declare any extra
+    # attributes here (or leave it empty) so that nodes don't get a __dict__.
+    __slots__ = ()
+
     def __init__(self, **kwargs):
         super(self.__class__, self).__init__(**kwargs)
-        
-        self.columns['name'] = lumberjack.TreeValue()
-        self.columns['name'].input_region = None
-        self.columns['name'].value = ""
 
-        self.columns['price'] = lumberjack.TreeValue()
-        self.columns['price'].input_region = None
-        self.columns['price'].value = ""
-        
+        # TreeNode() already created a TreeValue for each blessed column.
+        for column_name in ('name', 'price'):
+            if column_name not in self.columns:
+                self.columns[column_name] = lumberjack.TreeValue()
+            if self.columns[column_name].value is None:
+                self.columns[column_name].value = ""
+
     def draggable(self):
         return True
 
@@ -21,4 +24,4 @@ class BourbonTreeNode(lumberjack.TreeNode):
         return True
         
     def tooltip(self, columnIndex):
-        return self.columns['name'].value
\ No newline at end of file
+        return self.columns['name'].value
@@ -0,0 +1,161 @@
+# python
+
+from TreeValue import TreeValue
+
+class ChildList(list):
+    """A list of sibling `TreeNode()` objects that keeps each node's `_index`
+    in sync with its position, so that `TreeNode().index` is a constant-time
+    lookup instead of a linear `list.index()` scan.
+
+    Every mutating list method is overridden to renumber the nodes from the
+    first position that changed, and to discard the cached `path` of every
+    node that was renumbered, inserted or removed. Reading is untouched and
+    as fast as a list.
+
+    `TreeNode().children` and `TreeNode().attributes` are always `ChildList`
+    objects; assigning a plain list to either converts it. Every change bumps
+    `TreeValue._tree_revision`."""
+
+    def __init__(self, nodes=()):
+        list.__init__(self, nodes)
+        if nodes:
+            self._reindex(0)
+
+    def _reindex(self, start, stop=None):
+        """Renumbers nodes from `start` (inclusive) to `stop` (exclusive)."""
+        TreeValue._tree_revision += 1
+        if stop is None:
+            stop = len(self)
+        getitem = list.__getitem__
+        for index in xrange(max(start, 0), stop):
+            node = getitem(self, index)
+            node._index = index
+            if node._path is not None:
+                node._invalidate_path()
+
+    def _detach(self, nodes):
+        """Discards cached paths for nodes that have been taken out of the list."""
+        for node in nodes:
+            if node._path is not None:
+                node._invalidate_path()
+
+    def _position(self, node):
+        """Returns the position of `node` in the list, using the node's own
+        `_index` when it is current and falling back on a scan when it isn't."""
+        index = getattr(node, '_index', None)
+        if index is not None and index < len(self) and list.__getitem__(self, index) is node:
+            return index
+        for index, sibling in enumerate(self):
+            if sibling is node:
+                return index
+        raise ValueError('%r is not in list' % node)
+
+    def _slice_start(self, key):
+        start, stop, step = key.indices(len(self))
+        return start if step == 1 else 0
+
+    # Lookup
+    # ------
+
+    def index(self, node, *args):
+        if args:
+            return list.index(self, node, *args)
+        return self._position(node)
+
+    def __contains__(self, node):
+        try:
+            self._position(node)
+        except ValueError:
+            return False
+        return True
+
+    # Mutation
+    # --------
+
+    def append(self, node):
+        TreeValue._tree_revision += 1
+        node._index = len(self)
+        if node._path is not None:
+            node._invalidate_path()
+        list.append(self, node)
+
+    def extend(self, nodes):
+        start = len(self)
+        list.extend(self, nodes)
+        self._reindex(start)
+
+    def insert(self, index, node):
+        list.insert(self, index, node)
+        length = len(self)
+        if index < 0:
+            index = max(length - 1 + index, 0)
+        self._reindex(min(index, length - 1))
+
+    def remove(self, node):
+        index = self._position(node)
+        list.__delitem__(self, index)
+        self._detach((node,))
+        self._reindex(index)
+
+    def pop(self, index=-1):
+        node = list.pop(self, index)
+        if index < 0:
+            index += len(self) + 1
+        self._detach((node,))
+        self._reindex(index)
+        return node
+
+    def move(self, old_index, new_index):
+        """Moves the node at `old_index` to `new_index`, renumbering only the
+        nodes in between. Like `insert()` after a `pop()`, negative indexes
+        count from the end and indexes past the end move the node last."""
+        node = list.pop(self, old_index)
+        list.insert(self, new_index, node)
+
+        # Where `list.insert()` actually put the node.
+        last = len(self) - 1
+        if old_index < 0:
+            old_index += last + 1
+        new_index = max(new_index + last, 0) if new_index < 0 else min(new_index, last)
+        self._reindex(min(old_index, new_index), max(old_index, new_index) + 1)
+
+    def __setitem__(self, key, value):
+        self._detach(list.__getitem__(self, key) if isinstance(key, slice) else (list.__getitem__(self, key),))
+        list.__setitem__(self, key, value)
+        if isinstance(key, slice):
+            self._reindex(self._slice_start(key))
+        else:
+            index = key if key >= 0 else key + len(self)
+            self._reindex(index, index + 1)
+
+    def __delitem__(self, key):
+        self._detach(list.__getitem__(self, key) if isinstance(key, slice) else (list.__getitem__(self, key),))
+        list.__delitem__(self, key)
+        if isinstance(key, slice):
+            self._reindex(self._slice_start(key))
+        else:
+            self._reindex(key if key >= 0 else key + len(self) + 1)
+
+    # Python 2 routes simple slices through these instead of __setitem__/__delitem__.
+    def __setslice__(self, start, stop, nodes):
+        self.__setitem__(slice(start, stop), nodes)
+
+    def __delslice__(self, start, stop):
+        self.__delitem__(slice(start, stop))
+
+    def __iadd__(self, nodes):
+        self.extend(nodes)
+        return self
+
+    def __imul__(self, count):
+        list.__imul__(self, count)
+        self._reindex(0)
+        return self
+
+    def sort(self, *args, **kwargs):
+        list.sort(self, *args, **kwargs)
+        self._reindex(0)
+
+    def reverse(self):
+        list.reverse(self)
+        self._reindex(0)
@@ -6,6 +6,10 @@ class Color(object):
         self._internal_rgb = []
         self._special = None
 
+        # Incremented on every change so that `TreeValue()` objects using this
+        # color know to re-render their cached markup.
+        self._revision = 0
+
     # Markup for rich text
     def markup(self):
         """Returns the markup string for use in treeview cells."""
@@ -25,10 +29,12 @@ class Color(object):
     def set_with_8bit(self, r, g, b):
         """Sets internal RGB with three int values between 0-255."""
         self._internal_rgb = [(n / 255) for n in (r, g, b)]
+        self._revision += 1
 
     def set_with_float(self, r, g, b):
         """Sets internal RGB with three decimal values 0.0-1.0"""
         self._internal_rgb = [r, g, b]
+        self._revision += 1
 
     def set_with_hex(self, h):
         """Sets internal RGB using a 16-bit hex code string, e.g. "#ffffff"""
@@ -38,6 +44,7 @@ class Color(object):
         r, g, b = h[:2], h[2:4], h[4:]
         r, g, b = [int(n, 16) for n in (r, g, b)]
         self._internal_rgb = [r, g, b]
+        self._revision += 1
 
     # Set Special Color
     def special_by_int():
@@ -49,12 +56,14 @@ class Color(object):
         def fset(self, value):
             self._special_by_int = value
             self._internal_rgb = []
+            self._revision += 1
         return locals()
 
     special_by_int = property(**special_by_int())
 
     def special_by_name(self, name):
         """Sets special MODO colors by human-readable names."""
+        self._revision += 1
         if name in ['gray', 'grey']:
             # 4113 is a special color for grayed-out text in MODO
             self._special = 4113
@@ -0,0 +1,247 @@
+# python
+
+from bisect import bisect_left, bisect_right
+
+
+class ColumnIndex(object):
+    """Base class for per-column value indexes, declared with an `'index'` key in
+    a column definition during `Lumberjack().bless()`:
+
+    ```
+    {'name': 'price', 'width': -1, 'index': 'sorted'}
+    {'name': 'name', 'width': -2, 'index': ['hash', 'prefix']}
+    ```
+
+    An index maps the `value` of every `TreeValue()` in its column to the nodes
+    holding it. Cells in indexed columns notify their indexes when their `value`
+    changes, and nodes are added and removed along with the tree, so lookups
+    never need to walk the tree.
+
+    Only child nodes in the tree are indexed, from the moment they're inserted
+    into it, so indexed lookups find the same nodes as a scan of the tree would.
+    Attributes, tail commands and nodes that were never inserted aren't found.
+
+    Indexes are keyed on `TreeValue()` objects, so a cell must be updated through
+    its `value` property. Replacing cells in a node's `columns` dict directly
+    bypasses the index; assign `node.columns = {...}` instead."""
+
+    # Whether `find()` answers exact matches using `==`.
+    exact = True
+
+    def __init__(self):
+        # {TreeValue(): TreeNode()}
+        self._nodes = {}
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def add(self, cell, node):
+        self._nodes[cell] = node
+        self._insert(cell, cell._value)
+
+    def remove(self, cell):
+        if self._nodes.pop(cell, None) is not None:
+            self._discard(cell, cell._value)
+
+    def update(self, cell, old_value, new_value):
+        """Called by `TreeValue().value` before the cell's value changes."""
+        if cell in self._nodes:
+            self._discard(cell, old_value)
+            self._insert(cell, new_value)
+
+    def clear(self):
+        self._nodes.clear()
+
+    def nodes(self):
+        """Every indexed node."""
+        return self._nodes.values()
+
+    def _insert(self, cell, value):
+        """Called once `cell` holds `value`, whether it was just added or changed.
+        Implement in subclasses to keep their lookup structure up to date; the
+        base class only tracks which cells are indexed, for `nodes()`."""
+        pass
+
+    def _discard(self, cell, value):
+        """Called before `cell` stops holding `value`. See `_insert()`."""
+        pass
+
+
+class HashIndex(ColumnIndex):
+    """Index for exact matches, e.g. `Lumberjack().find('name', 'Wild Turkey')`.
+    Unhashable values are kept aside and compared one by one."""
+
+    def __init__(self):
+        super(HashIndex, self).__init__()
+        self._buckets = {}
+        self._unhashable = set()
+
+    def clear(self):
+        super(HashIndex, self).clear()
+        self._buckets.clear()
+        self._unhashable.clear()
+
+    def _insert(self, cell, value):
+        try:
+            bucket = self._buckets.get(value)
+        except TypeError:
+            self._unhashable.add(cell)
+            return
+        if bucket is None:
+            bucket = self._buckets[value] = set()
+        bucket.add(cell)
+
+    def _discard(self, cell, value):
+        try:
+            bucket = self._buckets.get(value)
+        except TypeError:
+            self._unhashable.discard(cell)
+            return
+        if bucket is not None:
+            bucket.discard(cell)
+            if not bucket:
+                del self._buckets[value]
+
+    def find(self, value):
+        """Returns the nodes whose cell value equals `value`."""
+        nodes = self._nodes
+        try:
+            found = [nodes[cell] for cell in self._buckets.get(value, ())]
+        except TypeError:
+            found = []
+        found.extend(nodes[cell] for cell in self._unhashable if cell._value == value)
+        return found
+
+
+class SortedIndex(ColumnIndex):
+    """Index kept in value order, for range queries on columns like `price`,
+    e.g. `Lumberjack().find_range('price', 10, 20)`. Also answers exact matches.
+    `None` values aren't indexed.
+
+    New values are held in a pending dict and merged into the sorted lists on
+    the next query, so loading thousands of rows costs one sort rather than
+    one list insertion per row."""
+
+    # Pending values are inserted one by one below this count, sorted in above it.
+    _MERGE_THRESHOLD = 64
+
+    def __init__(self):
+        super(SortedIndex, self).__init__()
+        # Parallel lists of sort keys and the cells holding them.
+        self._keys = []
+        self._cells = []
+        # {TreeValue(): key} not yet merged into the lists above.
+        self._pending = {}
+
+    def clear(self):
+        super(SortedIndex, self).clear()
+        del self._keys[:]
+        del self._cells[:]
+        self._pending.clear()
+
+    def _key(self, value):
+        return value
+
+    def _insert(self, cell, value):
+        if value is not None:
+            self._pending[cell] = self._key(value)
+
+    def _merge(self):
+        pending = self._pending
+        if not pending:
+            return
+        keys, cells = self._keys, self._cells
+        if len(pending) < self._MERGE_THRESHOLD:
+            for cell, key in pending.iteritems():
+                position = bisect_right(keys, key)
+                keys.insert(position, key)
+                cells.insert(position, cell)
+        else:
+            keys.extend(pending.itervalues())
+            cells.extend(pending.iterkeys())
+            # Sorting positions rather than (key, cell) pairs avoids creating
+            # thousands of tuples for the garbage collector to chase.
+            order = sorted(xrange(len(keys)), key=keys.__getitem__)
+            self._keys = [keys[position] for position in order]
+            self._cells = [cells[position] for position in order]
+        pending.clear()
+
+    def _discard(self, cell, value):
+        if value is None:
+            return
+        if self._pending.pop(cell, None) is not None:
+            return
+        key = self._key(value)
+        keys, cells = self._keys, self._cells
+        position = bisect_left(keys, key)
+        while position < len(keys) and keys[position] == key:
+            if cells[position] is cell:
+                del keys[position]
+                del cells[position]
+                return
+            position += 1
+
+    def _slice(self, start, stop):
+        nodes = self._nodes
+        return [nodes[cell] for cell in self._cells[start:stop]]
+
+    def find(self, value):
+        """Returns the nodes whose cell value equals `value`."""
+        self._merge()
+        key = self._key(value)
+        return self._slice(bisect_left(self._keys, key), bisect_right(self._keys, key))
+
+    def find_range(self, low=None, high=None):
+        """Returns the nodes with `low <= value <= high`, in value order.
+        Either bound can be `None` for an open-ended range."""
+        self._merge()
+        start = 0 if low is None else bisect_left(self._keys, self._key(low))
+        stop = len(self._keys) if high is None else bisect_right(self._keys, self._key(high))
+        return self._slice(start, stop)
+
+
+class PrefixIndex(SortedIndex):
+    """Index of string values in sorted order, for prefix searches on columns
+    like `name`, e.g. `Lumberjack().find_prefix('name', 'Wild')`. Non-string
+    values are indexed by their `str()`."""
+
+    exact = False
+
+    def _key(self, value):
+        return value if isinstance(value, basestring) else str(value)
+
+    def find_prefix(self, prefix):
+        """Returns the nodes whose value starts with `prefix`, in value order."""
+        self._merge()
+        prefix = self._key(prefix)
+        start = bisect_left(self._keys, prefix)
+        stop = start
+        keys = self._keys
+        # Keys sharing the prefix are contiguous, starting at `start`.
+        while stop < len(keys) and keys[stop].startswith(prefix):
+            stop += 1
+        return self._slice(start, stop)
+
+
+COLUMN_INDEX_TYPES = {
+    'hash': HashIndex,
+    'sorted': SortedIndex,
+    'prefix': PrefixIndex
+}
+
+
+def create_column_indexes(column_definitions):
+    """Returns {column_name: (ColumnIndex(), ...)} for the columns that declare an
+    `'index'` key (a type name or a list of them, see `COLUMN_INDEX_TYPES`)."""
+    indexes = {}
+    for column in column_definitions:
+        kinds = column.get('index')
+        if not kinds:
+            continue
+        if isinstance(kinds, basestring):
+            kinds = [kinds]
+        for kind in kinds:
+            if kind not in COLUMN_INDEX_TYPES:
+                raise Exception('Unknown index type "%s" for column "%s".' % (kind, column['name']))
+        indexes[column['name']] = tuple(COLUMN_INDEX_TYPES[kind]() for kind in kinds)
+    return indexes
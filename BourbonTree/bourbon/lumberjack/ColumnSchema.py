@@ -0,0 +1,59 @@
+# python
+
+# LXiTREEJUST_* codes for the `'justify'` key of a column definition.
+JUSTIFICATIONS = {
+    'left': 0,
+    'center': 1,
+    'right': 2
+}
+
+
+class ColumnSchema(object):
+    """The column definitions passed to `Lumberjack().bless()`, compiled once
+    into tuples indexed by column, so that the treeview's column and attribute
+    callbacks are plain tuple reads:
+
+    - `names`               column name by index
+    - `indexes`             {column name: index}
+    - `widths`              width by index, as in the definition
+    - `justifications`      LXiTREEJUST_* code by index (`'justify'` key, default left)
+    - `icon_resources`      header icon resource by index, `""` if none
+    - `definitions`         the original column dictionaries
+
+    Columns can't change once blessed, so neither can the schema. Malformed
+    definitions raise an exception at `bless()` rather than in the draw loop."""
+
+    __slots__ = (
+        'definitions', 'names', 'indexes', 'widths', 'justifications',
+        'icon_resources', 'primary_position'
+    )
+
+    def __init__(self, column_definitions, primary_position=0):
+        definitions = tuple(column_definitions)
+        for index, column in enumerate(definitions):
+            if 'name' not in column or 'width' not in column:
+                raise Exception('Column %d needs both a "name" and a "width".' % index)
+            if column.get('justify', 'left') not in JUSTIFICATIONS:
+                raise Exception('Unknown justification "%s" for column "%s".' % (column['justify'], column['name']))
+
+        names = tuple(column['name'] for column in definitions)
+        if len(set(names)) != len(names):
+            raise Exception('Column names must be unique: %s' % ', '.join(names))
+
+        setattr = object.__setattr__
+        setattr(self, 'definitions', definitions)
+        setattr(self, 'names', names)
+        setattr(self, 'indexes', dict((name, index) for index, name in enumerate(names)))
+        setattr(self, 'widths', tuple(column['width'] for column in definitions))
+        setattr(self, 'justifications', tuple(JUSTIFICATIONS[column.get('justify', 'left')] for column in definitions))
+        setattr(self, 'icon_resources', tuple(column.get('icon_resource') or "" for column in definitions))
+        setattr(self, 'primary_position', primary_position)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('%s is read-only.' % self.__class__.__name__)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.definitions)
@@ -0,0 +1,596 @@
+# python
+
+from array import array
+from re import search
+import gc
+from RowColor import RowColor, mROW_COLOR
+from traversal import WALKS
+
+# Per-row flags in `ColumnStore()._flags`
+fROW_SELECTED                   = 0x01
+fROW_UNSELECTABLE               = 0x02
+fROW_DELETED                    = 0x04
+
+
+class ColumnStore(object):
+    """Columnar storage for very large trees.
+
+    Instead of one `TreeNode()` per row and one `TreeValue()` per cell, each
+    column from `column_definitions` is kept in a single contiguous array, and
+    the hierarchy is kept in parallel arrays of row ids:
+
+    - `_values[column][row]`    cell value
+    - `_parents[row]`           parent row id (-1 for the root, which is row 0)
+    - `_positions[row]`         index of the row amongst its siblings
+    - `_children[row]`          `array('l')` of child row ids, or None for leaves
+    - `_states[row]`            MODO tree item state flags, including row color
+    - `_flags[row]`             selected/selectable/deleted flags
+
+    Columns are Python lists by default. A column definition with a
+    `'typecode'` key (e.g. `'d'` for float, `'l'` for int) is stored in an
+    `array.array` of that type instead, at 8 bytes per value.
+
+    Row ids never change. Deleted rows are flagged rather than removed, and
+    their slots are only reclaimed when the whole tree is cleared, so the
+    columnar backend is best suited to big, mostly-static tables.
+
+    End-users interact with `ColumnarNode()` and `ColumnarValue()` views,
+    which mimic the `TreeNode()` and `TreeValue()` API."""
+
+    def __init__(self, column_definitions):
+        self._column_definitions = column_definitions
+        self._names = tuple(column['name'] for column in column_definitions)
+        self._column_index = dict((name, n) for n, name in enumerate(self._names))
+        self._typecodes = tuple(column.get('typecode') for column in column_definitions)
+        self._defaults = tuple(0 if typecode else None for typecode in self._typecodes)
+        self.clear()
+
+    def clear(self):
+        """Removes every row except the root, reclaiming all storage."""
+        self._values = [array(typecode) if typecode else [] for typecode in self._typecodes]
+        self._parents = array('l')
+        self._positions = array('l')
+        self._states = array('l')
+        self._flags = bytearray()
+        self._children = []
+
+        # Row 0 is the (invisible) root.
+        self.add_rows(-1, [self._defaults])
+
+    # Rows
+    # ----
+
+    def __len__(self):
+        """Number of row slots, including the root and deleted rows."""
+        return len(self._parents)
+
+    def add_rows(self, parent, rows, index=None):
+        """Appends rows to the store and makes them children of `parent` at
+        `index` (appended if None). Returns the new row ids.
+
+        :param rows:    iterable of tuples of values in column order (one value
+                        per column), or dicts of {column_name: value}. Columns
+                        missing from either get the column's default."""
+        # Nothing allocated here can be garbage yet. See `Lumberjack().add_children()`.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._add_rows(parent, rows, index)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    def _add_rows(self, parent, rows, index):
+        rows = rows if isinstance(rows, list) else list(rows)
+        first = len(self._parents)
+        count = len(rows)
+        if not count:
+            return range(first, first)
+
+        # Short tuples would throw every later row out of line in the columns
+        # they leave out.
+        width = len(self._names)
+        if any(not isinstance(row, dict) and len(row) < width for row in rows):
+            defaults = self._defaults
+            rows = [
+                row if isinstance(row, dict) or len(row) >= width else tuple(row) + defaults[len(row):]
+                for row in rows
+            ]
+
+        # Fill each column in one go rather than row by row.
+        if any(isinstance(row, dict) for row in rows):
+            for n, column in enumerate(self._values):
+                name, default = self._names[n], self._defaults[n]
+                column.extend(
+                    row.get(name, default) if isinstance(row, dict) else row[n]
+                    for row in rows
+                )
+        else:
+            for column, values in zip(self._values, zip(*rows)):
+                column.extend(values)
+
+        self._parents.extend(array('l', [parent]) * count)
+        self._positions.extend(array('l', [0]) * count)
+        self._states.extend(array('l', [0]) * count)
+        self._flags.extend(bytearray(count))
+        self._children.extend([None] * count)
+
+        new_rows = range(first, first + count)
+        if parent >= 0:
+            siblings = self._children[parent]
+            if siblings is None:
+                siblings = self._children[parent] = array('l')
+            if index is None or index >= len(siblings):
+                index = len(siblings)
+            siblings[index:index] = array('l', new_rows)
+            self._renumber(parent, index)
+
+        return new_rows
+
+    def _renumber(self, parent, start, stop=None):
+        """Updates `_positions` for the children of `parent` from `start`."""
+        siblings = self._children[parent]
+        if siblings is None:
+            return
+        positions = self._positions
+        stop = len(siblings) if stop is None else stop
+        for position in xrange(start, stop):
+            positions[siblings[position]] = position
+
+    def move_row(self, row, index):
+        """Moves `row` to `index` amongst its siblings. Negative indexes count
+        from the end, and indexes past the end move the row last."""
+        parent = self._parents[row]
+        siblings = self._children[parent]
+        old_index = self._positions[row]
+        siblings.pop(old_index)
+        siblings.insert(index, row)
+
+        # Where `insert()` actually put the row. See `ChildList().move()`.
+        last = len(siblings) - 1
+        index = max(index + last, 0) if index < 0 else min(index, last)
+        self._renumber(parent, min(old_index, index), max(old_index, index) + 1)
+
+    def delete_row(self, row):
+        """Deletes `row`, moving its children into its place under its parent."""
+        parent = self._parents[row]
+        siblings = self._children[parent]
+        position = self._positions[row]
+
+        children = self._children[row]
+        if children is not None:
+            for child in children:
+                self._parents[child] = parent
+            siblings[position:position + 1] = children
+        else:
+            del siblings[position]
+
+        self._children[row] = None
+        self._flags[row] |= fROW_DELETED
+        self._renumber(parent, position)
+
+    def delete_descendants(self, row):
+        """Deletes every row below `row`."""
+        if row == 0:
+            self.clear()
+            return
+
+        stack = [self._children[row]]
+        self._children[row] = None
+        flags = self._flags
+        while stack:
+            children = stack.pop()
+            if children is None:
+                continue
+            for child in children:
+                flags[child] |= fROW_DELETED
+                stack.append(self._children[child])
+                self._children[child] = None
+
+    def live_rows(self, row=0):
+        """Yields every row below `row` in tree order."""
+        children = self._children
+        stack = [(children[row], 0)]
+        while stack:
+            siblings, position = stack.pop()
+            if siblings is None or position >= len(siblings):
+                continue
+            child = siblings[position]
+            stack.append((siblings, position + 1))
+            stack.append((children[child], 0))
+            yield child
+
+    # Cells
+    # -----
+
+    def display_string(self, row, column):
+        """Returns the string to display for a cell, straight from the column array."""
+        value = self._values[column][row]
+        if value is None:
+            return ' '
+        if hasattr(value, '__call__'):
+            value = value()
+        # Empty cells render as 3px slivers in MODO. See `TreeValue().display_value`.
+        return str(value) or ' '
+
+    def child_count(self, row):
+        children = self._children[row]
+        return len(children) if children is not None else 0
+
+    def path(self, row):
+        path = []
+        parents = self._parents
+        positions = self._positions
+        while parents[row] >= 0:
+            path.append(positions[row])
+            row = parents[row]
+        path.reverse()
+        return path
+
+    def node(self, row):
+        """Returns a `ColumnarNode()` view of `row`."""
+        return ColumnarNode(self, row)
+
+
+class ColumnarChildren(object):
+    """Read-only sequence of `ColumnarNode()` views over a row's children."""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __len__(self):
+        return self._store.child_count(self._row)
+
+    def __getitem__(self, index):
+        children = self._store._children[self._row]
+        if children is None:
+            raise IndexError('list index out of range')
+        if isinstance(index, slice):
+            return [ColumnarNode(self._store, children[n]) for n in xrange(*index.indices(len(children)))]
+        return ColumnarNode(self._store, children[index])
+
+    def __iter__(self):
+        store = self._store
+        for row in store._children[self._row] or ():
+            yield ColumnarNode(store, row)
+
+
+class ColumnarNodes(object):
+    """Read-only sequence of `ColumnarNode()` views over a list of row ids.
+    Views are only created as items are accessed."""
+
+    __slots__ = ('_store', '_rows')
+
+    def __init__(self, store, rows):
+        self._store = store
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return ColumnarNodes(self._store, self._rows[index])
+        return ColumnarNode(self._store, self._rows[index])
+
+    def __iter__(self):
+        store = self._store
+        for row in self._rows:
+            yield ColumnarNode(store, row)
+
+
+class ColumnarValue(object):
+    """View of a single cell in a `ColumnStore()`, with the same basic API as
+    `TreeValue()`. Columnar cells hold plain values only: no per-cell colors,
+    fonts, icons, commands or input regions."""
+
+    __slots__ = ('_store', '_row', '_column')
+
+    input_region = None
+    cell_command = None
+    batch_command = None
+    use_cell_command_for_display = False
+    tooltip = None
+
+    def __init__(self, store, row, column):
+        self._store = store
+        self._row = row
+        self._column = column
+
+    def value():
+        doc = "The actual cell value, read from and written to the column array."
+        def fget(self):
+            return self._store._values[self._column][self._row]
+        def fset(self, value):
+            self._store._values[self._column][self._row] = value
+        return locals()
+
+    value = property(**value())
+
+    def display_value():
+        doc = "The value as it will be displayed in the treeview."
+        def fget(self):
+            return self._store.display_string(self._row, self._column)
+        return locals()
+
+    display_value = property(**display_value())
+
+
+class ColumnarColumns(object):
+    """Dict-like view of a row's cells, keyed by column name. Assigning to a key
+    sets the cell value, e.g. `node.columns['name'] = 'Wild Turkey'`."""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store, row):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, name):
+        return ColumnarValue(self._store, self._row, self._store._column_index[name])
+
+    def __setitem__(self, name, value):
+        self._store._values[self._store._column_index[name]][self._row] = value
+
+    def __contains__(self, name):
+        return name in self._store._column_index
+
+    def __iter__(self):
+        return iter(self._store._names)
+
+    def keys(self):
+        return list(self._store._names)
+
+    def get(self, name, default=None):
+        if name in self._store._column_index:
+            return self[name]
+        return default
+
+
+class ColumnarNode(object):
+    """Lightweight view of a row in a `ColumnStore()`. Implements the parts of the
+    `TreeNode()` API that a treeview needs, so a `ColumnarLumberjack()` can be
+    used the same way as a `Lumberjack()`.
+
+    Views are created on demand and hold nothing but a row id, so two views of
+    the same row compare equal. `children` returns a read-only sequence; use
+    `add_child()`, `add_children()`, `delete()` and `index` to edit the tree."""
+
+    __slots__ = ('_store', '_row')
+
+    _controller = None
+    _column_definitions = []
+
+    def __init__(self, store=None, row=0, **kwargs):
+        # The root view is created during `bless()`, and creates the store.
+        if 'column_definitions' in kwargs:
+            ColumnarNode._column_definitions = kwargs['column_definitions']
+            store = ColumnStore(kwargs['column_definitions'])
+
+        if 'controller' in kwargs:
+            ColumnarNode._controller = kwargs['controller']
+
+        self._store = store
+        self._row = row
+
+    def __eq__(self, other):
+        return isinstance(other, ColumnarNode) and other._row == self._row and other._store is self._store
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        return hash((id(self._store), self._row))
+
+    def __repr__(self):
+        return '<%s row %d>' % (self.__class__.__name__, self._row)
+
+    # Internals shared with TreeNode
+    # ------------------------------
+
+    def _selected():
+        def fget(self):
+            return bool(self._store._flags[self._row] & fROW_SELECTED)
+        def fset(self, value):
+            if value:
+                self._store._flags[self._row] |= fROW_SELECTED
+            else:
+                self._store._flags[self._row] &= ~fROW_SELECTED
+        return locals()
+
+    _selected = property(**_selected())
+
+    @property
+    def _selectable(self):
+        return not self._store._flags[self._row] & fROW_UNSELECTABLE
+
+    @property
+    def _parent(self):
+        parent = self._store._parents[self._row]
+        return ColumnarNode(self._store, parent) if parent >= 0 else None
+
+    @property
+    def _index(self):
+        return self._store._positions[self._row]
+
+    @property
+    def _children(self):
+        return ColumnarChildren(self._store, self._row)
+
+    # PROPERTIES
+    # ----------
+
+    parent = _parent
+    children = _children
+    attributes = ()
+    _attributes = ()
+    tail_commands = ()
+    is_attribute = False
+    input_region = None
+
+    @property
+    def column_definitions(self):
+        return self._store._column_definitions
+
+    @property
+    def columns(self):
+        return ColumnarColumns(self._store, self._row)
+
+    def index():
+        doc = "The index of the node amongst its siblings."
+        def fget(self):
+            return self._store._positions[self._row] if self._row else 0
+        def fset(self, index):
+            self._store.move_row(self._row, index)
+        return locals()
+
+    index = property(**index())
+
+    @property
+    def path(self):
+        return self._store.path(self._row)
+
+    def selected():
+        doc = "Whether the node is selected in the GUI. (boolean)"
+        def fget(self):
+            return self._selected
+        def fset(self, value):
+            if value:
+                self._controller._apply_selection(select=(self,))
+            else:
+                self._controller._apply_selection(deselect=(self,))
+        return locals()
+
+    selected = property(**selected())
+
+    def selectable():
+        doc = "Whether the node is selectable in the GUI. (boolean)"
+        def fget(self):
+            return self._selectable
+        def fset(self, value):
+            if value:
+                self._store._flags[self._row] &= ~fROW_UNSELECTABLE
+            else:
+                self._store._flags[self._row] |= fROW_UNSELECTABLE
+            self.selected = False
+        return locals()
+
+    selectable = property(**selectable())
+
+    def state():
+        doc = """Bitwise flags used to define GUI states like expand/collapse etc.
+        Includes the row color bits."""
+        def fget(self):
+            return self._store._states[self._row]
+        def fset(self, value):
+            states = self._store._states
+            states[self._row] = (value & ~mROW_COLOR) | (states[self._row] & mROW_COLOR)
+        return locals()
+
+    state = property(**state())
+
+    def add_state_flag(self, flag):
+        self._store._states[self._row] |= flag & ~mROW_COLOR
+
+    def row_color():
+        doc = "Row color name, as for `TreeNode().row_color`. Stored in the row's state bits."
+        def fget(self):
+            bits = self._store._states[self._row] & mROW_COLOR
+            for name, value in RowColor._lookup.items():
+                if value == bits and bits:
+                    return name
+            return None
+        def fset(self, value):
+            bits = RowColor.bits(value)
+            states = self._store._states
+            states[self._row] = (states[self._row] & ~mROW_COLOR) | bits
+        return locals()
+
+    row_color = property(**row_color())
+
+    @property
+    def descendants(self):
+        store = self._store
+        return [ColumnarNode(store, row) for row in store.live_rows(self._row)]
+
+    # METHODS
+    # ----------
+
+    def draggable(self):
+        return False
+
+    def canAcceptDrop(self, source_nodes):
+        return False
+
+    def tooltip(self, columnIndex):
+        return None
+
+    def walk(self, order='pre', prune=None, attributes=False, include_self=False):
+        """See `TreeNode().walk()`."""
+        return WALKS[order](self, prune, attributes, include_self)
+
+    def is_descendant_of(self, node):
+        if not isinstance(node, ColumnarNode):
+            return False
+        parents = self._store._parents
+        row = parents[self._row]
+        while row >= 0:
+            if row == node._row:
+                return True
+            row = parents[row]
+        return False
+
+    def add_child(self, **kwargs):
+        """Adds a child row and returns its view. Accepts `index`, and `columns`
+        as a dict of {column_name: value}."""
+        row = self._store.add_rows(self._row, [kwargs.get('columns', {})], kwargs.get('index'))[0]
+        return ColumnarNode(self._store, row)
+
+    def add_children(self, rows, index=None):
+        """Adds one child row per row and returns a `ColumnarNodes()` sequence of
+        their views. Rows are written straight into the column arrays.
+        See `ColumnStore().add_rows()`."""
+        return ColumnarNodes(self._store, self._store.add_rows(self._row, rows, index))
+
+    def select_descendants(self):
+        self._controller.select(self.descendants)
+
+    def deselect_descendants(self):
+        self._controller.deselect(
+            [node for node in self._controller.selected if node.is_descendant_of(self)]
+        )
+
+    def delete(self):
+        """Deletes the current row and moves its children into its place."""
+        if self._controller.primary == self:
+            self._controller.primary = None
+        if self._selected:
+            self._controller._update_selection(self, False)
+        self._store.delete_row(self._row)
+
+    def delete_descendants(self):
+        """Deletes all children, grandchildren etc from the current row."""
+        primary = self._controller.primary
+        if primary is not None and primary.is_descendant_of(self):
+            self._controller.primary = None
+
+        for node in self._controller.selected:
+            if node.is_descendant_of(self):
+                self._controller._update_selection(node, False)
+
+        self._store.delete_descendants(self._row)
+
+    def find_in_descendants(self, column_name, search_term, regex=False):
+        """Returns a list of descendant nodes with values matching search criteria,
+        in tree order, reading the column array directly. See
+        `TreeNode().find_in_descendants()`."""
+        store = self._store
+        column = store._values[store._column_index[column_name]]
+        if regex:
+            match = lambda value: value is not None and search(search_term, str(value))
+        else:
+            match = lambda value: value == search_term
+        return [ColumnarNode(store, row) for row in store.live_rows(self._row) if match(column[row])]
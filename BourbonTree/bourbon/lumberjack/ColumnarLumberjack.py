@@ -0,0 +1,205 @@
+# python
+
+import lx
+from Lumberjack import Lumberjack
+from TreeView import TreeView
+from ColumnStore import ColumnStore, ColumnarNode, fROW_SELECTED, mROW_COLOR
+from MappedColumnStore import MappedColumnStore
+
+
+class ColumnarTreeView(TreeView):
+    """`TreeView()` for a `ColumnarLumberjack()`. The draw-loop callbacks read
+    row ids, states and cell strings straight out of the `ColumnStore()` arrays
+    instead of going through node and cell objects.
+
+    `m_currentNode` is still a `ColumnarNode()` view, so the less frequent
+    callbacks (selection, tooltips, drag and drop) are inherited unchanged."""
+
+    def _target_row(self):
+        """Returns the row id targeted in the current tier, or -1."""
+        children = self._root._store._children[self.m_currentNode._row]
+        if children is None or self.m_currentIndex >= len(children):
+            return -1
+        return children[self.m_currentIndex]
+
+    def targetNode(self):
+        row = self._target_row()
+        if row < 0:
+            return None
+        return ColumnarNode(self._root._store, row)
+
+    def tree_ToParent(self):
+        store = self._root._store
+        row = self.m_currentNode._row
+        parent = store._parents[row]
+        if parent >= 0:
+            self.m_currentIndex = store._positions[row]
+            self.m_currentNode = ColumnarNode(store, parent)
+            return True
+        return False
+
+    def tree_ToChild(self):
+        store = self._root._store
+        self.m_currentNode = ColumnarNode(store, store._children[self.m_currentNode._row][self.m_currentIndex])
+
+    def tree_IsRoot(self):
+        return self.m_currentNode._row == 0
+
+    def tree_ChildIsLeaf(self):
+        return self._root._store.child_count(self.m_currentNode._row) == 0
+
+    def tree_Count(self):
+        return self._root._store.child_count(self.m_currentNode._row)
+
+    def tree_ItemState(self, guid):
+        return self._root._store._states[self._target_row()]
+
+    def tree_SetItemState(self, guid, state):
+        states = self._root._store._states
+        row = self._target_row()
+        states[row] = (state & ~mROW_COLOR) | (states[row] & mROW_COLOR)
+
+    def treeview_IsSelected(self):
+        return bool(self._root._store._flags[self._target_row()] & fROW_SELECTED)
+
+    def treeview_StoreState(self, uid):
+        lx.notimpl()
+
+    def treeview_RestoreState(self, uid):
+        lx.notimpl()
+
+    def treeview_CellCommand(self, columnIndex):
+        lx.notimpl()
+
+    def treeview_BatchCommand(self, columnIndex):
+        lx.notimpl()
+
+    def treeview_IsInputRegion(self, columnIndex, regionID):
+        # Columnar cells have no input regions.
+        return False
+
+    def attr_GetString(self, index):
+        """Returns the cell string straight from the column array. Columnar
+        cells are plain values, so there is no rich text markup."""
+        row = self._target_row()
+        store = self._root._store
+        if row < 0 or not 0 <= index < len(store._values):
+            lx.notimpl()
+        return store.display_string(row, index)
+
+
+class ColumnarLumberjack(Lumberjack):
+    """A `Lumberjack()` backed by a `ColumnStore()` instead of a tree of
+    `TreeNode()` objects. Intended for very large, mostly-static tables:
+    a row costs a few array slots instead of a node plus one `TreeValue()`
+    per cell, and the treeview reads cells straight from the column arrays.
+
+    Subclass it and bless it exactly like a `Lumberjack()`. Nodes returned by
+    the API are `ColumnarNode()` views, which support the common `TreeNode()`
+    operations: reading and writing `columns`, `state`, `row_color`,
+    `selected`, `index`, `add_child()`, `add_children()`, `delete()` and
+    `delete_descendants()`.
+
+    Not supported: per-cell styling (color, font, icon), cell commands, input
+    regions, attributes, tail commands, meta, filtering, `reconcile()`,
+    `move_nodes()`, and drag and drop.
+    Use a regular `Lumberjack()` where you need those.
+
+    Column definitions may specify a `'typecode'` to store a numeric column
+    in a compact `array.array`, e.g. `{'name': 'price', 'width': -1, 'typecode': 'd'}`.
+
+    For huge static catalogs, build the rows once, write them out with
+    `save_snapshot()`, and open them read-only with `map_snapshot()` in later
+    sessions. See `MappedColumnStore()`."""
+
+    class _TreeViewSubclass(ColumnarTreeView):
+        pass
+
+    class _RootNode(ColumnarNode):
+        __slots__ = ()
+
+        def canAcceptDrop(self, source_nodes):
+            return True
+
+    def create_child_node(self, **kwargs):
+        return kwargs['parent'].add_child(**kwargs)
+
+    def add_child(self, **kwargs):
+        """Adds a child row and returns its `ColumnarNode()` view. Accepts
+        `parent`, `index` or `path`, and `columns` as a dict of {column_name: value}."""
+        if 'path' in kwargs:
+            kwargs['parent'] = self.node_for_path(kwargs['path'][:-1])
+            kwargs['index'] = kwargs['path'][-1]
+
+        if not 'parent' in kwargs:
+            kwargs['parent'] = self.root
+        return self.create_child_node(**kwargs)
+
+    def filter(self, column_name=None, query=None, regex=False, predicate=None, case_sensitive=False):
+        raise Exception('%s does not support filtering.' % self.__class__.__name__)
+
+    def reconcile(self, parent, rows, key, children_key='children', notify=True):
+        raise Exception('%s does not support reconcile().' % self.__class__.__name__)
+
+    def move_nodes(self, nodes, dest_parent, index=None):
+        raise Exception('%s does not support move_nodes().' % self.__class__.__name__)
+
+    def save_snapshot(self, path):
+        """Writes the rows to `path` for `map_snapshot()`. Rows are renumbered
+        breadth first and deleted rows are left out; values, states and
+        selectability are kept, the selection isn't. Values in columns without a
+        `'typecode'` are saved as their display strings. Returns the number of
+        rows written, root included."""
+        return MappedColumnStore.write(self.root._store, path)
+
+    def load_snapshot(self, path):
+        raise Exception('%s maps snapshots read-only; use map_snapshot().' % self.__class__.__name__)
+
+    def map_snapshot(self, path):
+        """Replaces the rows with a read-only view of the file written by
+        `save_snapshot()` at `path`. The file is memory-mapped rather than read,
+        so this takes the same time however many rows it holds, and the treeview
+        reads cells straight from the mapping. Rows can be expanded and
+        selected, but not edited; `clear()` releases the file and makes the tree
+        editable again. See `MappedColumnStore()`."""
+        store = MappedColumnStore(self.root._store._column_definitions, path)
+        self.clear()
+        self.root._store = store
+        self.rebuild_view()
+
+    @property
+    def mapped(self):
+        """True while the rows are a read-only view of a file. See `map_snapshot()`."""
+        return isinstance(self.root._store, MappedColumnStore)
+
+    def clear(self):
+        """Deletes all rows. If a snapshot is mapped, releases it instead,
+        leaving an empty, editable store."""
+        store = self.root._store
+        if not isinstance(store, MappedColumnStore):
+            return super(ColumnarLumberjack, self).clear()
+
+        self.primary = None
+        self._selection.clear()
+        self.root._store = ColumnStore(store._column_definitions)
+        store.close()
+
+    def store_state(self, uid):
+        raise Exception('%s does not support store_state().' % self.__class__.__name__)
+
+    def restore_state(self, uid, notify=True):
+        raise Exception('%s does not support restore_state().' % self.__class__.__name__)
+
+    def undo(self):
+        raise Exception('%s does not support undo().' % self.__class__.__name__)
+
+    def redo(self):
+        raise Exception('%s does not support redo().' % self.__class__.__name__)
+
+    def add_children(self, parent, rows, index=None):
+        """Adds one child row per row to `parent`, writing the values straight
+        into the column arrays. Returns a `ColumnarNodes()` sequence of views.
+        See `Lumberjack().add_children()`."""
+        if parent is None:
+            parent = self.root
+        return parent.add_children(rows, index)
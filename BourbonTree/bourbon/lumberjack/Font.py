@@ -6,6 +6,10 @@ class Font(object):
 
     _font = None
 
+    # Incremented on every change so that `TreeValue()` objects using this
+    # font know to re-render their cached markup.
+    _revision = 0
+
     def markup(self):
         """Returns the markup string for use in treeview cells."""
         if self._font:
@@ -14,12 +18,16 @@ class Font(object):
 
     def set_bold(self):
         self._font = 'FONT_BOLD'
+        self._revision += 1
 
     def set_italic(self):
         self._font = 'FONT_ITALIC'
+        self._revision += 1
 
     def set_normal(self):
         self._font = 'FONT_NORMAL'
+        self._revision += 1
 
     def set_default(self):
         self._font = 'FONT_DEFAULT'
+        self._revision += 1
@@ -0,0 +1,394 @@
+# python
+
+from collections import deque
+from contextlib import contextmanager
+from traversal import walk_preorder
+
+# Journal entries are tuples starting with one of these opcodes, followed by
+# references to the nodes and cells involved. Nothing is copied: undoing puts
+# the very same objects back where they were.
+_VALUE = 0          # (_VALUE, cell, old value, new value)
+_ROW_COLOR = 1      # (_ROW_COLOR, node, old color, new color)
+_INSERT = 2         # (_INSERT, parent, index, nodes, is_attribute)
+_REMOVE = 3         # (_REMOVE, parent, nodes, is_attribute) - all of a node's children or attributes
+_DELETE = 4         # (_DELETE, node, parent, index, child count) - see `TreeNode().delete()`
+_MOVE = 5           # (_MOVE, nodes, ((old parent, old index), ...), new parent, new index)
+                    # - either all children or all attributes
+
+_STRUCTURAL = frozenset((_INSERT, _REMOVE, _DELETE, _MOVE))
+
+
+class Journal(object):
+    """Undo/redo history for a `Lumberjack()` tree, as enabled by its
+    `undo_budget`. Tree edits record their inverse as they happen:
+
+    - cell `value` changes and `row_color` changes
+    - nodes added with `add_child()`, `add_children()` or `add_attribute()`
+    - `delete()`, `delete_descendants()` and `delete_attributes()`
+    - moves with `path`, `index` or `Lumberjack().move_nodes()`, and attributes
+      reordered with `index`
+
+    Each entry is a small tuple referring to the nodes and cells involved, so
+    deleted nodes are kept rather than copied, and undoing or redoing costs
+    time in proportion to the edit, not to the tree. Edits are grouped into
+    transactions with `Lumberjack().transaction()`; edits made outside of one
+    are a transaction each.
+
+    The journal keeps at most `undo_budget` units of history, evicting the
+    oldest transactions first. A value or color change costs one unit, and
+    structural edits one per node they add, move or keep alive after deletion.
+
+    Edits made by changing `children` or `attributes` lists directly are not
+    recorded. Neither are `reconcile()`, `load_snapshot()` or `clear()`,
+    which clear the journal instead."""
+
+    __slots__ = ('_controller', '_undo', '_redo', '_cost', '_open', '_marks', '_label', '_paused')
+
+    def __init__(self, controller):
+        self._controller = controller
+
+        # Committed transactions, oldest first: (label, entries, cost)
+        self._undo = deque()
+        self._redo = []
+        self._cost = 0
+
+        # Entries of the transaction being recorded, with the position at
+        # which each nested level started.
+        self._open = []
+        self._marks = []
+        self._label = None
+
+        # Set while undoing or redoing, or while running edits that can't be undone.
+        self._paused = 0
+
+    def __len__(self):
+        return len(self._undo)
+
+    def cost():
+        doc = """Units of history currently kept. See `Lumberjack().undo_budget`."""
+        def fget(self):
+            return self._cost
+        return locals()
+
+    cost = property(**cost())
+
+    def can_undo():
+        doc = "True if there is a transaction to undo."
+        def fget(self):
+            return bool(self._undo)
+        return locals()
+
+    can_undo = property(**can_undo())
+
+    def can_redo():
+        doc = "True if there is an undone transaction to redo."
+        def fget(self):
+            return bool(self._redo)
+        return locals()
+
+    can_redo = property(**can_redo())
+
+    def undo_label():
+        doc = "Label of the transaction `undo()` would undo, e.g. for an Edit menu."
+        def fget(self):
+            return self._undo[-1][0] if self._undo else None
+        return locals()
+
+    undo_label = property(**undo_label())
+
+    def redo_label():
+        doc = "Label of the transaction `redo()` would redo."
+        def fget(self):
+            return self._redo[-1][0] if self._redo else None
+        return locals()
+
+    redo_label = property(**redo_label())
+
+    def clear(self):
+        """Forgets all history, e.g. once the tree has been rebuilt from scratch.
+        Transactions still being recorded start over empty."""
+        self._undo.clear()
+        del self._redo[:]
+        del self._open[:]
+        self._marks = [0] * len(self._marks)
+        self._cost = 0
+
+    @contextmanager
+    def paused(self):
+        """Runs the block without recording anything."""
+        self._paused += 1
+        try:
+            yield
+        finally:
+            self._paused -= 1
+
+    # Transactions
+    # ------------
+
+    def begin(self, label=None):
+        """Starts a transaction, or a nested level of the current one. See
+        `Lumberjack().transaction()`."""
+        if not self._marks:
+            self._label = label
+        elif self._label is None:
+            self._label = label
+        self._marks.append(len(self._open))
+
+    def commit(self):
+        """Ends the current level. Once the outermost level ends, its entries
+        become one transaction that `undo()` undoes at once."""
+        self._marks.pop()
+        if not self._marks:
+            self._push(self._label)
+
+    def rollback(self):
+        """Undoes and drops the entries recorded since the current level began,
+        then ends it."""
+        mark = self._marks.pop()
+        entries = self._open[mark:]
+        del self._open[mark:]
+        with self.paused():
+            self._apply(reversed(entries), _UNDO)
+        if not self._marks:
+            self._push(self._label)
+
+    def _push(self, label):
+        entries = self._open
+        self._open = []
+        self._label = None
+        if not entries:
+            return
+
+        cost = 0
+        for entry in entries:
+            cost += _cost(entry)
+        self._undo.append((label, tuple(entries), cost))
+        self._cost += cost
+
+        # A new edit makes the undone ones unreachable.
+        for transaction in self._redo:
+            self._cost -= transaction[2]
+        del self._redo[:]
+
+        self._evict()
+
+    def _evict(self):
+        budget = self._controller.undo_budget
+        if budget is None:
+            return
+        while self._cost > budget and self._undo:
+            self._cost -= self._undo.popleft()[2]
+
+    def _record(self, entry):
+        self._open.append(entry)
+        if not self._marks:
+            self._push(None)
+
+    # Undo and redo
+    # -------------
+
+    def undo(self):
+        """Undoes the most recent transaction. Returns False if there was none."""
+        if not self._undo or self._marks:
+            return False
+        transaction = self._undo.pop()
+        with self.paused():
+            self._apply(reversed(transaction[1]), _UNDO)
+        self._redo.append(transaction)
+        return True
+
+    def redo(self):
+        """Redoes the most recently undone transaction. Returns False if there was none."""
+        if not self._redo or self._marks:
+            return False
+        transaction = self._redo.pop()
+        with self.paused():
+            self._apply(transaction[1], _REDO)
+        self._undo.append(transaction)
+        return True
+
+    def _apply(self, entries, direction):
+        controller = self._controller
+        structural = moved = False
+        for entry in entries:
+            opcode = entry[0]
+            direction[opcode](controller, entry)
+            if opcode in _STRUCTURAL:
+                structural = True
+                moved = moved or opcode == _MOVE
+
+        if structural:
+            if moved:
+                controller.path_event()
+            controller.rebuild_view()
+        else:
+            controller.refresh_view()
+
+    # Recording
+    # ---------
+
+    def value_changed(self, cell, old, new):
+        """Called by `TreeValue().value` before it changes."""
+        if self._paused or old is new:
+            return
+        # Repeated edits of the same cell within a transaction, e.g. while
+        # dragging a slider, only need the first old value.
+        entries = self._open
+        if entries and self._marks and len(entries) > self._marks[-1]:
+            last = entries[-1]
+            if last[0] == _VALUE and last[1] is cell:
+                entries[-1] = (_VALUE, cell, last[2], new)
+                return
+        self._record((_VALUE, cell, old, new))
+
+    def row_color_changed(self, node, old, new):
+        """Called by `TreeNode().row_color` before it changes."""
+        if not self._paused:
+            self._record((_ROW_COLOR, node, old, new))
+
+    def inserted(self, parent, index, nodes, is_attribute=False):
+        """Called once `nodes` have been inserted at `index` in the parent's
+        children (or attributes)."""
+        if not self._paused and nodes:
+            self._record((_INSERT, parent, index, tuple(nodes), is_attribute))
+
+    def removed(self, parent, nodes, is_attribute=False):
+        """Called once all of the parent's children (or attributes) have been deleted."""
+        if not self._paused and nodes:
+            self._record((_REMOVE, parent, tuple(nodes), is_attribute))
+
+    def deleted(self, node, parent, index, count):
+        """Called once `node`, formerly at `index` amongst the parent's children
+        or attributes, has been deleted and its `count` children have taken its
+        place."""
+        if not self._paused:
+            self._record((_DELETE, node, parent, index, count))
+
+    def moved(self, nodes, places, parent, index):
+        """Called once `nodes` have been moved from their `places`, (old parent,
+        old index) pairs, to consecutive positions from `index` in the parent's
+        children (or attributes, if the nodes are attributes)."""
+        if not self._paused and nodes:
+            self._record((_MOVE, tuple(nodes), tuple(places), parent, index))
+
+
+def _cost(entry):
+    opcode = entry[0]
+    if opcode == _INSERT:
+        return len(entry[3])
+    if opcode == _REMOVE:
+        # Deleted subtrees are kept alive by the journal.
+        return sum(1 for root in entry[2] for node in walk_preorder(root, attributes=True, include_root=True))
+    if opcode == _MOVE:
+        return len(entry[1])
+    return 1
+
+
+def _siblings(parent, is_attribute):
+    return parent.attributes if is_attribute else parent.children
+
+
+# Undo
+# ----
+
+def _undo_value(controller, entry):
+    entry[1].value = entry[2]
+
+
+def _undo_row_color(controller, entry):
+    entry[1].row_color = entry[2]
+
+
+def _undo_insert(controller, entry):
+    _, parent, index, nodes, is_attribute = entry
+    del _siblings(parent, is_attribute)[index:index + len(nodes)]
+    controller._release_nodes(nodes)
+
+
+def _undo_remove(controller, entry):
+    _, parent, nodes, is_attribute = entry
+    _siblings(parent, is_attribute).extend(nodes)
+    controller._restore_nodes(nodes)
+
+
+def _undo_delete(controller, entry):
+    _, node, parent, index, count = entry
+    if node._is_attribute:
+        parent.attributes.insert(index, node)
+    else:
+        # Take the node's children back from where they were spliced in.
+        siblings = parent.children
+        children = siblings[index:index + count]
+        siblings[index:index + count] = [node]
+        if children:
+            node.children.extend(children)
+            for child in children:
+                child.parent = node
+    node.parent = parent
+    controller._restore_nodes((node,), subtrees=False)
+
+
+def _undo_move(controller, entry):
+    _, nodes, places, parent, index = entry
+    is_attribute = nodes[0]._is_attribute
+    del _siblings(parent, is_attribute)[index:index + len(nodes)]
+    # Nodes go back in order of their old positions, so that each one lands
+    # exactly where it was.
+    for n in sorted(xrange(len(nodes)), key=lambda n: places[n][1]):
+        node = nodes[n]
+        old_parent, old_index = places[n]
+        _siblings(old_parent, is_attribute).insert(old_index, node)
+        node.parent = old_parent
+
+
+# Redo
+# ----
+
+def _redo_value(controller, entry):
+    entry[1].value = entry[3]
+
+
+def _redo_row_color(controller, entry):
+    entry[1].row_color = entry[3]
+
+
+def _redo_insert(controller, entry):
+    _, parent, index, nodes, is_attribute = entry
+    for node in nodes:
+        node.parent = parent
+    _siblings(parent, is_attribute)[index:index] = nodes
+    controller._restore_nodes(nodes)
+
+
+def _redo_remove(controller, entry):
+    if entry[3]:
+        entry[1].delete_attributes()
+    else:
+        entry[1].delete_descendants()
+
+
+def _redo_delete(controller, entry):
+    entry[1].delete()
+
+
+def _redo_move(controller, entry):
+    _, nodes, places, parent, index = entry
+    is_attribute = nodes[0]._is_attribute
+    moving = set(nodes)
+    for old_parent in set(old_parent for old_parent, old_index in places):
+        siblings = _siblings(old_parent, is_attribute)
+        siblings[:] = [node for node in siblings if node not in moving]
+    _siblings(parent, is_attribute)[index:index] = nodes
+    for node in nodes:
+        node.parent = parent
+
+
+_UNDO = {
+    _VALUE: _undo_value, _ROW_COLOR: _undo_row_color, _INSERT: _undo_insert,
+    _REMOVE: _undo_remove, _DELETE: _undo_delete, _MOVE: _undo_move
+}
+
+_REDO = {
+    _VALUE: _redo_value, _ROW_COLOR: _redo_row_color, _INSERT: _redo_insert,
+    _REMOVE: _redo_remove, _DELETE: _redo_delete, _MOVE: _redo_move
+}
@@ -1,10 +1,24 @@
 # python
 
 from random import randint
+import gc
+from collections import OrderedDict
+from itertools import count
+from weakref import WeakValueDictionary
+from contextlib import contextmanager
 import lx, lxifc, traceback
 import json
 from TreeNode import TreeNode
+from TreeValue import TreeValue
 from TreeView import TreeView
+from ColumnSchema import ColumnSchema
+from ColumnIndex import SortedIndex, PrefixIndex, create_column_indexes
+from TreeFilter import TreeFilter
+from Reconciliation import Reconciliation
+from TreeState import TreeState
+from Journal import Journal
+import snapshot
+from traversal import WALKS, walk_preorder, walk_postorder
 
 class DropServer(lxifc.Drop):
 
@@ -17,18 +31,17 @@ class DropServer(lxifc.Drop):
         vaDest = lx.object.ValueArray()
         vaDest.set(dest)
 
-        source_paths = [json.loads(vaSource.GetString(idx)) for idx in xrange(1, vaSource.Count())]
-        dest_path = json.loads(vaDest.GetString(1))
+        # Check unique key
+        if not self.check_key(vaSource) or not self.check_key(vaDest):
+            return
 
         lumberjack = Lumberjack.final_class()
-        source_nodes = [lumberjack.node_for_path(path) for path in source_paths]
-        dest_node_parent = lumberjack.node_for_path(dest_path[:-1])
-
-        if not dest_node_parent.canAcceptDrop(source_nodes):
+        source_nodes = self.source_nodes(lumberjack, vaSource)
+        dest_node_parent, dest_index = self.destination(lumberjack, vaDest)
+        if source_nodes is None or dest_node_parent is None:
             return
 
-        # Check unique key
-        if not self.check_key(vaSource) or not self.check_key(vaDest):
+        if not dest_node_parent.canAcceptDrop(source_nodes):
             return
 
         # Create AddDropAction interface to modify action list
@@ -51,21 +64,33 @@ class DropServer(lxifc.Drop):
         if not self.check_key(vaSource) or not self.check_key(vaDest):
             return
 
-        source_paths = [json.loads(vaSource.GetString(idx)) for idx in xrange(1, vaSource.Count())]
-        dest_path = json.loads(vaDest.GetString(1))
-
         lumberjack = Lumberjack.final_class()
 
         # Collect all selected children
-        source_nodes = [lumberjack.node_for_path(path) for path in source_paths]
+        source_nodes = self.source_nodes(lumberjack, vaSource)
+        dest_node_parent, dest_index = self.destination(lumberjack, vaDest)
+        if source_nodes is None or dest_node_parent is None:
+            return
 
-        # Move children
-        for source in source_nodes:
-            source.path = dest_path
+        with lumberjack.batch():
+            lumberjack.move_nodes(source_nodes, dest_node_parent, dest_index)
+            lumberjack.on_drag_drop(source_nodes)
+            lumberjack.rebuild_view()
 
-        lumberjack.on_drag_drop(source_nodes)
+    @staticmethod
+    def source_nodes(lumberjack, va):
+        """Resolves the node ids in a drag source payload. Returns `None` if any
+        of them has been deleted since the drag started."""
+        nodes = [lumberjack.node_for_id(int(va.GetString(idx))) for idx in xrange(1, va.Count())]
+        if any(node is None for node in nodes):
+            return None
+        return nodes
 
-        lumberjack.rebuild_view()
+    @staticmethod
+    def destination(lumberjack, va):
+        """Resolves a drop destination payload to (parent node, index)."""
+        parent_id, index = json.loads(va.GetString(1))
+        return lumberjack.node_for_id(parent_id), index
 
     def drop_Preview(self, source, dest, action, draw):
         lx.notimpl()
@@ -154,11 +179,29 @@ class Lumberjack(object):
     `Lumberjack().primary # most recently selected node (usually)`
     `Lumberjack().all_nodes # all nodes in tree`
     `Lumberjack().find(column_name, search_term) # list of matches`
+    `Lumberjack().find_range(column_name, low, high) # low <= value <= high`
+    `Lumberjack().find_prefix(column_name, prefix)`
+    `Lumberjack().filter(column_name, query) # show matches and their ancestors`
+    `Lumberjack().clear_filter()`
     'Lumberjack().clear_selection()'
+    `Lumberjack().select(nodes) # also deselect(), replace_selection()`
+    `Lumberjack().select_range(first_node, last_node)`
+    `Lumberjack().select_where(predicate)`
 
     Rebuild and Refresh methods are built into the various manipulation
     methods in Lumberjack, so there is no need to manually Refresh or Rebuild
-    the treeview."""
+    the treeview.
+
+    To make many changes at once, wrap them in a batch. Rebuilds and refreshes
+    requested inside the block are coalesced into a single notification.
+
+    `with Lumberjack().batch(): ...`
+
+    With an `undo_budget`, edits are journaled and can be undone. Group them
+    into transactions to undo them in one step.
+
+    `with Lumberjack().transaction('Rename'): ...`
+    `Lumberjack().undo() # also redo()`"""
 
     # A given MODO instance may create multiple TreeView class instances for display
     # in the UI. As such, we use class variables within the TreeView to keep those
@@ -191,12 +234,41 @@ class Lumberjack(object):
     _nice_name = ""
     _viewport_type = ""
     _primary = None
+    _selection = OrderedDict()
+    _batch_depth = 0
+    _batch_shape_changed = False
+    _batch_attributes_changed = False
+    _lazy_loaded = OrderedDict()
+    _lazy_loaded_count = 0
+    _schema = None
+    _column_indexes = {}
+    _filter = None
+    _node_registry = WeakValueDictionary()
+    _node_ids = count(1)
+    _stored_states = {}
+    _journal = None
     _on_bless = None
     final_class = None
     _drop_server_unique_key = None
     _dropserver_username = None
     _dropsource_command = None
 
+    # Maximum number of nodes created by `TreeNode().child_provider` callables to
+    # keep in memory. Once exceeded, nodes with child providers drop their children
+    # when collapsed. `None` keeps everything. See `evict_on_collapse()`.
+    lazy_node_budget = None
+
+    # Column whose values identify nodes in the expand and selection state stored
+    # for each treeview, so the state survives the tree being cleared and rebuilt.
+    # Values should be unique; a `'hash'` index on the column makes restoring cheap.
+    # `None` uses `TreeNode().id`. See `store_state()`.
+    state_key = None
+
+    # Units of undo history to keep: one per value or `row_color` change, one per
+    # node added, moved or deleted. Oldest transactions are evicted first.
+    # `None` keeps no history at all. Set before `bless()`. See `transaction()`.
+    undo_budget = None
+
     def __init__(self, **kwargs):
         """A lumberjack class is a self-contained model-view-controller system.
 
@@ -243,6 +315,10 @@ class Lumberjack(object):
                                 changes only update when a new treeview is initiated. Don't expect to change
                                 columns on the fly.
 
+                                Columns can declare value indexes with an 'index' key ('hash', 'sorted',
+                                'prefix', or a list of them) to speed up `find()`, `find_range()` and
+                                `find_prefix()`. See `ColumnIndex()`.
+
                                 Example:
 
                                 ```
@@ -260,7 +336,8 @@ class Lumberjack(object):
                                                 'width':20
                                             }, {
                                                 'name':'value',
-                                                'width':-3
+                                                'width':-3,
+                                                'index':['hash', 'sorted']
                                             }
                                         ]
                                 }
@@ -312,9 +389,29 @@ class Lumberjack(object):
         if Lumberjack._blessed:
             raise Exception('%s class has already been blessed.' % cls.__name__)
 
+        # Compiled once, so the treeview never has to dig through the definitions.
+        Lumberjack._schema = ColumnSchema(
+            column_definitions.get('list', []),
+            column_definitions.get('primary_position', 0)
+        )
+
+        # Value indexes for columns that declare them. See `ColumnIndex()`.
+        Lumberjack._column_indexes = create_column_indexes(column_definitions.get('list', []))
+
+        # Region names are resolved to regionIDs as they're assigned to nodes and
+        # cells, so this has to be in place before any node exists.
+        region_ids = {}
+        for region_id, region in enumerate(input_regions):
+            region_ids.setdefault(region, region_id)
+        TreeValue._region_ids = region_ids
+
+        # Edits are only journaled if undo history is wanted. See `Journal()`.
+        if cls.undo_budget is not None:
+            Lumberjack._journal = TreeValue._journal = Journal(cls())
+
         # The `TreeNode()` object is the root of the tree, and all other nodes
         # will be children of this node. The root node is NOT visible in the GUI.
-        Lumberjack._root = Lumberjack._RootNode(
+        Lumberjack._root = cls._RootNode(
             column_definitions = column_definitions.get('list', []),
             controller = cls()
         )
@@ -324,9 +421,10 @@ class Lumberjack(object):
         cls._dropsource_command = internal_name + "_dropCmd"
 
         # Our internal handle for the view itself.
-        Lumberjack._tree_view = Lumberjack._TreeViewSubclass(
+        Lumberjack._tree_view = cls._TreeViewSubclass(
             root = Lumberjack._root,
             primary_column_position = column_definitions.get('primary_position', 0),
+            schema = Lumberjack._schema,
             input_regions = input_regions,
             controller = cls()
         )
@@ -374,12 +472,12 @@ class Lumberjack(object):
         try:
             # Remember: we've created a Lumberjack-specific subclass of our `TreeView()` class for
             # the blessing, just in case more than one Lumberjack subclass exists.
-            lx.bless(Lumberjack._TreeViewSubclass, server_name, tree_view_tags)
+            lx.bless(cls._TreeViewSubclass, server_name, tree_view_tags)
 
             # Make sure it doesn't happen again.
             Lumberjack._blessed = True
 
-            lx.bless(Lumberjack._DropServer, cls._dropserver_username, drop_server_tags)
+            lx.bless(cls._DropServer, cls._dropserver_username, drop_server_tags)
 
         except:
             traceback.print_exc()
@@ -404,10 +502,19 @@ class Lumberjack(object):
         else:
             raise Exception('%s: Root cannot be accessed before `bless()`.' % self.__class__.__name__)
 
+    @property
+    def selected(self):
+        """Returns the selected `TreeNode()` objects in the order they were selected.
+
+        Read from the controller's selection index, which `TreeNode().selected`
+        keeps current, so the cost depends on the size of the selection rather
+        than the size of the tree."""
+        return list(self._selection)
+
     @property
     def selected_descendants(self):
-        """Returns the selected `TreeNode()` objects in the tree."""
-        return self.root.selected_descendants
+        """Returns the selected `TreeNode()` objects in the tree, in tree order."""
+        return sorted((node for node in self._selection if not node.is_attribute), key=lambda node: node.path)
 
     @property
     def selected_children(self):
@@ -419,14 +526,125 @@ class Lumberjack(object):
         Implement in Lumberjack subclass to fire custom notifiers, etc."""
         pass
 
-    def select_event(self):
-        """Fired by `TreeNode` objects whenever the node's `selected` property is changed.
-        Implement in Lumberjack subclass to fire custom notifiers, etc."""
+    def select_event(self, added=(), removed=()):
+        """Fired once for every change to the selection, whether a single node's
+        `selected` property was set or a whole batch of nodes was (de)selected
+        using `select()`, `deselect()`, `replace_selection()`, etc.
+        Implement in Lumberjack subclass to fire custom notifiers, etc.
+
+        :param added:   list of `TreeNode()` objects that became selected
+        :param removed: list of `TreeNode()` objects that became deselected"""
         pass
 
+    def _update_selection(self, node, selected):
+        """Adds or removes `node` from the selection index without firing
+        `select_event()`. Used when nodes leave the tree."""
+        if selected:
+            self._selection[node] = None
+        else:
+            self._selection.pop(node, None)
+
+    def _apply_selection(self, select=(), deselect=()):
+        """Deselects then selects the given nodes in a single pass, updating the
+        selection index and `primary`, and fires one `select_event()` covering
+        every node that actually changed. Returns True if anything changed.
+
+        `select` must be a sequence; `deselect` can be any iterable."""
+        selection = self._selection
+        added = []
+        removed = []
+
+        for node in deselect:
+            if node._selected:
+                node._selected = False
+                selection.pop(node, None)
+                removed.append(node)
+
+        for node in select:
+            if not node._selected:
+                node._selected = True
+                selection[node] = None
+                added.append(node)
+
+        # The primary node is the most recently selected, even if it was
+        # already selected beforehand.
+        if select:
+            self.primary = select[-1]
+        elif self._primary is not None and not self._primary._selected:
+            self.primary = None
+
+        if added or removed:
+            self.select_event(added=added, removed=removed)
+            return True
+        return False
+
+    def select(self, nodes):
+        """Adds the given `TreeNode()` objects to the selection. Nodes that are
+        not `selectable` are skipped. Fires a single `select_event()`."""
+        return self._apply_selection(select=[node for node in nodes if node._selectable])
+
+    def deselect(self, nodes):
+        """Removes the given `TreeNode()` objects from the selection. Fires a
+        single `select_event()`."""
+        return self._apply_selection(deselect=nodes)
+
+    def replace_selection(self, nodes):
+        """Selects exactly the given `TreeNode()` objects, deselecting everything
+        else. Fires a single `select_event()`."""
+        nodes = [node for node in nodes if node._selectable]
+        keep = set(nodes)
+        return self._apply_selection(
+            select=nodes,
+            deselect=[node for node in self._selection if node not in keep]
+        )
+
+    def select_range(self, first, last, replace=False):
+        """Selects `first`, `last`, and every node between them in tree order
+        (i.e. top to bottom as displayed in the treeview, expanded or not).
+        Fires a single `select_event()`.
+
+        :param replace: (bool) deselect everything outside of the range"""
+        if last.path < first.path:
+            first, last = last, first
+
+        nodes = [first]
+        node = first
+        while node != last:
+            node = self._next_in_tree(node)
+            if node is None:
+                break
+            nodes.append(node)
+
+        if replace:
+            return self.replace_selection(nodes)
+        return self.select(nodes)
+
+    def select_where(self, predicate, replace=False):
+        """Selects every node in the tree for which `predicate(node)` is True.
+        Fires a single `select_event()`.
+
+        :param predicate:   callable taking a `TreeNode()` and returning a bool
+        :param replace:     (bool) deselect nodes that don't match"""
+        nodes = [node for node in self.all_nodes if predicate(node)]
+        if replace:
+            return self.replace_selection(nodes)
+        return self.select(nodes)
+
+    @staticmethod
+    def _next_in_tree(node):
+        """Returns the node after `node` in tree order, or None."""
+        if node._children:
+            return node._children[0]
+        while node._parent is not None:
+            siblings = node._parent._children
+            if node._index + 1 < len(siblings):
+                return siblings[node._index + 1]
+            node = node._parent
+        return None
+
     def clear_selection(self):
-        """Returns the selected `TreeNode()` objects in the tree."""
-        return self.root.deselect_descendants()
+        """Deselects all `TreeNode()` objects in the tree. Fires a single `select_event()`."""
+        return self._apply_selection(deselect=self.selected)
 
     def primary():
         doc = """The primary node is typically the most recently selected."""
@@ -449,6 +667,14 @@ class Lumberjack(object):
 
     column_definitions = property(**column_definitions())
 
+    def schema():
+        doc = """The `ColumnSchema()` compiled from the column definitions during bless."""
+        def fget(self):
+            return self._schema
+        return locals()
+
+    schema = property(**schema())
+
     def children():
         doc = """A list of `TreeNode()` objects that are children of the current
         node. Note that children appear under the triangular twirl in the listview
@@ -464,15 +690,15 @@ class Lumberjack(object):
     def all_nodes():
         doc = """Returns a list of all all_nodes in the tree."""
         def fget(self):
-            all_nodes = []
-            for child in self.root.children:
-                all_nodes.append(child)
-                all_nodes.extend(child.descendants)
-            return all_nodes
+            return list(walk_preorder(self.root))
         return locals()
 
     all_nodes = property(**all_nodes())
 
+    def walk(self, order='pre', prune=None, attributes=False):
+        """Iterates over every node in the tree. See `TreeNode().walk()`."""
+        return WALKS[order](self.root, prune, attributes)
+
     def tail_commands():
         doc = """List of `TreeNode()` objects appended to the bottom of the node's list
         of children, e.g. (new group), (new form), and (new command) in Form Editor.
@@ -493,17 +719,433 @@ class Lumberjack(object):
 
         if not 'parent' in kwargs:
             kwargs['parent'] = self.root
-        newNode = self.create_child_node(**kwargs)
+        newNode = self._new_node(self.create_child_node, kwargs)
         if 'index' not in kwargs:
             kwargs['parent'].children.append(newNode)
         else:
             kwargs['parent'].children.insert(kwargs['index'], newNode)
+        if self._column_indexes:
+            self._index_inserted((newNode,))
+        if Lumberjack._journal is not None:
+            Lumberjack._journal.inserted(kwargs['parent'], newNode._index, (newNode,))
         return newNode
 
+    def add_children(self, parent, rows, index=None):
+        """Adds one child `TreeNode()` per row to `parent` in a single pass and
+        returns the new nodes. Much faster than calling `add_child()` in a loop
+        when loading large datasets.
+
+        Nodes are created with `create_child_node()`, so Lumberjack subclasses get
+        their own node class. All of the new nodes are spliced into the parent's
+        children at once.
+
+        :param parent:  `TreeNode()` to add children to (`None` for the root)
+        :param rows:    iterable of rows, each either a tuple of values in column
+                        order, or a dict of {column_name: value}. Values can also
+                        be `TreeValue()` objects, which are used as-is.
+        :param index:   (int) position amongst the existing children at which to
+                        insert the new nodes. Appends if `None`."""
+        if parent is None:
+            parent = self.root
+
+        column_names = self._schema.names
+        create_child_node = self.create_child_node
+
+        # Every node allocates a handful of containers, which would otherwise
+        # trigger a garbage collection pass every few hundred rows. None of the
+        # new objects can be garbage yet, so we hold off until we're done.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            if Lumberjack._journal is None:
+                nodes = self._create_rows(parent, rows, column_names, create_child_node)
+            else:
+                with Lumberjack._journal.paused():
+                    nodes = self._create_rows(parent, rows, column_names, create_child_node)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        if index is None:
+            parent.children.extend(nodes)
+        else:
+            parent.children[index:index] = nodes
+
+        if self._column_indexes:
+            self._index_inserted(nodes)
+
+        if Lumberjack._journal is not None and nodes:
+            Lumberjack._journal.inserted(parent, nodes[0]._index, nodes)
+
+        return nodes
+
+    @staticmethod
+    def _create_rows(parent, rows, column_names, create_child_node):
+        nodes = []
+        for row in rows:
+            if isinstance(row, dict):
+                items = row.iteritems()
+            else:
+                items = zip(column_names, row)
+
+            # Build the cells up front so the node doesn't create empty ones
+            # only for us to fill them in afterwards.
+            columns = {}
+            for column_name, value in items:
+                if isinstance(value, TreeValue):
+                    columns[column_name] = value
+                else:
+                    columns[column_name] = TreeValue(value=value)
+
+            nodes.append(create_child_node(parent=parent, columns=columns))
+
+        return nodes
+
+    def reconcile(self, parent, rows, key, children_key='children', notify=True):
+        """Makes the children of `parent` match `rows` with as few changes as
+        possible, instead of clearing the tree and adding everything again:
+
+        ```
+        Lumberjack().reconcile(None, [
+            {'name': 'Wild Turkey', 'proof': 101, 'children': [...]},
+            {'name': 'Old Crow', 'proof': 80}
+        ], key='name')
+        ```
+
+        Rows are matched to existing children by `key`. Matching nodes are kept,
+        moved into place and have only their changed cell values updated, so
+        selection and expand state survive. Unmatched rows become new nodes, and
+        unmatched nodes are deleted along with their descendants.
+
+        :param parent:          `TreeNode()` whose children to reconcile (`None` for the root)
+        :param rows:            rows in the desired order, as for `add_children()`
+        :param key:             (str or tuple) column name(s) identifying a row; must be
+                                unique amongst siblings
+        :param children_key:    dict rows holding a list of rows under this key have
+                                their node's children reconciled too; nodes of rows
+                                without it keep their children as they are
+        :param notify:          send `rebuild_view()` if the shape changed, otherwise
+                                `refresh_view()` if only values changed
+
+        Returns a `Reconciliation()` listing the inserted, removed, moved and
+        updated nodes, and whether the shape or only the attributes changed."""
+        if parent is None:
+            parent = self.root
+
+        column_names = self._schema.names
+        reconciliation = Reconciliation(key, column_names, self.create_child_node, children_key)
+
+        # See `add_children()`.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with self._unjournaled():
+                reconciliation.reconcile(parent, rows)
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        # New rows are only indexed once they're in place.
+        if self._column_indexes and reconciliation.inserted and self._indexable(parent):
+            for node in reconciliation.inserted:
+                self._index_node(node)
+
+        if notify:
+            if reconciliation.shape_changed:
+                self.rebuild_view()
+            elif reconciliation.attributes_changed:
+                self.refresh_view()
+
+        return reconciliation
+
+    def move_nodes(self, nodes, dest_parent, index=None):
+        """Moves `nodes` to become children of `dest_parent`, all at once, e.g.
+        for a multi-node drag and drop. Returns the nodes that were moved.
+
+        The nodes keep their order in the tree relative to each other and are
+        inserted together where `dest_parent.children[index]` was before the
+        move (appended if `index` is `None` or past the end). Nodes inside
+        another moved node's subtree simply move along with it.
+
+        Each affected sibling list is rebuilt once, so the cost doesn't depend
+        on how many nodes are dropped. Fires `path_event()` and rebuilds the
+        view once. Raises an exception, moving nothing, if `dest_parent` is
+        one of `nodes` or one of their descendants."""
+        moving = set(nodes)
+        if not moving:
+            return []
+
+        ancestor = dest_parent
+        while ancestor is not None:
+            if ancestor in moving:
+                raise Exception('Cannot move a node into itself or its own descendants.')
+            ancestor = ancestor._parent
+
+        # Only the topmost nodes move; anything below them comes along.
+        # {old parent: [moving children]}
+        groups = {}
+        for node in moving:
+            if node._parent is None or node._is_attribute:
+                raise Exception('Only child nodes can be moved.')
+            ancestor = node._parent
+            while ancestor is not None and ancestor not in moving:
+                ancestor = ancestor._parent
+            if ancestor is None:
+                groups.setdefault(node._parent, []).append(node)
+
+        # Sorting creates a path for every node; none of them can be garbage, so
+        # hold off collecting, as in `add_children()`.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            top = [node for group in groups.itervalues() for node in group]
+            top.sort(key=lambda node: node.path)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        moving = set(top)
+
+        # The node to insert in front of, skipping any that are moving themselves.
+        dest_children = dest_parent.children
+        anchor = None
+        if index is not None:
+            for sibling in dest_children[index:]:
+                if sibling not in moving:
+                    anchor = sibling
+                    break
+
+        places = [(node._parent, node._index) for node in top]
+
+        # Take the nodes out of every old sibling list in one pass each.
+        for parent in groups:
+            if parent is not dest_parent:
+                children = parent._children
+                children[:] = [node for node in children if node not in moving]
+
+        remaining = [node for node in dest_children if node not in moving]
+        position = len(remaining) if anchor is None else remaining.index(anchor)
+        remaining[position:position] = top
+        for node in top:
+            node.parent = dest_parent
+        dest_children[:] = remaining
+
+        if Lumberjack._journal is not None:
+            Lumberjack._journal.moved(top, places, dest_parent, position)
+
+        self.path_event()
+        self.rebuild_view()
+        return top
+
+    def store_state(self, uid):
+        """Records which nodes are expanded and selected under `uid`, for
+        `restore_state()`. MODO calls this through `treeview_StoreState()`, with
+        one `uid` per treeview, e.g. before its viewport is closed.
+
+        Costs one visit per visible row. Returns the `TreeState()`."""
+        state = TreeState.capture(self, self.state_key)
+        Lumberjack._stored_states[uid] = state
+        return state
+
+    def restore_state(self, uid, notify=True):
+        """Re-applies the expand and selection state stored under `uid`. Nodes
+        are found by `state_key` (by default `TreeNode().id`), so nodes kept by
+        `reconcile()` are restored, and so are nodes rebuilt after `clear()` if
+        `state_key` names a column. Costs one lookup per recorded node.
+
+        :param uid:     the `uid` passed to `store_state()`
+        :param notify:  send `rebuild_view()` if anything changed
+
+        Returns True if anything changed, False if not or if nothing was stored."""
+        state = Lumberjack._stored_states.get(uid)
+        if state is None or state.key != self.state_key:
+            return False
+
+        changed = state.restore(self)
+        if changed and notify:
+            self.rebuild_view()
+        return changed
+
+    def save_snapshot(self, path):
+        """Saves the whole tree to a binary file at `path`, for `load_snapshot()`:
+        hierarchy, cell values and styling, `row_color`, `meta`, and state flags
+        such as expand and selection. Written one chunk of nodes at a time.
+
+        Values, display values, tooltips and `meta` must be plain data (`None`,
+        booleans, numbers, strings, and tuples, lists and dicts of those), and
+        nodes can't have a `child_provider`. See the `snapshot` module.
+
+        The file is written next to `path` and only replaces it once complete,
+        so if saving fails, an existing snapshot is left as it was.
+
+        Returns the number of nodes saved."""
+        return snapshot.save_snapshot(self, path)
+
+    def load_snapshot(self, path):
+        """Replaces the tree with the one saved at `path` by `save_snapshot()`,
+        e.g. to skip rebuilding a large tree from scene data at startup. Much
+        faster than adding the nodes again. The snapshot must have been saved
+        with the same columns.
+
+        Like unpickling, nodes come back as the classes they were saved as,
+        without `__init__()` being called. Returns the number of nodes loaded."""
+        with self._unjournaled():
+            count = snapshot.load_snapshot(self, path)
+        self.rebuild_view()
+        return count
+
     def clear(self):
-        """Deletes all nodes from the tree."""
+        """Deletes all nodes from the tree. Clears the undo history."""
         self.primary = None
-        self.root.delete_descendants()
+        with self._unjournaled():
+            self.root.delete_descendants()
+        self._selection.clear()
+        Lumberjack._lazy_loaded.clear()
+        Lumberjack._lazy_loaded_count = 0
+        if Lumberjack._filter is not None:
+            Lumberjack._filter.apply(self.root)
+
+    def journal():
+        doc = """The `Journal()` of undo history, or `None` without an `undo_budget`."""
+        def fget(self):
+            return Lumberjack._journal
+        return locals()
+
+    journal = property(**journal())
+
+    @contextmanager
+    def transaction(self, label=None):
+        """Context manager that groups every edit made in the block into one
+        transaction, which `undo()` and `redo()` then treat as a single step:
+
+        ```
+        with Lumberjack().transaction('Rename'):
+            for node in Lumberjack().selected:
+                node.columns['name'].value = node.columns['name'].value.upper()
+        ```
+
+        The block also runs as a `batch()`. Blocks can be nested; only the
+        outermost one makes a transaction, named after the first `label` given.
+        If the block raises an exception, its edits are undone before the
+        exception is passed on.
+
+        Without an `undo_budget`, nothing is recorded and this is a plain `batch()`."""
+        journal = Lumberjack._journal
+        with self.batch():
+            if journal is None:
+                yield self
+                return
+
+            journal.begin(label)
+            try:
+                yield self
+            except:
+                journal.rollback()
+                raise
+            journal.commit()
+
+    def undo(self):
+        """Undoes the most recent transaction (or edit made outside of one), in
+        time proportional to its size, and updates the view. Returns False if
+        there was nothing to undo, or if called inside a `transaction()`."""
+        if Lumberjack._journal is None:
+            return False
+        with self.batch():
+            return Lumberjack._journal.undo()
+
+    def redo(self):
+        """Redoes the most recently undone transaction. Any new edit discards
+        the transactions that could be redone. Returns False if there was
+        nothing to redo."""
+        if Lumberjack._journal is None:
+            return False
+        with self.batch():
+            return Lumberjack._journal.redo()
+
+    def _new_node(self, factory, kwargs):
+        """Returns `factory(**kwargs)`. Node classes often fill in their cells as
+        they're created, which isn't an edit of the tree, so it isn't journaled."""
+        if Lumberjack._journal is None:
+            return factory(**kwargs)
+        with Lumberjack._journal.paused():
+            return factory(**kwargs)
+
+    @contextmanager
+    def _unjournaled(self):
+        """Runs the block without journaling it, then clears the undo history,
+        for changes that can't be undone."""
+        journal = Lumberjack._journal
+        if journal is None:
+            yield
+            return
+        with journal.paused():
+            yield
+        journal.clear()
+
+    def _release_nodes(self, nodes):
+        """Drops `nodes` and everything below them from the selection, column
+        indexes and node registry, as they're taken out of the tree by `undo()`.
+        Nodes keep their `selected` flag and `id` for when they're put back."""
+        for root in nodes:
+            for node in walk_preorder(root, attributes=True, include_root=True):
+                if node is self._primary:
+                    self.primary = None
+                if node._selected:
+                    self._update_selection(node, False)
+                if node._child_provider is not None:
+                    self._forget_lazy_children(node, True)
+                if self._column_indexes:
+                    self._unindex_node(node)
+                if node._id is not None:
+                    self._unregister_node(node)
+
+    def _restore_nodes(self, nodes, subtrees=True):
+        """Puts `nodes`, and everything below them unless `subtrees` is False,
+        back in the selection, column indexes and node registry, as they're put
+        back into the tree by `undo()` or `redo()`."""
+        for root in nodes:
+            restored = walk_preorder(root, attributes=True, include_root=True) if subtrees else (root,)
+            for node in restored:
+                if node._selected:
+                    self._update_selection(node, True)
+                if node._id is not None:
+                    Lumberjack._node_registry[node._id] = node
+        if self._column_indexes:
+            self._index_inserted(nodes, subtrees)
+
+    def evict_on_collapse(self, node):
+        """Returns True if `node`, which has a `child_provider` and has just been
+        collapsed in the GUI, should drop its children to save memory. By default,
+        only once more than `lazy_node_budget` lazily-created nodes are loaded.
+
+        Override in Lumberjack subclass for other memory policies."""
+        return self.lazy_node_budget is not None and Lumberjack._lazy_loaded_count > self.lazy_node_budget
+
+    def _node_collapsed(self, node):
+        """Called by the treeview when a node with a child provider is collapsed."""
+        if node.children_loaded and self.evict_on_collapse(node):
+            node.unload_children()
+            self.rebuild_view()
+
+    def _lazy_children_loaded(self, node):
+        Lumberjack._lazy_loaded[node] = len(node._children)
+        Lumberjack._lazy_loaded_count += len(node._children)
+
+    def _forget_lazy_children(self, node, include_node):
+        """Stops counting lazily-loaded nodes below `node` against `lazy_node_budget`,
+        as they are about to be deleted. If `include_node`, `node` itself is also no
+        longer considered loaded."""
+        loaded = Lumberjack._lazy_loaded
+        if not loaded:
+            return
+        for other in loaded.keys():
+            if other is node:
+                Lumberjack._lazy_loaded_count -= loaded[other]
+                if include_node:
+                    del loaded[other]
+                else:
+                    loaded[other] = 0
+            elif other.is_descendant_of(node):
+                Lumberjack._lazy_loaded_count -= loaded.pop(other)
 
     def find(self, column_name, search_term, regex=False):
         """Returns a list of `TreeNode()` objects with values matching search criteria.
@@ -512,15 +1154,237 @@ class Lumberjack(object):
 
         :param column_name: (str) name of the column to search
         :param search_term: (str, bool, int, or float) value to search for
-        :param regex: (bool) use regular expression"""
+        :param regex: (bool) use regular expression
+
+        Exact searches use the column's `'hash'` or `'sorted'` index if it has one.
+        Either way, attribute nodes aren't searched."""
 
         return self.root.find_in_descendants(column_name, search_term, regex)
 
+    def find_range(self, column_name, low=None, high=None):
+        """Returns a list of `TreeNode()` objects with `low <= value <= high` in the
+        given column, in value order. Either bound can be `None`.
+
+        Uses the column's `'sorted'` index if it has one, otherwise scans the tree."""
+        index = self._column_index(column_name, SortedIndex)
+        if index is not None:
+            return index.find_range(low, high)
+
+        found = []
+        for node in self.all_nodes:
+            value = node.columns[column_name].value
+            if value is not None and (low is None or value >= low) and (high is None or value <= high):
+                found.append((value, node))
+        return [node for value, node in sorted(found, key=lambda pair: pair[0])]
+
+    def find_prefix(self, column_name, prefix):
+        """Returns a list of `TreeNode()` objects whose value in the given column
+        starts with `prefix`, in value order.
+
+        Uses the column's `'prefix'` index if it has one, otherwise scans the tree."""
+        index = self._column_index(column_name, PrefixIndex)
+        if index is not None:
+            return index.find_prefix(prefix)
+
+        found = []
+        for node in self.all_nodes:
+            value = node.columns[column_name].value
+            if value is not None:
+                value = value if isinstance(value, basestring) else str(value)
+                if value.startswith(prefix):
+                    found.append((value, node))
+        return [node for value, node in sorted(found, key=lambda pair: pair[0])]
+
+    def filter(self, column_name=None, query=None, regex=False, predicate=None, case_sensitive=False):
+        """Shows only the nodes that match, along with their ancestors, e.g. for
+        type-to-filter. The tree itself is left untouched: the treeview displays a
+        projection of it. Returns the list of matching nodes, in tree order.
+
+        A node matches if its value in `column_name` contains `query` (a regular
+        expression search if `regex`), or if `predicate(node)` returns True.
+        Matching text is shown in bold. An empty query clears the filter.
+
+        When the new query extends the previous one (e.g. "wil" -> "wild" on the
+        same column), only the previous matches are re-tested, so filtering as
+        the user types gets faster with every keystroke. If any value or the
+        shape of the tree changed in between, the whole tree is searched again.
+
+        The filter is re-applied to the whole tree by `rebuild_view()`.
+
+        :param column_name:     (str) name of the column to search
+        :param query:           (str) substring or regular expression
+        :param regex:           (bool) treat `query` as a regular expression
+        :param predicate:       callable taking a `TreeNode()`, instead of a query
+        :param case_sensitive:  (bool) default False"""
+        if predicate is None and not query:
+            self.clear_filter()
+            return []
+
+        previous = Lumberjack._filter
+        tree_filter = TreeFilter(column_name, query, regex, predicate, case_sensitive)
+        if tree_filter.refines(previous):
+            tree_filter.apply(self.root, previous.matches)
+        else:
+            tree_filter.apply(self.root)
+
+        Lumberjack._filter = tree_filter
+        self._filter_changed()
+        return tree_filter.matches
+
+    def clear_filter(self):
+        """Removes the filter set by `filter()`, showing the whole tree again."""
+        if Lumberjack._filter is not None:
+            Lumberjack._filter = None
+            self._filter_changed()
+
+    @property
+    def filtered(self):
+        """True while a `filter()` is active."""
+        return Lumberjack._filter is not None
+
+    def _filter_changed(self):
+        # The filter is already up to date, so skip `rebuild_view()` re-applying it.
+        if Lumberjack._batch_depth:
+            Lumberjack._batch_shape_changed = True
+            return
+        self._notify_new_shape()
+
+    def _column_index(self, column_name, index_type):
+        """Returns the `index_type` index on `column_name`, or None."""
+        for index in self._column_indexes.get(column_name, ()):
+            if type(index) is index_type:
+                return index
+        return None
+
+    def _find_indexed(self, column_name, value):
+        """Returns indexed nodes whose `column_name` value equals `value`, or None
+        if the column has no index for exact matches."""
+        for index in self._column_indexes.get(column_name, ()):
+            # Sorted indexes leave out `None` values.
+            if index.exact and (value is not None or type(index) is not SortedIndex):
+                return index.find(value)
+        return None
+
+    def _index_node(self, node):
+        """Adds the node's cells to the indexes for their columns."""
+        columns = node._columns
+        for column_name, indexes in self._column_indexes.iteritems():
+            cell = columns.get(column_name)
+            if isinstance(cell, TreeValue):
+                cell._indexes = indexes
+                for index in indexes:
+                    index.add(cell, node)
+
+    def _indexable(self, parent):
+        """True if children of `parent` belong in the column indexes, i.e. it is
+        the root or a child node below it. Attributes, their descendants, and
+        nodes that aren't in the tree (yet) aren't indexed, matching the nodes
+        `find()` visits when it has to scan the tree."""
+        node = parent
+        while node is not None:
+            if node._is_attribute:
+                return False
+            if node is Lumberjack._root:
+                return True
+            node = node._parent
+        return False
+
+    def _index_inserted(self, nodes, subtrees=True):
+        """Adds `nodes`, just inserted as siblings, and unless `subtrees` is False
+        everything below them, to the column indexes if they're in the tree.
+        Nodes are indexed as they're inserted rather than as they're created,
+        so that nodes that never make it into the tree aren't found."""
+        if not nodes or nodes[0]._is_attribute or not self._indexable(nodes[0]._parent):
+            return
+        for root in nodes:
+            self._index_node(root)
+            if subtrees and root._children:
+                for node in walk_preorder(root):
+                    self._index_node(node)
+
+    def _unindex_node(self, node):
+        """Removes the node's cells from the column indexes. Returns True if
+        the node was indexed."""
+        indexed = False
+        columns = node._columns
+        for column_name in self._column_indexes:
+            cell = columns.get(column_name)
+            if isinstance(cell, TreeValue) and cell._indexes is not None:
+                for index in cell._indexes:
+                    index.remove(cell)
+                cell._indexes = None
+                indexed = True
+        return indexed
+
+    def _unindex_nodes(self, nodes):
+        """Removes `nodes` and all of their descendants and attributes from the
+        column indexes."""
+        for root in nodes:
+            for node in walk_preorder(root, attributes=True, include_root=True):
+                self._unindex_node(node)
+
+    def _clear_column_indexes(self):
+        # Cells left pointing at a cleared index are ignored by it. See `ColumnIndex().update()`.
+        for indexes in self._column_indexes.itervalues():
+            for index in indexes:
+                index.clear()
+
+    @contextmanager
+    def batch(self):
+        """Context manager that holds back `rebuild_view()` and `refresh_view()`
+        notifications until the outermost `with` block exits, then sends at most
+        one of them:
+
+        ```
+        with Lumberjack().batch():
+            for row in rows:
+                node = Lumberjack().add_child()
+                node.columns['name'].value = row
+                Lumberjack().rebuild_view() # deferred
+        # exactly one NewShape here
+        ```
+
+        If anything in the block asked for a rebuild, the view is rebuilt once.
+        Otherwise, if anything asked for a refresh, it is refreshed once.
+        Blocks can be nested, and notifications are still sent if the block
+        raises an exception."""
+        Lumberjack._batch_depth += 1
+        try:
+            yield self
+        finally:
+            Lumberjack._batch_depth -= 1
+            if Lumberjack._batch_depth == 0:
+                shape_changed = Lumberjack._batch_shape_changed
+                attributes_changed = Lumberjack._batch_attributes_changed
+                Lumberjack._batch_shape_changed = False
+                Lumberjack._batch_attributes_changed = False
+
+                if shape_changed:
+                    self.rebuild_view()
+                elif attributes_changed:
+                    self.refresh_view()
+
     def rebuild_view(self):
         """Rebuilds the `TreeView()` object from scratch. Must run every time any
         structural change occurs in the node tree. Note: if cell values have changed
         but the overal structure of the node tree has not changed, use `refresh()`
-        for performance."""
+        for performance.
+
+        Inside a `batch()` block, the rebuild is deferred until the block exits."""
+
+        if Lumberjack._batch_depth:
+            Lumberjack._batch_shape_changed = True
+            return
+
+        # The filtered projection has to follow the new structure.
+        if Lumberjack._filter is not None:
+            Lumberjack._filter.apply(self.root)
+
+        self._notify_new_shape()
+
+    def _notify_new_shape(self):
+        # Callable cell values may have changed along with everything else.
+        TreeValue.invalidate_all()
 
         # NOTE: We must _both_ notify attributes _and_ shape. (Facepalm.)
         self.treeview.notify_NewAttributes()
@@ -530,8 +1394,15 @@ class Lumberjack(object):
         """Refreshes `TreeView()` cell values, but not structure. Must run every
         time a cell value changes in the node tree. Note: structural changes
         (e.g. adding/removing nodes, reordering, reparenting) require the
-        `rebuild()`` method."""
+        `rebuild()`` method.
+
+        Inside a `batch()` block, the refresh is deferred until the block exits."""
 
+        if Lumberjack._batch_depth:
+            Lumberjack._batch_attributes_changed = True
+            return
+
+        TreeValue.invalidate_all()
         self.treeview.notify_NewAttributes()
 
     class BadPath(Exception):
@@ -539,15 +1410,12 @@ class Lumberjack(object):
 
     @staticmethod
     def depth_first_search_recursive(node):
-        for child in node.children:
-            for res in Lumberjack.depth_first_search_recursive(child):
-                yield res
-
-        yield node
+        """Yields `node` and its descendants, children before parents. Kept for
+        compatibility; no longer recursive. See `traversal.walk_postorder()`."""
+        return walk_postorder(node, include_root=True)
 
     def depth_first_search(self):
-        for node in Lumberjack.depth_first_search_recursive(self.root):
-            yield node
+        return walk_postorder(self.root, include_root=True)
 
     @staticmethod
     def node_for_path_recursive(node, path):
@@ -562,7 +1430,34 @@ class Lumberjack(object):
 
 
     def node_for_path(self, path):
+        """Returns the `TreeNode()` at `path`, a list of child indices starting at the root."""
+        node = self.root
         try:
-            return Lumberjack.node_for_path_recursive(self.root, path)
-        except Lumberjack.BadPath:
+            for index in path:
+                node = node._children[index]
+        except (IndexError, TypeError):
             raise Exception("Invalid path %s" % str(path))
+        return node
+
+    def node_for_id(self, node_id):
+        """Returns the `TreeNode()` with `TreeNode().id` equal to `node_id`, or `None`
+        if it has been deleted since."""
+        return Lumberjack._node_registry.get(node_id)
+
+    def _register_node(self, node):
+        node_id = next(Lumberjack._node_ids)
+        Lumberjack._node_registry[node_id] = node
+        return node_id
+
+    def _unregister_node(self, node):
+        Lumberjack._node_registry.pop(node._id, None)
+
+    def _unregister_nodes(self, nodes):
+        """Unregisters `nodes` and everything below them. Nodes that are simply
+        garbage collected drop out of the registry on their own, but deleted
+        nodes can outlive the tree if something still refers to them."""
+        registry = Lumberjack._node_registry
+        for root in nodes:
+            for node in walk_preorder(root, attributes=True, include_root=True):
+                if node._id is not None:
+                    registry.pop(node._id, None)
@@ -0,0 +1,304 @@
+# python
+
+import ctypes
+import marshal
+import mmap
+import struct
+from array import array
+from ColumnStore import ColumnStore, fROW_SELECTED, fROW_DELETED
+from snapshot import replacing_file
+
+MAPPED_MAGIC = 'LJMAP\r\n\x00'
+MAPPED_VERSION = 1
+
+# Magic, version, and the offset of the trailer describing the sections.
+_PREFIX_FORMAT = '<8sH6xQ'
+
+# Sections start on 8 byte boundaries, as the arrays mapped over them expect.
+_ALIGNMENT = 8
+
+# ctypes equivalents of the `array` typecodes allowed for `'typecode'` columns.
+_CTYPES = {
+    'b': ctypes.c_byte, 'B': ctypes.c_ubyte, 'h': ctypes.c_short, 'H': ctypes.c_ushort,
+    'i': ctypes.c_int, 'I': ctypes.c_uint, 'l': ctypes.c_long, 'L': ctypes.c_ulong,
+    'f': ctypes.c_float, 'd': ctypes.c_double
+}
+
+
+class MappedStrings(object):
+    """Read-only column of strings in a mapped file: the strings end to end,
+    and the offset at which each one starts. Reading a value slices it out of
+    the mapping; nothing is decoded up front."""
+
+    __slots__ = ('_buffer', '_base', '_offsets')
+
+    def __init__(self, buffer, base, offsets):
+        self._buffer = buffer
+        self._base = base
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row):
+        offsets = self._offsets
+        return self._buffer[self._base + offsets[row]:self._base + offsets[row + 1]]
+
+    def __setitem__(self, row, value):
+        raise Exception('Mapped columns are read-only.')
+
+    def __iter__(self):
+        for row in xrange(len(self)):
+            yield self[row]
+
+
+class MappedValues(object):
+    """Read-only column of numbers, viewed in place in a mapped file."""
+
+    __slots__ = ('_values',)
+
+    def __init__(self, values):
+        self._values = values
+
+    def __len__(self):
+        return len(self._values)
+
+    def __getitem__(self, row):
+        return self._values[row]
+
+    def __setitem__(self, row, value):
+        raise Exception('Mapped columns are read-only.')
+
+    def __iter__(self):
+        return iter(self._values)
+
+
+class MappedChildren(object):
+    """`ColumnStore()._children` for a mapped file. Rows are stored breadth
+    first, so the children of a row are always consecutive row ids, and one
+    array of first child ids describes the whole hierarchy. Children are
+    returned as an `xrange`, or None for leaves, like `ColumnStore()`."""
+
+    __slots__ = ('_starts',)
+
+    def __init__(self, starts):
+        self._starts = starts
+
+    def __len__(self):
+        return len(self._starts) - 1
+
+    def __getitem__(self, row):
+        start = self._starts[row]
+        stop = self._starts[row + 1]
+        return xrange(start, stop) if stop > start else None
+
+
+class MappedColumnStore(ColumnStore):
+    """A read-only `ColumnStore()` backed by a memory-mapped file written by
+    `MappedColumnStore.write()`, for huge static catalogs such as asset
+    libraries or preset browsers. See `ColumnarLumberjack().map_snapshot()`.
+
+    Opening a file only reads its section table: the hierarchy and column
+    arrays are `ctypes` views straight over the mapping, and cell strings are
+    sliced out of it when drawn. The OS pages in only what is actually read,
+    so startup is constant time and resident memory follows the rows that
+    are visited rather than the size of the file.
+
+    The mapping is copy-on-write, so expand and selection state can change
+    (in this process only) while the file stays untouched. Adding, moving or
+    deleting rows, or setting values, raises an exception."""
+
+    def __init__(self, column_definitions, path):
+        self._column_definitions = column_definitions
+        self._names = tuple(column['name'] for column in column_definitions)
+        self._column_index = dict((name, n) for n, name in enumerate(self._names))
+        self._typecodes = tuple(column.get('typecode') for column in column_definitions)
+        self._defaults = tuple(0 if typecode else None for typecode in self._typecodes)
+        self.filename = path
+
+        with open(path, 'rb') as stream:
+            prefix = stream.read(struct.calcsize(_PREFIX_FORMAT))
+            if len(prefix) != struct.calcsize(_PREFIX_FORMAT):
+                raise Exception('%s is not a mapped Lumberjack snapshot.' % path)
+            magic, version, trailer_offset = struct.unpack(_PREFIX_FORMAT, prefix)
+            if magic != MAPPED_MAGIC:
+                raise Exception('%s is not a mapped Lumberjack snapshot.' % path)
+            if version != MAPPED_VERSION:
+                raise Exception('Unsupported mapped snapshot version %d in %s.' % (version, path))
+            self._buffer = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        trailer = marshal.loads(self._buffer[trailer_offset:])
+        columns = tuple(name for name, typecode, itemsize in trailer['columns'])
+        if columns != self._names:
+            raise Exception('Mapped snapshot columns (%s) do not match the tree (%s).' % (
+                ', '.join(columns), ', '.join(self._names)))
+
+        rows = trailer['rows']
+        sections = trailer['sections']
+        self._parents = self._view(ctypes.c_int32, rows, sections['parents'])
+        self._positions = self._view(ctypes.c_int32, rows, sections['positions'])
+        self._states = self._view(ctypes.c_int32, rows, sections['states'])
+        self._flags = self._view(ctypes.c_ubyte, rows, sections['flags'])
+        self._children = MappedChildren(self._view(ctypes.c_int32, rows + 1, sections['starts']))
+
+        # Raw arrays for drawing, read-only wrappers for everything else.
+        self._columns = []
+        self._values = []
+        for n, (name, typecode, itemsize) in enumerate(trailer['columns']):
+            if typecode == 's':
+                column = MappedStrings(
+                    self._buffer, sections['strings %d' % n][0],
+                    self._view(ctypes.c_int64, rows + 1, sections['offsets %d' % n])
+                )
+                self._columns.append(column)
+                self._values.append(column)
+            else:
+                ctype = _CTYPES[typecode]
+                if ctypes.sizeof(ctype) != itemsize:
+                    raise Exception('Column "%s" of %s was written on a platform with different '
+                                    'number sizes.' % (name, path))
+                column = self._view(ctype, rows, sections['values %d' % n])
+                self._columns.append(column)
+                self._values.append(MappedValues(column))
+
+    def _view(self, ctype, count, section):
+        offset, length = section
+        if length != ctypes.sizeof(ctype) * count:
+            raise Exception('Mapped snapshot %s is truncated or corrupt.' % self.filename)
+        return (ctype * count).from_buffer(self._buffer, offset)
+
+    def __len__(self):
+        return len(self._parents)
+
+    def close(self):
+        """Releases the mapping once nothing else refers to its arrays. Called
+        by `ColumnarLumberjack().clear()`."""
+        buffer = self._buffer
+        self._parents = self._positions = self._states = self._flags = self._children = None
+        self._columns = self._values = None
+        try:
+            buffer.close()
+        except BufferError:
+            # Arrays handed out earlier still point into the mapping, which is
+            # released when they are.
+            pass
+
+    # Read-only
+    # ---------
+
+    def clear(self):
+        raise Exception('%s is read-only.' % self.__class__.__name__)
+
+    def add_rows(self, parent, rows, index=None):
+        raise Exception('%s is read-only.' % self.__class__.__name__)
+
+    def move_row(self, row, index):
+        raise Exception('%s is read-only.' % self.__class__.__name__)
+
+    def delete_row(self, row):
+        raise Exception('%s is read-only.' % self.__class__.__name__)
+
+    def delete_descendants(self, row):
+        raise Exception('%s is read-only.' % self.__class__.__name__)
+
+    # Cells
+    # -----
+
+    def display_string(self, row, column):
+        """Returns the string to display for a cell, sliced straight out of the
+        mapping for string columns."""
+        value = self._columns[column][row]
+        # Empty cells render as 3px slivers in MODO. See `TreeValue().display_value`.
+        return (value if isinstance(value, str) else str(value)) or ' '
+
+    # Writing
+    # -------
+
+    @classmethod
+    def write(cls, store, path):
+        """Writes the live rows of a `ColumnStore()` to `path`, breadth first,
+        for mapping with `MappedColumnStore()`. Values in columns without a
+        `'typecode'` are written as their display strings (UTF-8 for unicode),
+        and read back as `str`. Returns the number of rows written, root included."""
+        # New row ids, breadth first so that siblings are consecutive: the
+        # children of the nth row in `order` start at `starts[n]`.
+        order = array('l', [0])
+        starts = array('i')
+        children = store._children
+        flags = store._flags
+        visited = 0
+        while visited < len(order):
+            siblings = children[order[visited]]
+            visited += 1
+            starts.append(len(order))
+            if siblings is not None:
+                order.extend(child for child in siblings if not flags[child] & fROW_DELETED)
+        starts.append(len(order))
+
+        new_ids = array('l', [-1]) * len(store)
+        for new_id, row in enumerate(order):
+            new_ids[row] = new_id
+
+        parents = array('i', [-1])
+        parents.extend(new_ids[store._parents[row]] for row in order[1:])
+        positions = array('i', [0])
+        positions.extend(store._positions[row] for row in order[1:])
+
+        # Renamed over `path` once complete, so that a failed write leaves the
+        # old file intact, and a store still mapping it keeps its contents.
+        sections = {}
+        with replacing_file(path) as stream:
+            stream.write(struct.pack(_PREFIX_FORMAT, MAPPED_MAGIC, MAPPED_VERSION, 0))
+
+            def write_section(name, data):
+                stream.write('\x00' * (-stream.tell() % _ALIGNMENT))
+                sections[name] = (stream.tell(), len(data))
+                stream.write(data)
+
+            write_section('parents', parents.tostring())
+            write_section('positions', positions.tostring())
+            write_section('states', array('i', (store._states[row] for row in order)).tostring())
+            # Selection isn't kept: the controller's selection starts out empty.
+            write_section('flags', str(bytearray(flags[row] & ~fROW_SELECTED for row in order)))
+            write_section('starts', starts.tostring())
+
+            columns = []
+            for n, (name, typecode) in enumerate(zip(store._names, store._typecodes)):
+                values = store._values[n]
+                if typecode:
+                    data = array(typecode, (values[row] for row in order))
+                    write_section('values %d' % n, data.tostring())
+                    columns.append((name, typecode, data.itemsize))
+                    continue
+
+                # Strings are written as they go; only their offsets are kept.
+                stream.write('\x00' * (-stream.tell() % _ALIGNMENT))
+                start = stream.tell()
+                offsets = (ctypes.c_int64 * (len(order) + 1))()
+                offset = 0
+                for position, row in enumerate(order):
+                    value = _display_bytes(values[row])
+                    stream.write(value)
+                    offset += len(value)
+                    offsets[position + 1] = offset
+                sections['strings %d' % n] = (start, offset)
+                write_section('offsets %d' % n, buffer(offsets))
+                columns.append((name, 's', 0))
+
+            stream.write('\x00' * (-stream.tell() % _ALIGNMENT))
+            trailer_offset = stream.tell()
+            marshal.dump({'rows': len(order), 'columns': columns, 'sections': sections}, stream, 2)
+            stream.seek(0)
+            stream.write(struct.pack(_PREFIX_FORMAT, MAPPED_MAGIC, MAPPED_VERSION, trailer_offset))
+
+        return len(order)
+
+
+def _display_bytes(value):
+    if value is None:
+        return ''
+    if hasattr(value, '__call__'):
+        value = value()
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return str(value)
@@ -0,0 +1,199 @@
+# python
+
+from bisect import bisect_left
+from TreeValue import TreeValue
+
+
+class Reconciliation(object):
+    """Syncs the children of a node with a list of rows, as done by
+    `Lumberjack().reconcile()`, and records what it had to change:
+
+    - `inserted`    new nodes, in the order they were created
+    - `removed`     nodes that were deleted, along with their descendants
+    - `moved`       kept nodes that changed position amongst their siblings
+    - `updated`     kept nodes with at least one changed cell value
+
+    Rows and nodes are matched by `key`, a column name or a tuple of column
+    names. Nodes that are kept are the same `TreeNode()` objects as before, so
+    their selection, expand state, styling and attributes are untouched."""
+
+    def __init__(self, key, column_names, create_child_node, children_key='children'):
+        self.key = key
+        self.children_key = children_key
+
+        self._column_names = column_names
+        self._create_child_node = create_child_node
+
+        # Composite keys are compared as tuples of values.
+        self._key_names = (key,) if isinstance(key, basestring) else tuple(key)
+        for name in self._key_names:
+            if name not in column_names:
+                raise Exception('Unknown key column "%s".' % name)
+        self._key_positions = tuple(column_names.index(name) for name in self._key_names)
+
+        self.inserted = []
+        self.removed = []
+        self.moved = []
+        self.updated = []
+
+    def shape_changed():
+        doc = """True if nodes were inserted, removed or moved, i.e. the treeview
+        needs a `rebuild_view()`."""
+        def fget(self):
+            return bool(self.inserted or self.removed or self.moved)
+        return locals()
+
+    shape_changed = property(**shape_changed())
+
+    def attributes_changed():
+        doc = """True if cell values changed. If the shape didn't change, a
+        `refresh_view()` is all the treeview needs."""
+        def fget(self):
+            return bool(self.updated)
+        return locals()
+
+    attributes_changed = property(**attributes_changed())
+
+    def row_key(self, row):
+        if len(self._key_names) == 1:
+            if isinstance(row, dict):
+                return row.get(self._key_names[0])
+            return row[self._key_positions[0]]
+        if isinstance(row, dict):
+            return tuple(row.get(name) for name in self._key_names)
+        return tuple(row[position] for position in self._key_positions)
+
+    def node_key(self, node):
+        columns = node._columns
+        if len(self._key_names) == 1:
+            return columns[self._key_names[0]]._value
+        return tuple(columns[name]._value for name in self._key_names)
+
+    def reconcile(self, parent, rows):
+        """Makes the children of `parent` match `rows`, recursing into the
+        children of every row that has a `children_key` entry."""
+        # (node, child rows) pairs still to be reconciled. Nested rows go on a
+        # stack rather than through recursion, so deep data can't hit the limit.
+        pending = [(parent, rows)]
+        while pending:
+            parent, rows = pending.pop()
+            pending.extend(self._reconcile_children(parent, rows))
+        return self
+
+    def _reconcile_children(self, parent, rows):
+        children = parent._children
+        existing = {}
+        for node in children:
+            existing.setdefault(self.node_key(node), node)
+
+        nested = []
+        nodes = []
+        seen = set()
+        # Previous positions of the kept nodes, in their new order.
+        kept_positions = []
+        kept = []
+        for row in rows:
+            key = self.row_key(row)
+            if key in seen:
+                raise Exception('Duplicate key %r in rows.' % (key,))
+            seen.add(key)
+
+            node = existing.pop(key, None)
+            if node is None:
+                node = self._create_node(parent, row)
+                self.inserted.append(node)
+            else:
+                self._update_node(node, row)
+                kept_positions.append(node._index)
+                kept.append(node)
+            nodes.append(node)
+
+            child_rows = row.get(self.children_key) if isinstance(row, dict) else None
+            if child_rows is not None:
+                nested.append((node, child_rows))
+
+        # Whatever wasn't claimed by a row goes, subtree and all.
+        kept_set = set(kept)
+        removed = [node for node in children if node not in kept_set]
+        for node in removed:
+            node.delete_descendants()
+            node._release()
+        self.removed.extend(removed)
+
+        # The kept nodes that stay in place form the longest run whose old
+        # positions are increasing; only the others count as moved.
+        moved = ()
+        stay = self._increasing_run(kept_positions)
+        if len(stay) < len(kept):
+            stay = set(stay)
+            moved = [node for node in kept if node._index not in stay]
+            self.moved.extend(moved)
+
+        if removed or moved or len(kept) != len(nodes):
+            if children:
+                children[:] = nodes
+            elif nodes:
+                parent.children = nodes
+
+        return nested
+
+    def _create_node(self, parent, row):
+        if isinstance(row, dict):
+            items = [(name, value) for name, value in row.iteritems() if name != self.children_key]
+        else:
+            items = zip(self._column_names, row)
+
+        columns = {}
+        for column_name, value in items:
+            if isinstance(value, TreeValue):
+                columns[column_name] = value
+            else:
+                columns[column_name] = TreeValue(value=value)
+
+        return self._create_child_node(parent=parent, columns=columns)
+
+    def _update_node(self, node, row):
+        if isinstance(row, dict):
+            items = row.iteritems()
+        else:
+            items = zip(self._column_names, row)
+
+        columns = node._columns
+        changed = False
+        for column_name, value in items:
+            cell = columns.get(column_name)
+            if cell is None or column_name == self.children_key:
+                continue
+            if isinstance(value, TreeValue):
+                value = value._value
+            if cell._value != value:
+                cell.value = value
+                changed = True
+
+        if changed:
+            self.updated.append(node)
+
+    @staticmethod
+    def _increasing_run(positions):
+        """Returns the longest strictly increasing subsequence of `positions`."""
+        # tails[n] is the position ending the best run of length n + 1 so far.
+        tails = []
+        tail_indexes = []
+        previous = [-1] * len(positions)
+        for index, position in enumerate(positions):
+            length = bisect_left(tails, position)
+            if length == len(tails):
+                tails.append(position)
+                tail_indexes.append(index)
+            else:
+                tails[length] = position
+                tail_indexes[length] = index
+            previous[index] = tail_indexes[length - 1] if length else -1
+
+        run = []
+        index = tail_indexes[-1] if tail_indexes else -1
+        while index >= 0:
+            run.append(positions[index])
+            index = previous[index]
+        run.reverse()
+        return run
@@ -1,5 +1,8 @@
 # python
 
+# LXmTREEITEM_ROWCOLOR_MASK
+mROW_COLOR                      = 0x001F0000
+
 
 class RowColor(object):
     """Stores a bitwise color flag for treeview rows. Unlike rich text, rows can
@@ -110,8 +113,18 @@ class RowColor(object):
     def bitwise():
         doc = """The bitwise int for the row color."""
         def fget(self):
-            name = self.name if self._current_color_name is not None else 'none'
-            return self._lookup[name]
+            return self.bits(self._current_color_name)
         return locals()
 
     bitwise = property(**bitwise())
+
+    @classmethod
+    def bits(cls, name):
+        """Returns the row color bits for color `name` (`None` for no color).
+        Raises an exception for names MODO doesn't have."""
+        if name is None:
+            return 0
+        try:
+            return cls._lookup[name]
+        except (KeyError, TypeError):
+            raise Exception('Unknown row color "%s". Use one of: %s' % (name, ', '.join(sorted(cls._lookup))))
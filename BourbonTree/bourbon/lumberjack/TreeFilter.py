@@ -0,0 +1,112 @@
+# python
+
+import re
+from TreeValue import TreeValue
+from traversal import walk_preorder
+
+
+class TreeFilter(object):
+    """A live filter over the node tree, as set by `Lumberjack().filter()`.
+
+    Holds the query, the matching nodes in tree order, and a projection of the
+    tree containing only the matches and their ancestors:
+
+    - `children[node]`     visible children of `node`, in order
+    - `positions[node]`    index of `node` amongst its parent's visible children
+
+    The treeview walks the projection instead of `TreeNode().children`, so the
+    tree itself is never modified or copied.
+
+    Nodes match if `predicate(node)` is True or, without a predicate, if the
+    value in `column_name` contains `query` (or matches it as a regular expression
+    if `regex` is set)."""
+
+    def __init__(self, column_name=None, query=None, regex=False, predicate=None, case_sensitive=False):
+        self.column_name = column_name
+        self.query = query
+        self.regex = regex
+        self.predicate = predicate
+        self.case_sensitive = case_sensitive
+
+        self._pattern = None
+        self._needle = None
+        if predicate is None:
+            if regex:
+                self._pattern = re.compile(query, 0 if case_sensitive else re.IGNORECASE)
+            else:
+                self._needle = query if case_sensitive else query.lower()
+
+        self.matches = []
+        self.match_set = set()
+        self.children = {}
+        self.positions = {}
+
+        # `TreeValue._tree_revision` as of the last `apply()`.
+        self.revision = None
+
+    def refines(self, other):
+        """Returns True if every node matching this filter is known to match `other`,
+        i.e. this query extends the `other` query. Only plain substring queries on
+        the same column can be refined, and only while the tree hasn't changed
+        since `other` was applied: renamed or added nodes could match now."""
+        return (
+            other is not None
+            and other.revision == TreeValue._tree_revision
+            and self._needle is not None and other._needle is not None
+            and self.column_name == other.column_name
+            and self.case_sensitive == other.case_sensitive
+            and other._needle in self._needle
+        )
+
+    def span(self, text):
+        """Returns (start, stop) of the match in `text`, or None. Always None for
+        predicate filters."""
+        if self._pattern is not None:
+            match = self._pattern.search(text)
+            return match.span() if match else None
+        if self._needle is not None:
+            start = (text if self.case_sensitive else text.lower()).find(self._needle)
+            return (start, start + len(self._needle)) if start >= 0 else None
+        return None
+
+    def match(self, node):
+        """Returns True if `node` passes the filter."""
+        if self.predicate is not None:
+            return bool(self.predicate(node))
+
+        cell = node._columns.get(self.column_name)
+        value = cell.value if isinstance(cell, TreeValue) else cell
+        if hasattr(value, '__call__'):
+            value = value()
+        if value is None:
+            return False
+        return self.span(value if isinstance(value, basestring) else str(value)) is not None
+
+    def apply(self, root, candidates=None):
+        """Finds the matching nodes and builds the projection. Only `candidates`
+        (in tree order) are tested if given, otherwise every loaded node below `root`."""
+        if candidates is None:
+            candidates = walk_preorder(root)
+        self.matches = [node for node in candidates if self.match(node)]
+        self.match_set = set(self.matches)
+        self.revision = TreeValue._tree_revision
+
+        # Matches come in tree order, so the first time a node becomes visible,
+        # all of its visible siblings above it already are.
+        children = {}
+        positions = {}
+        for node in self.matches:
+            chain = []
+            while node is not root and node is not None and node not in positions:
+                chain.append(node)
+                node = node._parent
+            for node in reversed(chain):
+                siblings = children.get(node._parent)
+                if siblings is None:
+                    siblings = children[node._parent] = []
+                positions[node] = len(siblings)
+                siblings.append(node)
+
+        self.children = children
+        self.positions = positions
+        return self.matches
@@ -3,7 +3,9 @@
 import lx
 from re import search
 from TreeValue import TreeValue
-from RowColor import RowColor
+from RowColor import RowColor, mROW_COLOR
+from ChildList import ChildList
+from traversal import WALKS, walk_preorder
 
 fTREE_VIEW_ITEM_ATTR             = 0x00000001
 fTREE_VIEW_ITEM_EXPAND           = 0x00000002
@@ -15,6 +17,11 @@ fTREE_VIEW_EXPATTR               = 0x00000010        # Attribute children are ex
 fTREE_VIEW_EXPSUB                = 0x00000004        # Sub-items are expanded and the children are visible for ISTREE columns
 fTREE_VIEW_SELECTED              = 0x00000040
 
+# Shared stand-in for empty `children`, `attributes` and `tail_commands`. Most nodes
+# in a big tree are leaves, so the real containers are only created when a node
+# first gets something to put in them (see the matching properties).
+_NO_NODES = ()
+
 
 class TreeNode(object):
     """Generalized container object for TreeView node data. Everything needed
@@ -40,6 +47,15 @@ class TreeNode(object):
     # We sometimes need to tell the controller when things update.
     _controller = None
 
+    # Trees can hold hundreds of thousands of nodes, so nodes don't carry an
+    # instance `__dict__`. Subclasses that don't declare `__slots__` get one back.
+    __slots__ = (
+        '_selectable', '_selected', '_columns', '_is_attribute', '_parent',
+        '_index', '_path', '_children', '_attributes', '_tail_commands',
+        '_state', '_input_region', '_region_id', '_meta', '_child_provider', '_id',
+        '__weakref__'
+    )
+
     def __init__(self, **kwargs):
 
         # Whether selectable in GUI
@@ -57,30 +73,50 @@ class TreeNode(object):
         # TreeNode parent. All TreeNode() objects except root should have a parent.
         self._parent = kwargs.get('parent', None)
 
+        # Position amongst siblings. Maintained by the parent's `ChildList`.
+        self._index = 0
+
+        # Memoized `path` tuple. Discarded for the affected subtree whenever the
+        # hierarchy changes; see `_invalidate_path()`.
+        self._path = None
+
+        # Stable identifier, assigned on first use. See `id`.
+        self._id = None
+
         # List of TreeNode objects (listed under carrot twirl in GUI; Attributes
         # are also TreeNode objects, but listed under the + sign in the GUI.)
-        self._children = kwargs.get('children', [])
+        children = kwargs.get('children', None)
+        self._children = ChildList(children) if children else _NO_NODES
 
         # List of TreeNode objects (listed under the + in GUI; Children
         # are also TreeNode objects, but listed under the triangular twirl in the GUI.)
-        self._attributes = kwargs.get('attributes', [])
+        attributes = kwargs.get('attributes', None)
+        self._attributes = ChildList(attributes) if attributes else _NO_NODES
 
         # List of TreeNode objects appended to the bottom of the node's list
         # of children, e.g. (new group), (new form), and (new command) in Form Editor
-        self._tail_commands = kwargs.get('tail_commands', [])
+        self._tail_commands = kwargs.get('tail_commands', None) or _NO_NODES
 
-        # Bitwise flags for GUI states like expand/collapse etc. Leave this alone.
-        self._state = kwargs.get('state', 0)
+        # Optional (provider, has_children) pair for children that are only created
+        # when the treeview first asks for them. See `child_provider`.
+        provider = kwargs.get('child_provider', None)
+        self._child_provider = (provider, kwargs.get('has_children', None)) if provider else None
+
+        # Bitwise flags for GUI states like expand/collapse etc, combined with the
+        # row color bits so that the treeview can read them as is. Leave this alone.
+        self._state = kwargs.get('state', 0) & ~mROW_COLOR
 
         # String for use in input remapping. Must correspond with one of the region
         # strings provided in the Lumberjack blessing_parameters() method.
         self._input_region = kwargs.get('input_region', None)
-
-        self._meta = dict()
-        self.row_color = RowColor().name
+        self._region_id = TreeValue.region_id(self._input_region)
 
         # Catch-all for other metadata we might want to store in our nodes, e.g. row color.
-        self._meta = dict(kwargs.get('meta', []))
+        # Created on first use.
+        meta = kwargs.get('meta', None)
+        self._meta = None
+        if meta:
+            self.meta = dict(meta)
 
         # List of column names for the node tree. Common to all nodes.
         # Set during `Lumberjack().bless()`
@@ -91,15 +127,49 @@ class TreeNode(object):
         # width -1 and another is -3, the first is 25%, the second is 75%.)
         if 'column_definitions' in kwargs:
             self.__class__._column_definitions = kwargs.get('column_definitions')
+            TreeNode._column_definitions = kwargs.get('column_definitions')
 
         # Controller is added during blessing. Should never change thereafter.
         if 'controller' in kwargs:
             self.__class__._controller = kwargs.get('controller')
             TreeNode._controller = kwargs.get('controller')
 
-        # Add empty TreeValue objects for each column, ready to accept values.
+        # Add empty TreeValue objects for each column not provided in `columns`,
+        # ready to accept values.
+        columns = self._columns
         for column in self._column_definitions:
-            self._columns[column['name']] = TreeValue()
+            if column['name'] not in columns:
+                columns[column['name']] = TreeValue()
+
+        if self._controller is not None and 'controller' not in kwargs:
+            # Nodes created pre-selected still need to be in the controller's selection index.
+            if self._selected:
+                self._controller._update_selection(self, True)
+
+    @classmethod
+    def _new(cls, parent, columns, is_attribute=False):
+        """Returns a node with default state, without going through `__init__()`
+        or registering it with the controller, for bulk loads that restore a
+        node's state themselves, like unpickling does; see `Lumberjack().load_snapshot()`.
+        Must set every slot that `__init__()` sets."""
+        node = cls.__new__(cls)
+        node._selectable = True
+        node._selected = False
+        node._columns = columns
+        node._is_attribute = is_attribute
+        node._parent = parent
+        node._index = 0
+        node._path = None
+        node._id = None
+        node._children = _NO_NODES
+        node._attributes = _NO_NODES
+        node._tail_commands = _NO_NODES
+        node._child_provider = None
+        node._state = 0
+        node._input_region = None
+        node._region_id = None
+        node._meta = None
+        return node
 
     # PROPERTIES
     # ----------
@@ -133,9 +203,15 @@ class TreeNode(object):
         - 'white'
         ```"""
         def fget(self):
-            return self.meta.get('row_color')
+            if self._meta is None:
+                return None
+            return self._meta.get('row_color')
         def fset(self, value):
-            self._meta['row_color'] = value
+            bits = RowColor.bits(value)
+            if self._controller is not None and self._controller._journal is not None:
+                self._controller._journal.row_color_changed(self, self.row_color, value)
+            self.meta['row_color'] = value
+            self._state = (self._state & ~mROW_COLOR) | bits
         return locals()
 
     row_color = property(**row_color())
@@ -153,11 +229,18 @@ class TreeNode(object):
 
     def meta():
         doc = """Dictionary with metadata for the node. 'row_color' is stored here
-        by default. Feel free to add as many other keys as you like."""
+        by default. Feel free to add as many other keys as you like.
+
+        Set the color through `row_color` rather than this dict, so that the row's
+        `state` picks it up."""
         def fget(self):
+            if self._meta is None:
+                self._meta = dict()
             return self._meta
         def fset(self, value):
+            bits = RowColor.bits(value.get('row_color')) if value else 0
             self._meta = value
+            self._state = (self._state & ~mROW_COLOR) | bits
         return locals()
 
     meta = property(**meta())
@@ -167,10 +250,10 @@ class TreeNode(object):
         def fget(self):
             return self._selected
         def fset(self, value):
-            self._selected = value
             if value:
-                self._controller.primary = self
-            self._controller.select_event()
+                self._controller._apply_selection(select=(self,))
+            else:
+                self._controller._apply_selection(deselect=(self,))
         return locals()
 
     selected = property(**selected())
@@ -197,7 +280,12 @@ class TreeNode(object):
         def fget(self):
             return self._columns
         def fset(self, columns):
+            indexed = self._controller is not None and self._controller._unindex_node(self)
             self._columns = columns
+            # Every cell may have changed. See `TreeFilter().refines()`.
+            TreeValue._tree_revision += 1
+            if indexed:
+                self._controller._index_node(self)
         return locals()
 
     columns = property(**columns())
@@ -209,6 +297,8 @@ class TreeNode(object):
             return self._parent
         def fset(self, node):
             self._parent = node
+            if self._path is not None:
+                self._invalidate_path()
         return locals()
 
     parent = property(**parent())
@@ -223,23 +313,20 @@ class TreeNode(object):
     is_attribute = property(**is_attribute())
 
     def index():
-        doc = "The index of the node amongst its siblings (parent's children)."
+        doc = """The index of the node amongst its siblings (parent's children).
+        Kept current by the parent's `ChildList`, so reading it is cheap."""
         def fget(self):
             if self._parent:
-                if not self.is_attribute:
-                    return self._parent.children.index(self)
-                elif self.is_attribute:
-                    return self._parent.attributes.index(self)
+                return self._index
             elif not self._parent:
                 # index of root is 0
                 return 0
         def fset(self, index):
-            if not self.is_attribute:
-                child_list = self._parent.children
-            elif self.is_attribute:
-                child_list = self._parent.attributes
-            old_index = child_list.index(self)
-            child_list.insert(index, child_list.pop(old_index))
+            old_index = self._index
+            self.siblings.move(old_index, index)
+            journal = self._controller._journal
+            if journal is not None:
+                journal.moved((self,), ((self._parent, old_index),), self._parent, self._index)
         return locals()
 
     index = property(**index())
@@ -249,21 +336,78 @@ class TreeNode(object):
         node. Note that children appear under the triangular twirl in the listview
         GUI, while attributes appear under the + sign."""
         def fget(self):
+            if self._children is _NO_NODES:
+                if self._child_provider is not None:
+                    return self.load_children()
+                self._children = ChildList()
             return self._children
         def fset(self, value):
-            self._children = value
+            self._children = ChildList(value)
         return locals()
 
     children = property(**children())
 
+    def child_provider():
+        doc = """Callable that creates the node's children on demand, for huge
+        hierarchies where users only ever expand a small part of the tree.
+
+        The provider is called with the node as its only argument and should
+        return (or yield) a list of `TreeNode()` objects. It runs the first time
+        the treeview looks inside the node (`tree_Count`/`tree_ToChild`), or when
+        `children` is read. Until then, `descendants`, `find()` and the like only
+        see children that have already been loaded.
+
+        Loaded children can be dropped again with `unload_children()`; the
+        controller does this automatically when a node is collapsed and
+        `Lumberjack().evict_on_collapse()` says so."""
+        def fget(self):
+            if self._child_provider is not None:
+                return self._child_provider[0]
+        def fset(self, provider):
+            hint = self._child_provider[1] if self._child_provider is not None else None
+            self._child_provider = (provider, hint) if provider else None
+        return locals()
+
+    child_provider = property(**child_provider())
+
+    def has_children():
+        doc = """Whether the node has (or may have) children. For nodes whose children
+        haven't been loaded from their `child_provider` yet, returns the cheap hint
+        given as `has_children` (a boolean, or a callable taking the node) rather than
+        calling the provider. Without a hint, unloaded nodes are assumed to have
+        children so that MODO draws the expand twirl."""
+        def fget(self):
+            if self._child_provider is not None and self._children is _NO_NODES:
+                hint = self._child_provider[1]
+                if hint is None:
+                    return True
+                return bool(hint(self) if hasattr(hint, '__call__') else hint)
+            return bool(self._children)
+        def fset(self, hint):
+            if self._child_provider is not None:
+                self._child_provider = (self._child_provider[0], hint)
+        return locals()
+
+    has_children = property(**has_children())
+
+    def children_loaded():
+        doc = """False if the node has a `child_provider` that hasn't been called yet."""
+        def fget(self):
+            return self._child_provider is None or self._children is not _NO_NODES
+        return locals()
+
+    children_loaded = property(**children_loaded())
+
     def attributes():
         doc = """A list of `TreeNode()` objects that are attributes of the current
         node. Note that attributes appear under the + sign in the listview
         GUI, while children appear under the triangular twirl."""
         def fget(self):
+            if self._attributes is _NO_NODES:
+                self._attributes = ChildList()
             return self._attributes
         def fset(self, value):
-            self._attributes = value
+            self._attributes = ChildList(value)
         return locals()
 
     attributes = property(**attributes())
@@ -273,6 +417,8 @@ class TreeNode(object):
         of children, e.g. (new group), (new form), and (new command) in Form Editor.
         Command must be mapped using normal input remapping to the node's input region."""
         def fget(self):
+            if self._tail_commands is _NO_NODES:
+                self._tail_commands = []
             return self._tail_commands
         def fset(self, value):
             self._tail_commands = value
@@ -281,26 +427,33 @@ class TreeNode(object):
     tail_commands = property(**tail_commands())
 
     def add_state_flag(self, flag):
-        self._state = self._state | flag
+        self._state = self._state | (flag & ~mROW_COLOR)
 
     def state():
         doc = """Bitwise flags used to define GUI states like expand/collapse etc.
-        Leave these alone unless you know what you're doing."""
+        Leave these alone unless you know what you're doing.
+
+        Includes the `row_color` bits, which are kept up to date as the color
+        changes, so reading the state costs nothing. Color bits in assigned
+        values are ignored; set `row_color` instead."""
         def fget(self):
-            return self._state | RowColor(self.row_color).bitwise
+            return self._state
         def fset(self, value):
-            self._state = value
+            self._state = (value & ~mROW_COLOR) | (self._state & mROW_COLOR)
         return locals()
 
     state = property(**state())
 
     def input_region():
         doc = """String for use in input remapping. Must correspond with one of the region
-        strings provided in the Lumberjack blessing_parameters() method."""
+        strings provided in the Lumberjack blessing_parameters() method.
+
+        Applies to every cell in the row that doesn't have an `input_region` of its own."""
         def fget(self):
             return self._input_region
         def fset(self, value):
             self._input_region = value
+            self._region_id = TreeValue.region_id(value)
         return locals()
 
     input_region = property(**input_region())
@@ -320,22 +473,22 @@ class TreeNode(object):
     def descendants():
         doc = """Returns a list of all children, grandchildren, etc for the current node."""
         def fget(self):
-            descendants = []
-            for child in self.children:
-                descendants.append(child)
-                descendants.extend(child.descendants)
-            return descendants
+            return list(walk_preorder(self))
         return locals()
 
     descendants = property(**descendants())
 
     def ancestors():
-        doc = """Returns a list of all parents, grandparents, etc for the current node."""
+        doc = """Returns a list of all parents, grandparents, etc for the current node,
+        starting from the root."""
         def fget(self):
-            if self._parent:
-                return self._parent.ancestors.append(self.parent)
-            elif not self._parent:
-                return []
+            ancestors = []
+            node = self._parent
+            while node is not None:
+                ancestors.append(node)
+                node = node._parent
+            ancestors.reverse()
+            return ancestors
         return locals()
 
     ancestors = property(**ancestors())
@@ -343,7 +496,7 @@ class TreeNode(object):
     def tier():
         doc = """Returns the number of anscestors."""
         def fget(self):
-            return len(self.get_ancestors())
+            return len(self.ancestors)
         return locals()
 
     tier = property(**tier())
@@ -352,18 +505,13 @@ class TreeNode(object):
     def selected_descendants(self):
         """Returns a list of all currently-selected children, grandchildren, etc
         of the current node."""
-        selected_nodes = []
-        for child in self.children:
-            if child.selected:
-                selected_nodes.append(child)
-            selected_nodes.extend(child.selected_descendants)
-        return selected_nodes
+        return [node for node in walk_preorder(self) if node._selected]
 
     @property
     def selected_children(self):
         """Returns a list of all currently-selected children of the current node."""
         selected_nodes = []
-        for child in self.children:
+        for child in self._children:
             if child.selected:
                 selected_nodes.append(child)
         return selected_nodes
@@ -380,70 +528,205 @@ class TreeNode(object):
     def tooltip(self, columnIndex):
         return None
 
+    def walk(self, order='pre', prune=None, attributes=False, include_self=False):
+        """Iterates over the node's descendants without recursion or intermediate
+        lists. Break out of the loop to stop early. See the `traversal` module.
+
+        :param order:           'pre' (top to bottom as displayed), 'post' (children
+                                before their parents) or 'breadth' (tier by tier)
+        :param prune:           callable taking a node; return True to skip everything
+                                below that node, e.g. collapsed or filtered subtrees
+        :param attributes:      (bool) also visit attribute nodes
+        :param include_self:    (bool) also visit the current node"""
+        return WALKS[order](self, prune, attributes, include_self)
+
+    def is_descendant_of(self, node):
+        """Returns True if `node` is a parent, grandparent, etc of the current node."""
+        ancestor = self._parent
+        while ancestor is not None:
+            if ancestor is node:
+                return True
+            ancestor = ancestor._parent
+        return False
+
     def add_child(self, **kwargs):
         """Adds a child `TreeNode()` to the current node and returns it."""
         if 'parent' not in kwargs:
             kwargs['parent'] = self
-        newNode = self.__class__(**kwargs)
+        newNode = self._controller._new_node(self.__class__, kwargs)
         kwargs['parent'].children.append(newNode)
+        if self._controller._column_indexes:
+            self._controller._index_inserted((newNode,))
+        if self._controller._journal is not None:
+            self._controller._journal.inserted(kwargs['parent'], newNode._index, (newNode,))
         return newNode
 
+    def add_children(self, rows, index=None):
+        """Adds one child `TreeNode()` per row to the current node and returns them.
+        See `Lumberjack().add_children()`."""
+        return self._controller.add_children(self, rows, index)
+
     def add_attribute(self, **kwargs):
         """Adds an attribute `TreeNode()` to the current node and returns it."""
         if 'parent' not in kwargs:
             kwargs['parent'] = self
         kwargs['is_attribute'] = True
-        newNode = self.__class__(**kwargs)
+        newNode = self._controller._new_node(self.__class__, kwargs)
         kwargs['parent'].attributes.append(newNode)
+        if self._controller._journal is not None:
+            self._controller._journal.inserted(kwargs['parent'], newNode._index, (newNode,), True)
         return newNode
 
+    def load_children(self):
+        """Creates the node's children with its `child_provider`, unless they are
+        already loaded. Returns the children."""
+        if self._child_provider is None or self._children is not _NO_NODES:
+            return self.children
+
+        children = ChildList(self._child_provider[0](self))
+        for child in children:
+            child._parent = self
+        self._children = children
+
+        if self._controller is not None:
+            self._controller._lazy_children_loaded(self)
+            if self._controller._column_indexes:
+                self._controller._index_inserted(children)
+        return children
+
+    def unload_children(self):
+        """Drops the children created by the node's `child_provider` (and everything
+        below them), so that they are created afresh the next time they're needed.
+        Returns False if there was nothing to unload."""
+        if self._child_provider is None or self._children is _NO_NODES:
+            return False
+
+        # Evicting isn't an edit, so it isn't journaled.
+        journal = self._controller._journal
+        if journal is None:
+            self.delete_descendants()
+        else:
+            with journal.paused():
+                self.delete_descendants()
+        self._children = _NO_NODES
+        self._controller._forget_lazy_children(self, True)
+        return True
+
     def select_descendants(self):
-        """Selects all children, grandchildren, etc."""
-        for child in self.children:
-            child.selected = True
-            child.select_descendants()
+        """Selects all children, grandchildren, etc. Fires a single `select_event()`."""
+        self._controller.select(self.descendants)
 
     def deselect_descendants(self):
-        """Deselects all children, grandchildren, etc."""
-        for child in self.children:
-            if child.selected:
-                # Only change it if we need to, since setting `select`
-                # fires the update notifier.
-                child.selected = False
-            child.deselect_descendants()
+        """Deselects all children, grandchildren, etc. Fires a single `select_event()`."""
+        self._controller.deselect(
+            [node for node in self._controller.selected if node.is_descendant_of(self)]
+        )
 
     def delete(self):
         """Deletes the current node and reparents all of its children to its parent."""
+        journal = self._controller._journal
+        if journal is None:
+            self._delete(None)
+            return
+
+        # Deleting the node's attributes is journaled along with it.
+        journal.begin()
+        try:
+            self._delete(journal)
+        finally:
+            journal.commit()
+
+    def _delete(self, journal):
+        parent = self._parent
+        index = self._index
+        self._release()
+
+        if self.is_attribute:
+            self.parent.attributes.remove(self)
+            if journal is not None:
+                journal.deleted(self, parent, index, 0)
+            return
+
+        # Reparent children to parent. (Does not delete hierarchy.)
+        children = self._children
+        for child in children:
+            child.parent = self.parent
+
+        # Children take the deleted node's place amongst its siblings.
+        index = self.index
+        count = len(children)
+        self.parent.children[index:index + 1] = children
+        if children:
+            del children[:]
+
+        if journal is not None:
+            journal.deleted(self, parent, index, count)
+
+    def _release(self):
+        """Drops the node, and its attributes, from the controller's bookkeeping
+        ahead of it being taken out of the tree."""
 
         # If we don't clear out the `primary` property for the controller,
         # this node will live on as a zombie, eating the brains of...
         if self._controller.primary == self:
             self._controller.primary = None
 
-        # Delete all attributes
-        self.delete_attributes()
+        if self._selected:
+            self._controller._update_selection(self, False)
 
-        # Reparent children to parent. (Does not delete hierarchy.)
-        for sibling in self.parent.children:
-            sibling.parent = self.parent
+        if self._child_provider is not None:
+            self._controller._forget_lazy_children(self, True)
 
-        self.parent.children.remove(self)
+        if self._controller._column_indexes:
+            self._controller._unindex_node(self)
+
+        if self._id is not None:
+            self._controller._unregister_node(self)
+
+        # Delete all attributes
+        self.delete_attributes()
 
     def delete_descendants(self):
         """Deletes all children, grandchildren etc from the current node. To delete
         the node itself, use `delete()`"""
         # If we don't clear out the `primary` property for the controller,
         # this node will live on as a zombie, eating the brains of...
-        if self._controller.primary in self.descendants:
+        primary = self._controller.primary
+        if primary is not None and primary.is_descendant_of(self):
             self._controller.primary = None
-        del self.children[:]
+
+        # Drop deleted nodes from the controller's selection index.
+        for node in self._controller.selected:
+            if node.is_descendant_of(self):
+                self._controller._update_selection(node, False)
+
+        self._controller._forget_lazy_children(self, False)
+
+        if self._controller._column_indexes:
+            if self is self._controller.root:
+                self._controller._clear_column_indexes()
+            else:
+                self._controller._unindex_nodes(self._children)
+
+        if self._controller._node_registry:
+            self._controller._unregister_nodes(self._children)
+
+        if self._children:
+            if self._controller._journal is not None:
+                self._controller._journal.removed(self, self._children)
+            del self._children[:]
 
     def delete_attributes(self):
         """Deletes all attributes from the current node. To delete
         the node itself, use `delete()`"""
-        if len(self._attributes) > 0:
-            for attribute in self._attributes:
-                self._attributes.remove(attribute)
+        if self._attributes:
+            if self._controller._column_indexes:
+                self._controller._unindex_nodes(self._attributes)
+            if self._controller._node_registry:
+                self._controller._unregister_nodes(self._attributes)
+            if self._controller._journal is not None:
+                self._controller._journal.removed(self, self._attributes, True)
+            del self._attributes[:]
 
     def find_in_descendants(self, column_name, search_term, regex=False):
         """Returns a list of descendant nodes with values matching search criteria.
@@ -454,35 +737,82 @@ class TreeNode(object):
         :param search_term: (str, bool, int, or float) value to search for
         :param regex: (bool) use regular expression"""
 
-        found = []
-
-        for child in self.children:
+        # Exact matches can be answered by an index on the column, if any.
+        if not regex:
+            found = self._controller._find_indexed(column_name, search_term)
+            if found is not None:
+                if self._parent is not None:
+                    found = [node for node in found if node.is_descendant_of(self)]
+                return sorted(found, key=lambda node: node.path)
 
-            if not child.columns.get(column_name, None):
+        found = []
+        for node in walk_preorder(self):
+            cell = node._columns.get(column_name, None)
+            if cell is None:
                 continue
+            value = cell.value if isinstance(cell, TreeValue) else cell
 
             if regex:
-                result = search(search_term, child.columns[column_name])
-
-            elif not regex:
-                result = child.columns[column_name]
+                if value is not None and search(search_term, str(value)):
+                    found.append(node)
+            elif value == search_term:
+                found.append(node)
 
-            if result:
-                found.append(child)
+        return found
 
-            found.extend(child.find_in_descendants)
+    def _invalidate_path(self):
+        """Discards the cached `path` for this node and all of its descendants.
+
+        A node only ever has a cached path if its parent does, so we can stop
+        descending as soon as we reach a node without one."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if node._path is not None:
+                node._path = None
+                stack.extend(node._children)
+                stack.extend(node._attributes)
+
+    def id():
+        doc = """Stable integer identifying the node for as long as it is in the tree,
+        however its ancestors and siblings are reordered. Unlike `path`, it can be
+        kept in drag payloads, saved selections and other external references, and
+        resolved again with `Lumberjack().node_for_id()` in constant time.
+
+        Ids are handed out the first time they're asked for, so nodes nobody refers
+        to don't take up space in the registry. Ids are never reused."""
+        def fget(self):
+            if self._id is None:
+                self._id = self._controller._register_node(self)
+            return self._id
+        return locals()
 
-        return found
+    id = property(**id())
 
     def path():
-        """ Return path to node. Path is a list of indices that can be used to find node """
+        """ Return path to node. Path is a list of indices that can be used to find node.
 
+        Paths are memoized per node. Whenever a node is inserted, removed or
+        renumbered, the cached paths for it and its descendants are discarded,
+        so the cost of reading a path is usually a single list copy."""
 
         def fget(self):
-            if self.parent is None:
-                return []
-            else:
-                return self.parent.path + [self.index]
+            path = self._path
+            if path is None:
+                # Climb to the nearest ancestor with a cached path, then cache
+                # every path on the way back down.
+                uncached = []
+                node = self
+                while node._path is None and node._parent is not None:
+                    uncached.append(node)
+                    node = node._parent
+                path = node._path if node._path is not None else ()
+
+                for node in reversed(uncached):
+                    path += (node._index,)
+                    node._path = path
+
+            return list(path)
 
         def fset(self, value):
             assert(len(value) != 0), "Cannot move root node"
@@ -497,10 +827,15 @@ class TreeNode(object):
                 # Appending. Will use len(new_parent.children) as index
                 target_node = None
 
+            old_parent = self.parent
+            old_index = self._index
             self.parent.children.remove(self)
             self.parent = new_parent
             new_parent.children.insert(len(new_parent.children) if target_node is None else target_node.index, self)
 
+            if lumberjack._journal is not None:
+                lumberjack._journal.moved((self,), ((old_parent, old_index),), new_parent, self._index)
+
             self._controller.path_event()
 
         return locals()
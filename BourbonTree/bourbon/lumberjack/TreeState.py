@@ -0,0 +1,116 @@
+# python
+
+from array import array
+from TreeNode import fTREE_VIEW_ITEM_EXPAND, fTREE_VIEW_ATTR_EXPAND, fTREE_VIEW_EXPATTR
+from traversal import walk_preorder
+
+# The state bits a `TreeState()` records for each node.
+mEXPAND_STATE = fTREE_VIEW_ITEM_EXPAND | fTREE_VIEW_ATTR_EXPAND | fTREE_VIEW_EXPATTR
+
+
+def _collapsed(node):
+    return not node._state & fTREE_VIEW_ITEM_EXPAND
+
+
+class TreeState(object):
+    """A snapshot of which nodes are expanded and selected, as stored per
+    treeview `uid` by `Lumberjack().store_state()`:
+
+    - `expanded`        keys of the nodes with expand bits set
+    - `expand_flags`    their expand bits, one byte per node
+    - `selected`        keys of the selected nodes, the primary node last
+
+    Nodes are recorded by key rather than by reference. The key is
+    `TreeNode().id` unless `key` names a column, in which case it is the
+    node's value in that column, so the snapshot also applies to nodes that
+    were deleted and rebuilt with the same values since.
+
+    Only expanded nodes whose ancestors are all expanded are recorded, so
+    capturing a snapshot walks the visible rows and restoring one costs one
+    lookup per recorded node, however large the tree."""
+
+    __slots__ = ('key', 'expanded', 'expand_flags', 'selected')
+
+    def __init__(self, key=None, expanded=(), expand_flags=(), selected=()):
+        self.key = key
+        self.expanded = expanded
+        self.expand_flags = array('B', expand_flags)
+        self.selected = selected
+
+    def __len__(self):
+        return len(self.expanded) + len(self.selected)
+
+    @classmethod
+    def capture(cls, controller, key=None):
+        """Returns the current state of `controller`'s tree."""
+        node_key = cls._node_key_function(key)
+
+        expanded = []
+        expand_flags = []
+        for node in walk_preorder(controller.root, prune=_collapsed):
+            flags = node._state & mEXPAND_STATE
+            if flags:
+                expanded.append(node_key(node))
+                expand_flags.append(flags)
+
+        primary = controller._primary
+        selected = [node_key(node) for node in controller._selection if node is not primary]
+        if primary is not None and primary._selected:
+            selected.append(node_key(primary))
+
+        if key is None:
+            return cls(key, array('L', expanded), expand_flags, array('L', selected))
+        return cls(key, tuple(expanded), expand_flags, tuple(selected))
+
+    def restore(self, controller):
+        """Applies the snapshot to `controller`'s tree: recorded nodes get their
+        expand bits back and the selection is replaced with the recorded nodes
+        that still exist. Other nodes keep their expand state. Returns True if
+        anything changed."""
+        nodes_for_key = self._nodes_for_key_function(controller)
+
+        changed = False
+        for node_key, flags in zip(self.expanded, self.expand_flags):
+            for node in nodes_for_key(node_key):
+                if node._state & mEXPAND_STATE != flags:
+                    node._state = (node._state & ~mEXPAND_STATE) | flags
+                    changed = True
+
+        selected = []
+        for node_key in self.selected:
+            selected.extend(nodes_for_key(node_key))
+        if controller.replace_selection(selected):
+            changed = True
+
+        return changed
+
+    @staticmethod
+    def _node_key_function(key):
+        if key is None:
+            return lambda node: node.id
+        return lambda node: node._columns[key]._value
+
+    def _nodes_for_key_function(self, controller):
+        """Returns a callable mapping a recorded key to the matching nodes."""
+        if self.key is None:
+            def nodes_for_id(node_id):
+                node = controller.node_for_id(node_id)
+                return () if node is None else (node,)
+            return nodes_for_id
+
+        key = self.key
+        recorded = self.expanded or self.selected
+        if not recorded:
+            return lambda value: ()
+
+        # Use the column's index if it has one...
+        if controller._find_indexed(key, recorded[0]) is not None:
+            return lambda value: controller._find_indexed(key, value)
+
+        # ...otherwise map every loaded node once.
+        nodes = {}
+        for node in controller.all_nodes:
+            cell = node._columns.get(key)
+            if cell is not None:
+                nodes.setdefault(cell._value, []).append(node)
+        return lambda value: nodes.get(value, ())
@@ -17,18 +17,120 @@ class TreeValue(object):
     properties are all designed to work this way. If you need something more complex,
     you'll need to provide a custom `display_value` to override our default construct."""
 
+    # Trees can hold hundreds of thousands of cells, so cells don't carry an
+    # instance `__dict__`. Subclasses that don't declare `__slots__` get one back.
+    __slots__ = (
+        '_value', '_cell_command', '_batch_command', '_datatype',
+        '_use_cell_command_for_display', '_display_value', '_input_region',
+        '_color', '_font', '_icon_resource', '_tooltip',
+        '_cache_display', '_markup', '_markup_revision', '_markup_epoch',
+        '_indexes', '_region_id'
+    )
+
+    # Bumped by `invalidate_all()`. Cells with callable values re-render whenever
+    # this changes, since we can't know when the callable's result changes.
+    _epoch = 0
+
+    # Bumped whenever a cell `value` is assigned or a `ChildList()` changes, so
+    # that anything derived from the tree can tell whether it is still current.
+    # See `TreeFilter().refines()`.
+    _tree_revision = 0
+
+    # {region name: regionID}, as blessed by `Lumberjack().bless()`.
+    _region_ids = {}
+
+    # The controller's `Journal()`, if it keeps undo history. See `Lumberjack().undo_budget`.
+    _journal = None
+
     def __init__(self, **kwargs):
-        self._value = value if 'value' in kwargs else None
-        self._cell_command = cell_command if 'cell_command' in kwargs else None
-        self._batch_command = batch_command if 'batch_command' in kwargs else None
-        self._datatype = datatype if 'datatype' in kwargs else None
-        self._use_cell_command_for_display = use_cell_command_for_display if 'use_cell_command_for_display' in kwargs else False
-        self._display_value = display_value if 'display_value' in kwargs else None
-        self._input_region = input_region if 'input_region' in kwargs else None
-        self._color = color if 'color' in kwargs else Color()
-        self._font = font if 'font' in kwargs else Font()
-        self._icon_resource = icon_resource if 'icon_resource' in kwargs else None
-        self._tooltip = tooltip if 'tooltip' in kwargs else None
+        self._value = kwargs.get('value', None)
+        self._cell_command = kwargs.get('cell_command', None)
+        self._batch_command = kwargs.get('batch_command', None)
+        self._datatype = kwargs.get('datatype', None)
+        self._use_cell_command_for_display = kwargs.get('use_cell_command_for_display', False)
+        self._display_value = kwargs.get('display_value', None)
+        self._input_region = kwargs.get('input_region', None)
+        self._region_id = self.region_id(self._input_region)
+        # Most cells never get styled, so default `Color()` and `Font()` objects
+        # are only created when the `color`/`font` properties are first read.
+        self._color = kwargs.get('color', None)
+        self._font = kwargs.get('font', None)
+        self._icon_resource = kwargs.get('icon_resource', None)
+        self._tooltip = kwargs.get('tooltip', None)
+
+        # Rendered rich text for `display_value`, rebuilt only when something
+        # that affects it changes. See `display_value` and `invalidate()`.
+        self._cache_display = kwargs.get('cache_display', True)
+        self._markup = None
+        self._markup_revision = 0
+        self._markup_epoch = 0
+
+        # `ColumnIndex()` objects to notify when `value` changes. Set by the
+        # controller for cells in indexed columns only.
+        self._indexes = None
+
+    @classmethod
+    def _new(cls, value):
+        """Returns an unstyled cell holding `value`, without going through
+        `__init__()`, for bulk loads such as `Lumberjack().load_snapshot()`.
+        Must set every slot that `__init__()` sets."""
+        cell = cls.__new__(cls)
+        cell._value = value
+        cell._cell_command = None
+        cell._batch_command = None
+        cell._datatype = None
+        cell._use_cell_command_for_display = False
+        cell._display_value = None
+        cell._input_region = None
+        cell._region_id = None
+        cell._color = None
+        cell._font = None
+        cell._icon_resource = None
+        cell._tooltip = None
+        cell._cache_display = True
+        cell._markup = None
+        cell._markup_revision = 0
+        cell._markup_epoch = 0
+        cell._indexes = None
+        return cell
+
+    @classmethod
+    def invalidate_all(cls):
+        """Forces every cell with a callable value to re-render on its next draw.
+        Fired by `Lumberjack().refresh_view()` and `rebuild_view()`."""
+        cls._epoch += 1
+
+    def invalidate(self):
+        """Discards the cached `display_value` markup for this cell."""
+        self._markup = None
+
+    def _style_revision(self):
+        # Color and Font objects are mutable and can be shared between cells, so
+        # rather than have them track their owners, each keeps a revision counter.
+        # Counters only ever go up, so their sum changes whenever either one does.
+        revision = 0
+        if self._color:
+            revision += self._color._revision
+        if self._font:
+            revision += self._font._revision
+        return revision
+
+    def cache_display():
+        doc = """Whether the rendered `display_value` markup is cached between draws.
+        Default: True.
+
+        Cells are re-rendered automatically when `value`, `display_value`,
+        `icon_resource`, `color` or `font` changes. Callable values are
+        re-evaluated after every `refresh_view()`/`rebuild_view()`; set this to
+        False if a callable's result must be re-read on every single draw."""
+        def fget(self):
+            return self._cache_display
+        def fset(self, value):
+            self._cache_display = value
+            self._markup = None
+        return locals()
+
+    cache_display = property(**cache_display())
 
     def use_cell_command_for_display():
         doc = """Boolean is True if `cell_command` is a query and should be used
@@ -50,7 +152,14 @@ class TreeValue(object):
         def fget(self):
             return self._value
         def fset(self, value):
+            TreeValue._tree_revision += 1
+            if TreeValue._journal is not None:
+                TreeValue._journal.value_changed(self, self._value, value)
+            if self._indexes is not None:
+                for index in self._indexes:
+                    index.update(self, self._value, value)
             self._value = value
+            self._markup = None
         return locals()
 
     value = property(**value())
@@ -99,6 +208,7 @@ class TreeValue(object):
             return self._icon_resource
         def fset(self, icon_resource):
             self._icon_resource = icon_resource
+            self._markup = None
         return locals()
 
     icon_resource = property(**icon_resource())
@@ -169,60 +279,112 @@ class TreeValue(object):
         in the cell regardless of the actual cell value. Automatically prepends the
         `Value` object's color and font markup as appropriate."""
         def fget(self):
-            if self._display_value is not None:
-                display_string = str(self._display_value)
-            elif self._value is not None:
-                if hasattr(self._value, '__call__'):
-                    display_string = str(self._value())
-                else:
-                    display_string = str(self._value)
-            else:
-                display_string = ''
-
-            # This is a hack.
-            # If for any reason all cells in a row are empty, MODO displays
-            # the row as a tiny sliver 3px tall. That's weird.
-            # Hack is to always provide a space character if the string is empty.
-            display_string = display_string if display_string else " "
-
-            markup = '\x03(i:%s)' % self._icon_resource if self._icon_resource else ''
-            markup += self._font.markup() if self._font else ''
-            markup += self._color.markup() if self._color else ''
-            markup += display_string
+            volatile = hasattr(self._value, '__call__') and self._display_value is None
+            revision = self._style_revision()
+
+            markup = self._markup
+            if markup is not None and self._markup_revision == revision:
+                if not volatile or self._markup_epoch == TreeValue._epoch:
+                    return markup
+
+            markup = self._markup_prefix() + self._display_string()
+
+            if self._cache_display:
+                self._markup = markup
+                self._markup_revision = revision
+                self._markup_epoch = TreeValue._epoch
+
             return markup
         def fset(self, value):
             self._display_value = value
+            self._markup = None
         return locals()
 
     display_value = property(**display_value())
 
-    def intput_region():
+    def _display_string(self):
+        """The text shown in the cell, without markup."""
+        if self._display_value is not None:
+            display_string = str(self._display_value)
+        elif self._value is not None:
+            if hasattr(self._value, '__call__'):
+                display_string = str(self._value())
+            else:
+                display_string = str(self._value)
+        else:
+            display_string = ''
+
+        # This is a hack.
+        # If for any reason all cells in a row are empty, MODO displays
+        # the row as a tiny sliver 3px tall. That's weird.
+        # Hack is to always provide a space character if the string is empty.
+        return display_string if display_string else " "
+
+    def _markup_prefix(self):
+        """Icon, font and color markup that precedes the text."""
+        markup = '\x03(i:%s)' % self._icon_resource if self._icon_resource else ''
+        markup += self._font.markup() if self._font else ''
+        markup += self._color.markup() if self._color else ''
+        return markup
+
+    def highlighted(self, start, stop):
+        """Returns `display_value` markup with characters `start` to `stop` of the
+        displayed text in bold. Used to show live filter matches; never cached."""
+        text = self._display_string()
+        restore = self._font.markup() if self._font else ''
+        return '%s%s\x03(f:FONT_BOLD)%s%s%s' % (
+            self._markup_prefix(), text[:start], text[start:stop],
+            restore or '\x03(f:FONT_DEFAULT)', text[stop:]
+        )
+
+    def input_region():
         doc = """Region for input-mapping. Must correspond to one of the input_region
         strings provided during the `Lumberjack().bless()` operation."""
         def fget(self):
-            return self._intput_region
+            return self._input_region
         def fset(self, value):
-            self._intput_region = value
+            self._input_region = value
+            self._region_id = self.region_id(value)
         return locals()
 
-    intput_region = property(**intput_region())
+    input_region = property(**input_region())
+
+    @classmethod
+    def region_id(cls, region):
+        """Returns the regionID MODO uses for the `region` name, resolved once when
+        a region is assigned so that `treeview_IsInputRegion()` only compares
+        integers. `None` without a region, -1 for names that weren't blessed."""
+        if region is None:
+            return None
+        return cls._region_ids.get(region, -1)
+
+    # Misspelled in earlier versions. Kept so existing kits keep working.
+    intput_region = input_region
 
     def color():
-        doc = "Should be a Lumberjack `Color()` object. Default: None"
+        doc = """Should be a Lumberjack `Color()` object. A default `Color()` is
+        created the first time this is read."""
         def fget(self):
+            if self._color is None:
+                self._color = Color()
             return self._color
         def fset(self, value):
             self._color = value
+            self._markup = None
         return locals()
 
     color = property(**color())
 
     def font():
-        doc = "Should be a Lumberjack `Font()` object. Default: None"
+        doc = """Should be a Lumberjack `Font()` object. A default `Font()` is
+        created the first time this is read."""
         def fget(self):
+            if self._font is None:
+                self._font = Font()
             return self._font
         def fset(self, value):
             self._font = value
+            self._markup = None
         return locals()
 
     font = property(**font())
@@ -2,6 +2,8 @@
 
 import lxifc, lx
 import json
+from types import ClassType, InstanceType
+from TreeNode import fTREE_VIEW_ITEM_EXPAND
 
 class TreeView( lxifc.TreeView,
                 lxifc.Tree,
@@ -31,6 +33,11 @@ class TreeView( lxifc.TreeView,
         if 'root' in kwargs:
             self.__class__._root = kwargs.get('root')
 
+        # The `ColumnSchema()` compiled during `Lumberjack.bless()`. Column
+        # callbacks read straight from its tuples.
+        if 'schema' in kwargs:
+            self.__class__._schema = kwargs.get('schema')
+
         # Moves the primary column to the specified column index.
         #
         # The "primary" column (i.e. the one with the twirly carrot icon for hide/show
@@ -137,9 +144,18 @@ class TreeView( lxifc.TreeView,
 
     def targetNode(self):
         """Returns the targeted layer node in the current tier"""
-        if self.m_currentIndex >= len(self.m_currentNode.children):
+        children = self._tier_children(self.m_currentNode)
+        if self.m_currentIndex >= len(children):
             return None
-        return self.m_currentNode.children[ self.m_currentIndex ]
+        return children[ self.m_currentIndex ]
+
+    def _tier_children(self, node):
+        """Returns the children of `node` as displayed: all of them, or only those
+        left visible by the controller's `filter()`."""
+        tree_filter = self._controller._filter
+        if tree_filter is None:
+            return node._children
+        return tree_filter.children.get(node, ())
 
     # --------------------------------------------------------------------------------------------------
     # Each time the tree is spawned, we create a copy of ourselves at current
@@ -150,24 +166,39 @@ class TreeView( lxifc.TreeView,
         """Spawn a new instance of this tier in the tree."""
 
         # create an instance of our current location in the tree
-        newTree = self.__class__(node=self.m_currentNode, curIndex=self.m_currentIndex)
-
-        # Convert to a tree interface
-        newTreeObj = lx.object.Tree(newTree)
+        newTree = self._spawn_cursor(self.m_currentNode, self.m_currentIndex)
 
         if mode == lx.symbol.iTREE_PARENT:
             # move the tree to the parent tier
-            newTreeObj.ToParent()
+            newTree.tree_ToParent()
 
         elif mode == lx.symbol.iTREE_CHILD:
             # move tree to child tier
-            newTreeObj.ToChild()
+            newTree.tree_ToChild()
 
         elif mode == lx.symbol.iTREE_ROOT:
             #move tree to root tier
-            newTreeObj.ToRoot()
+            newTree.tree_ToRoot()
 
-        return newTreeObj
+        # Convert to a tree interface
+        return lx.object.Tree(newTree)
+
+    def _spawn_cursor(self, node, index):
+        """Returns a new instance of this class pointing at `node` and `index`.
+
+        MODO spawns cursors constantly while drawing and hit-testing, and the
+        class was set up at bless, so spawned cursors skip `__init__()` and its
+        checks and only get their position. They can't be recycled, as MODO
+        doesn't tell us when it lets go of one."""
+        cls = self.__class__
+        if type(cls) is ClassType:
+            # Old-style, like MODO's `lxifc` classes: build the instance and its
+            # `__dict__` in one go.
+            return InstanceType(cls, {'m_currentNode': node, 'm_currentIndex': index})
+        cursor = cls.__new__(cls)
+        cursor.m_currentNode = node
+        cursor.m_currentIndex = index
+        return cursor
 
     def tree_ToParent(self):
         """Step up to the parent tier and set the selection in this tier to the
@@ -175,14 +206,22 @@ class TreeView( lxifc.TreeView,
         m_parent = self.m_currentNode.parent
 
         if m_parent:
-            self.m_currentIndex = self.m_currentNode.index
+            tree_filter = self._controller._filter
+            if tree_filter is None:
+                self.m_currentIndex = self.m_currentNode.index
+            else:
+                self.m_currentIndex = tree_filter.positions.get(self.m_currentNode, 0)
             self.m_currentNode = m_parent
             return True
         return False
 
     def tree_ToChild(self):
         """Move to the child tier and set the selected node"""
-        self.m_currentNode = self.m_currentNode.children[self.m_currentIndex]
+        self.m_currentNode = self._tier_children(self.m_currentNode)[self.m_currentIndex]
+
+        # Lazy children are created the first time MODO looks inside a node.
+        if self.m_currentNode._child_provider is not None:
+            self.m_currentNode.load_children()
 
     def tree_ToRoot(self):
         """Move back to the root tier of the tree"""
@@ -195,12 +234,17 @@ class TreeView( lxifc.TreeView,
     def tree_ChildIsLeaf(self):
         """If the current tier has no children then it is
         considered a leaf"""
-        return (len( self.m_currentNode.children ) == 0)
+        # Don't load lazy children just to draw the twirl.
+        if self.m_currentNode._child_provider is not None and self._controller._filter is None:
+            return not self.m_currentNode.has_children
+        return (len( self._tier_children(self.m_currentNode) ) == 0)
 
     def tree_Count(self):
         """Returns the number of nodes in this tier of
         the tree"""
-        return len( self.m_currentNode.children )
+        if self.m_currentNode._child_provider is not None:
+            self.m_currentNode.load_children()
+        return len( self._tier_children(self.m_currentNode) )
 
     def tree_Current(self):
         """Returns the index of the currently targeted item in
@@ -213,11 +257,21 @@ class TreeView( lxifc.TreeView,
 
     def tree_ItemState(self, guid):
         """Returns the item flags that define the state."""
-        return self.targetNode().state
+        # Fires for every row drawn, so `targetNode()` is inlined. Row color
+        # bits are already included; see `TreeNode().state`.
+        tree_filter = self._controller._filter
+        if tree_filter is None:
+            return self.m_currentNode._children[self.m_currentIndex]._state
+        return tree_filter.children[self.m_currentNode][self.m_currentIndex]._state
 
     def tree_SetItemState(self, guid, state):
         """Set the item flags that define the state."""
-        self.targetNode().state = state
+        node = self.targetNode()
+        collapsed = node._state & fTREE_VIEW_ITEM_EXPAND and not state & fTREE_VIEW_ITEM_EXPAND
+        node.state = state
+
+        if collapsed and node._child_provider is not None:
+            self._controller._node_collapsed(node)
 
 
     # --------------------------------------------------------------------------------------------------
@@ -225,27 +279,29 @@ class TreeView( lxifc.TreeView,
     # --------------------------------------------------------------------------------------------------
 
     def treeview_StoreState(self, uid):
-        lx.notimpl()
+        """Records expand and selection state for the view identified by `uid`."""
+        self._controller.store_state(uid)
 
     def treeview_RestoreState(self, uid):
-        lx.notimpl()
+        """Re-applies the state recorded for `uid`. MODO redraws the view itself."""
+        self._controller.restore_state(uid, notify=False)
 
     def treeview_ColumnCount(self):
         """Returns the number of columns in the treeview."""
-        return len(self._root.column_definitions)
+        return len(self._schema.names)
 
     def treeview_ColumnInternalName(self, columnIndex):
         """Returns the internal name of a given column for use in configs, etc.
         Important that these never change."""
-        if columnIndex < len(self._root.column_definitions):
-            return self._root.column_definitions[columnIndex].get('name')
+        names = self._schema.names
+        if columnIndex < len(names):
+            return names[columnIndex]
 
     def treeview_ColumnIconResource(self, columnIndex):
         """Returns the name of a 13px icon resource for the column header."""
-        if columnIndex < len(self._root.column_definitions):
-            icon_resource = self._root.column_definitions[columnIndex].get('icon_resource')
-            if icon_resource:
-                return icon_resource
+        icon_resources = self._schema.icon_resources
+        if columnIndex < len(icon_resources):
+            return icon_resources[columnIndex]
         # Without returning something, MODO will crash.
         return ""
 
@@ -258,15 +314,9 @@ class TreeView( lxifc.TreeView,
         # define LXiTREEJUST_CENTER              1
         # define LXiTREEJUST_RIGHT               2
 
-        lookup = {
-            'left': 0,
-            'center': 1,
-            'right': 2
-        }
-
-        if columnIndex < len(self._root.column_definitions):
-            string_value = self._root.column_definitions[columnIndex].get('justify', 'left')
-            return lookup[string_value]
+        justifications = self._schema.justifications
+        if columnIndex < len(justifications):
+            return justifications[columnIndex]
 
     def treeview_PrimaryColumnPosition(self):
         """Returns True for the column that should be 'primary', i.e. should have the carrot
@@ -275,17 +325,17 @@ class TreeView( lxifc.TreeView,
 
     def treeview_ColumnByIndex(self, columnIndex):
         """Returns a tuple with the name and width of a given column."""
+        schema = self._schema
         try:
-            name = self._root.column_definitions[columnIndex]['name']
-            width = self._root.column_definitions[columnIndex]['width']
-            return (name, width)
-        except:
-            raise Exception('treeview_ColumnByIndex failed. Possibly malformed column dictionary.')
+            return (schema.names[columnIndex], schema.widths[columnIndex])
+        except IndexError:
+            raise Exception('treeview_ColumnByIndex failed. No column at index %s.' % columnIndex)
 
     def treeview_ToPrimary(self):
         """Move the tree to the primary selection"""
-        if self._controller.primary:
-            self.m_currentNode = self._controller.primary
+        primary = self._controller.primary
+        if primary and (self._controller._filter is None or primary in self._controller._filter.positions):
+            self.m_currentNode = primary
             self.tree_ToParent()
             return True
         return False
@@ -296,21 +346,22 @@ class TreeView( lxifc.TreeView,
 
     def treeview_IsDescendantSelected (self):
         # Backwards for some reason...
-        for child in self.targetNode().children:
+        for child in self.targetNode()._children:
             if child.selected:
                 return False
         return True
 
     def treeview_Select(self, mode):
+        # Each mode is a single selection change, so that `select_event()`
+        # fires only once per click.
         if mode == lx.symbol.iTREEVIEW_SELECT_PRIMARY:
-            self._controller.clear_selection()
-            self.targetNode().selected = True
+            self._controller.replace_selection([self.targetNode()])
 
         elif mode == lx.symbol.iTREEVIEW_SELECT_ADD:
-            self.targetNode().selected = True
+            self._controller.select([self.targetNode()])
 
         elif mode == lx.symbol.iTREEVIEW_SELECT_REMOVE:
-            self.targetNode().selected = False
+            self._controller.deselect([self.targetNode()])
 
         elif mode == lx.symbol.iTREEVIEW_SELECT_CLEAR:
             self._controller.clear_selection()
@@ -331,7 +382,7 @@ class TreeView( lxifc.TreeView,
         # of the override, and the queried value from CommandCell() is the default.
         # Mostly you use the override if you want an eyeball icon instead of a checkmark, for example.
 
-        column_name = self._root.column_definitions[columnIndex]['name']
+        column_name = self._schema.names[columnIndex]
         cell_value_obj = self.targetNode().columns.get(column_name)
         if cell_value_obj is not None:
             if cell_value_obj.cell_command is not None:
@@ -346,7 +397,7 @@ class TreeView( lxifc.TreeView,
         # BatchCommand() is used if you have multiple cells selected, and is
         # used to change all of them with a single click.
 
-        column_name = self._root.column_definitions[columnIndex]['name']
+        column_name = self._schema.names[columnIndex]
         cell_value_obj = self.targetNode().columns.get(column_name)
         if cell_value_obj is not None:
             if cell_value_obj.batch_command is not None:
@@ -373,24 +424,29 @@ class TreeView( lxifc.TreeView,
         """Returns True if the provided columnIndex corresponds to the provided regionID."""
 
         # NOTE: This code fires very, very frequently.
-        # Speed is very important.
-
-        column_name = self._root.column_definitions[columnIndex]['name']
+        # Speed is very important. Region names are resolved to regionIDs when
+        # they're assigned, so all that's left here is comparing integers.
 
+        # Same as `targetNode()`, without the method calls.
+        tree_filter = self._controller._filter
+        if tree_filter is None:
+            children = self.m_currentNode._children
+        else:
+            children = tree_filter.children.get(self.m_currentNode, ())
         try:
-            target_region = self.targetNode().columns[column_name].input_region
-        except AttributeError:
-            # The column has no input region assignment.
+            node = children[self.m_currentIndex]
+            region = node._columns[self._schema.names[columnIndex]]._region_id
+        except (AttributeError, KeyError, IndexError):
             return False
 
-        # regionID zero is reserved for .anywhere. It should always return True.
-        if regionID == 0:
-            return True
-
-        if target_region == self._input_regions[regionID]:
-            return True
+        if region is None:
+            # Cells without a region of their own use the row's.
+            region = node._region_id
+            if region is None:
+                return False
 
-        return False
+        # regionID zero is reserved for .anywhere. It should always return True.
+        return regionID == 0 or region == regionID
 
     def treeview_SupportedDragDropSourceTypes(self, columnIndex):
         """Wisdom from Joe:
@@ -426,7 +482,13 @@ class TreeView( lxifc.TreeView,
         """
         if columnIndex != 0:
             return ""
-        if all(node.draggable() for node in self._root.selected_descendants):
+        # Drop locations are indices into the full tree, not the filtered one.
+        if self._controller._filter is not None:
+            return ""
+        # The same nodes `treeview_GetDragDropSourceObject()` puts in the payload:
+        # attributes can't be dragged, so a selection of only attributes can't either.
+        nodes = self._controller.selected_descendants
+        if nodes and all(node.draggable() for node in nodes):
             return self.__class__._controller._dropsource_command
         else:
             return ""
@@ -449,10 +511,10 @@ class TreeView( lxifc.TreeView,
         # Add unique key
         va.AddString(self.__class__._controller._drop_server_unique_key)
 
-        # Add selected children indices
-        for child in self._root.selected_descendants:
+        # Add selected children ids
+        for child in self._controller.selected_descendants:
             assert(child.draggable())
-            va.AddString(json.dumps(child.path))
+            va.AddString(str(child.id))
 
         return va
 
@@ -463,6 +525,9 @@ class TreeView( lxifc.TreeView,
         if location != 0 and location != 2:
             return None
 
+        if self._controller._filter is not None:
+            return None
+
         # Create a string value object.
         cmd_svc = lx.service.Command ()
         vaQuery = cmd_svc.CreateQueryObject(lx.symbol.sTYPE_STRING)
@@ -480,7 +545,8 @@ class TreeView( lxifc.TreeView,
         else:
             idx = self.m_currentIndex
 
-        va.AddString(json.dumps(self.m_currentNode.path + [idx]))
+        # Parent id and index amongst its children
+        va.AddString(json.dumps([self.m_currentNode.id, idx]))
 
         return va
     # --------------------------------------------------------------------------------------------------
@@ -488,7 +554,7 @@ class TreeView( lxifc.TreeView,
     # --------------------------------------------------------------------------------------------------
 
     def attr_Count(self):
-        return len(self._root.column_definitions)
+        return len(self._schema.names)
 
     def attr_GetString(self, index):
         """Returns a rich text string to display in a cell. Rich text can include
@@ -506,26 +572,37 @@ class TreeView( lxifc.TreeView,
 
         (NOTE: Empty cells render with zero height in the tree. Ugly.)"""
 
-        column_definitions = self._root.column_definitions
+        names = self._schema.names
         node = self.targetNode()
 
-        # I'll be honest: I don't understand this loop. It's here for some
-        # reason, and the method fails if I try to do it without the loop.
-        # So it's here. If you can think of a better way, by all means.
-        for n in range(len(column_definitions)):
-            if index == n:
+        # MODO asks for indices outside the columns too (which is what the
+        # loop over every column used to guard against).
+        if node is None or not 0 <= index < len(names):
+            lx.notimpl()
 
-                # If we're using a treeview_CellCommand() query to render the cell,
-                # we don't send a string.
-                if node.columns[column_definitions[n]['name']].use_cell_command_for_display:
-                    lx.notimpl()
-
-                try:
-                    # Print the `display_value` in the cell
-                    return node.columns[column_definitions[n]['name']].display_value
-                except:
-                    break
+        column_name = names[index]
+        cell = node._columns.get(column_name)
 
         # If node.columns[] doesn't contain a key for some reason,
         # we need to fail gracefully lest we crash MODO.
-        lx.notimpl()
+        if cell is None:
+            lx.notimpl()
+
+        # If we're using a treeview_CellCommand() query to render the cell,
+        # we don't send a string.
+        if cell.use_cell_command_for_display:
+            lx.notimpl()
+
+        try:
+            # Show live filter matches in bold.
+            tree_filter = self._controller._filter
+            if tree_filter is not None and tree_filter.column_name == column_name \
+                    and node in tree_filter.match_set:
+                span = tree_filter.span(cell._display_string())
+                if span is not None:
+                    return cell.highlighted(*span)
+
+            # Print the `display_value` in the cell
+            return cell.display_value
+        except Exception:
+            lx.notimpl()
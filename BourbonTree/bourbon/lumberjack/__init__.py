@@ -5,7 +5,18 @@ import traceback
 try:
     from Lumberjack import *
     from TreeNode import *
+    from ChildList import *
+    from traversal import *
+    from ColumnSchema import *
+    from ColumnIndex import *
+    from TreeFilter import *
+    from Reconciliation import *
+    from TreeState import *
+    from Journal import *
     from TreeView import *
+    from ColumnStore import *
+    from MappedColumnStore import *
+    from ColumnarLumberjack import *
     from Color import *
     from RowColor import *
     from Font import *
@@ -0,0 +1,421 @@
+# python
+
+"""Binary snapshots of a whole tree, for `Lumberjack().save_snapshot()` and
+`Lumberjack().load_snapshot()`.
+
+A snapshot file is:
+
+- `SNAPSHOT_MAGIC` and the format version, as a little-endian unsigned short
+- a header dict: the column names and the controller class name
+- chunks of up to `CHUNK_SIZE` node records, each a marshalled tuple of the
+  node classes first used in the chunk and the list of records
+- a trailer dict: the node count and the position of the primary node
+
+Records are written in tree order, so the file is written and read one chunk
+at a time, and a node's parent is always loaded before it. Each record is a
+tuple:
+
+```
+(parent, kind, node class, state, values, styles, fields)
+```
+
+- `parent`      position of the parent record, 0 being the root
+- `kind`        `CHILD`, `ATTRIBUTE` or `TAIL_COMMAND`
+- `node class`  position in the table of classes read so far
+- `state`       `TreeNode().state` flags, e.g. expanded, including `row_color`
+- `values`      cell values in column order
+- `styles`      `None`, or per column `None` or a tuple of `TreeValue()` styling
+                (display value, color, font, icon, tooltip, input region, commands...)
+- `fields`      `None`, or a dict of whatever else isn't a default:
+                `selectable`, `selected`, `input_region`, `meta` (which holds
+                the `row_color` name), cells outside the schema, cell classes
+                other than `TreeValue()`, and the `__dict__` of node subclasses
+                without `__slots__`
+
+Nodes are restored the way unpickling restores objects: as instances of the
+class they were saved from, without calling `__init__()`. Values, display
+values, tooltips, `meta` and `__dict__` contents have to be `marshal`-able:
+`None`, booleans, numbers, strings, and tuples, lists and dicts of those.
+Node ids, child providers and callables aren't saved.
+
+Like `marshal` itself, snapshots are meant as a local cache, not an exchange
+format: only load files you wrote yourself."""
+
+import gc
+import marshal
+import os
+import struct
+import sys
+import tempfile
+from contextlib import contextmanager
+from Color import Color
+from Font import Font
+from TreeValue import TreeValue
+
+SNAPSHOT_MAGIC = 'LJSNAP\r\n'
+SNAPSHOT_VERSION = 1
+
+# Records per marshalled chunk. Large enough that `marshal` does nearly all of
+# the work, small enough that a chunk is never a noticeable amount of memory.
+CHUNK_SIZE = 4096
+
+# Record kinds: which of its parent's lists a node belongs to.
+CHILD = 0
+ATTRIBUTE = 1
+TAIL_COMMAND = 2
+
+# `marshal` format version, pinned so that files don't depend on the default.
+_MARSHAL_VERSION = 2
+
+_VERSION_FORMAT = '<H'
+
+# Styling of a `TreeValue()` that was never styled. See `_cell_style()`.
+_DEFAULT_STYLE = (None, None, None, None, None, None, None, None, None, False, True)
+
+
+def save_snapshot(controller, path):
+    """Writes `controller`'s tree to `path`. Returns the number of nodes saved."""
+    names = controller._schema.names
+    primary = controller._primary
+
+    # Nodes that can't be saved are only found halfway through the walk, so
+    # the file is only replaced once it's complete.
+    with replacing_file(path) as stream:
+        return _write_nodes(controller, stream, names, primary)
+
+
+@contextmanager
+def replacing_file(path):
+    """Context manager yielding a stream to write the new contents of `path`
+    to. The stream is a temporary file next to `path`, renamed over it once the
+    block completes; if the block raises, `path` is left as it was. Renaming is
+    not atomic on Windows, where `path` has to be removed first."""
+    descriptor, temporary_path = tempfile.mkstemp(
+        prefix=os.path.basename(path) + '.', suffix='.tmp', dir=os.path.dirname(os.path.abspath(path))
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as stream:
+            yield stream
+        try:
+            os.rename(temporary_path, path)
+        except OSError:
+            if not os.path.exists(path):
+                raise
+            os.remove(path)
+            os.rename(temporary_path, path)
+    except:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise
+
+
+def _write_nodes(controller, stream, names, primary):
+    """Writes the whole snapshot to `stream`. Returns the number of nodes written."""
+    primary_position = None
+
+    # {class: position in the class table}, and the classes not written yet.
+    classes = {}
+    new_classes = []
+
+    stream.write(SNAPSHOT_MAGIC)
+    stream.write(struct.pack(_VERSION_FORMAT, SNAPSHOT_VERSION))
+    _dump({'columns': names, 'controller': controller.__class__.__name__}, stream)
+
+    chunk = []
+    position = 0
+    for node, parent_position, kind in _walk(controller.root):
+        position += 1
+        if node is primary:
+            primary_position = position
+        chunk.append(_record(node, parent_position, kind, names, classes, new_classes))
+        if len(chunk) == CHUNK_SIZE:
+            _dump((tuple(new_classes), chunk), stream)
+            chunk = []
+            del new_classes[:]
+    if chunk:
+        _dump((tuple(new_classes), chunk), stream)
+
+    _dump({'count': position, 'primary': primary_position}, stream)
+    return position
+
+
+def load_snapshot(controller, path):
+    """Replaces `controller`'s tree with the one saved at `path`. Returns the
+    number of nodes loaded."""
+    with open(path, 'rb') as stream:
+        if stream.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+            raise Exception('%s is not a Lumberjack snapshot.' % path)
+        version = struct.unpack(_VERSION_FORMAT, stream.read(struct.calcsize(_VERSION_FORMAT)))[0]
+        if version != SNAPSHOT_VERSION:
+            raise Exception('Unsupported snapshot version %d in %s.' % (version, path))
+
+        header = _load(stream, path)
+        names = controller._schema.names
+        if tuple(header['columns']) != names:
+            raise Exception('Snapshot columns (%s) do not match the tree (%s).' % (
+                ', '.join(header['columns']), ', '.join(names)))
+
+        controller.clear()
+
+        # See `Lumberjack().add_children()`. Splicing creates a list per
+        # parent, so it is done with the collector off as well.
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            nodes, lists, trailer = _read_nodes(controller, stream, path, names)
+            if trailer.get('count') != len(nodes) - 1:
+                raise Exception('Snapshot %s is incomplete.' % path)
+
+            # Every parent's lists are spliced in at once.
+            children, attributes, tail_commands = lists
+            for position, siblings in children.iteritems():
+                nodes[position].children = siblings
+            for position, siblings in attributes.iteritems():
+                nodes[position].attributes = siblings
+            for position, siblings in tail_commands.iteritems():
+                nodes[position].tail_commands = siblings
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    if trailer.get('primary') is not None:
+        controller.primary = nodes[trailer['primary']]
+
+    return len(nodes) - 1
+
+
+def _read_nodes(controller, stream, path, names):
+    """Creates the nodes of every chunk. Returns the nodes, root first, the
+    (children, attributes, tail commands) lists of each parent by parent
+    position, and the trailer."""
+    nodes = [controller.root]
+    lists = ({}, {}, {})
+    classes = []
+    column_count = len(names)
+    new_cell = TreeValue._new
+    indexed = bool(controller._column_indexes)
+    # Whether each node is a child below the root, i.e. indexed. See `Lumberjack()._indexable()`.
+    reachable = [True]
+
+    while True:
+        chunk = _load(stream, path)
+        if isinstance(chunk, dict):
+            return nodes, lists, chunk
+
+        new_classes, records = chunk
+        classes.extend(_resolve_class(name) for name in new_classes)
+
+        for parent_position, kind, class_position, state, values, styles, fields in records:
+            if len(values) != column_count:
+                raise Exception('Snapshot %s does not match the columns.' % path)
+
+            if fields is None:
+                columns = dict(zip(names, map(new_cell, values)))
+                if styles is not None:
+                    _style_cells(columns, names, styles)
+                node = classes[class_position]._new(nodes[parent_position], columns, kind == ATTRIBUTE)
+                node._state = state
+            else:
+                node = _restore_node(controller, classes, nodes[parent_position], kind,
+                                     classes[class_position], state, names, values, styles, fields)
+
+            if indexed:
+                reachable.append(kind == CHILD and reachable[parent_position])
+                if reachable[-1]:
+                    controller._index_node(node)
+            nodes.append(node)
+
+            siblings = lists[kind].get(parent_position)
+            if siblings is None:
+                siblings = lists[kind][parent_position] = []
+            siblings.append(node)
+
+
+def _restore_node(controller, classes, parent, kind, node_class, state, names, values, styles, fields):
+    """Creates the node for a record with `fields`."""
+    cell_classes = fields.get('cell_classes', {})
+
+    def new_cell(name, value):
+        if name in cell_classes:
+            return classes[cell_classes[name]]._new(value)
+        return TreeValue._new(value)
+
+    columns = dict((name, new_cell(name, value)) for name, value in zip(names, values))
+    if styles is not None:
+        _style_cells(columns, names, styles)
+
+    for name, (value, style) in fields.get('extra_columns', {}).iteritems():
+        cell = columns[name] = new_cell(name, value)
+        if style is not None:
+            _style_cell(cell, style)
+
+    node = node_class._new(parent, columns, kind == ATTRIBUTE)
+    node._state = state
+    node._selectable = fields.get('selectable', True)
+    node._meta = fields.get('meta')
+    if 'input_region' in fields:
+        node._input_region = fields['input_region']
+        node._region_id = TreeValue.region_id(node._input_region)
+    if '__dict__' in fields:
+        node.__dict__.update(fields['__dict__'])
+    if fields.get('selected'):
+        node._selected = True
+        controller._update_selection(node, True)
+    return node
+
+
+def _resolve_class(name):
+    """Returns the class saved as `module:name` by `_class_name()`."""
+    module_name, class_name = name.split(':')
+    module = sys.modules.get(module_name)
+    if module is None:
+        __import__(module_name)
+        module = sys.modules[module_name]
+    return getattr(module, class_name)
+
+
+def _class_name(cls):
+    return '%s:%s' % (cls.__module__, cls.__name__)
+
+
+def _class_position(cls, classes, new_classes):
+    position = classes.get(cls)
+    if position is None:
+        position = classes[cls] = len(classes)
+        new_classes.append(_class_name(cls))
+    return position
+
+
+def _walk(root):
+    """Yields (node, parent position, kind) for every node below `root`, in
+    tree order: each node before its attributes, then its children, then its
+    tail commands. Positions count from 1 in the order nodes are yielded."""
+    stack = []
+    _push(stack, root, 0)
+    position = 0
+    while stack:
+        node, parent_position, kind = stack.pop()
+        if node._child_provider is not None:
+            raise Exception('Nodes with a child_provider cannot be saved to a snapshot.')
+        position += 1
+        yield node, parent_position, kind
+        _push(stack, node, position)
+
+
+def _push(stack, node, position):
+    """Pushes the nodes below `node` so that they come off the stack in order."""
+    for kind, siblings in ((TAIL_COMMAND, node._tail_commands), (CHILD, node._children),
+                           (ATTRIBUTE, node._attributes)):
+        for index in xrange(len(siblings) - 1, -1, -1):
+            stack.append((siblings[index], position, kind))
+
+
+def _record(node, parent_position, kind, names, classes, new_classes):
+    columns = node._columns
+    values = []
+    styles = []
+    styled = False
+    cell_classes = {}
+    for name in names:
+        cell = columns.get(name)
+        if cell is None:
+            values.append(None)
+            styles.append(None)
+            continue
+        values.append(cell._value)
+        style = _cell_style(cell)
+        styles.append(style)
+        if style is not None:
+            styled = True
+        if type(cell) is not TreeValue:
+            cell_classes[name] = _class_position(type(cell), classes, new_classes)
+
+    fields = {}
+    if not node._selectable:
+        fields['selectable'] = False
+    if node._selected:
+        fields['selected'] = True
+    if node._input_region is not None:
+        fields['input_region'] = node._input_region
+    if node._meta:
+        fields['meta'] = node._meta
+    if len(columns) > len(names):
+        extra_columns = fields['extra_columns'] = {}
+        for name, cell in columns.iteritems():
+            if name not in names:
+                extra_columns[name] = (cell._value, _cell_style(cell))
+                if type(cell) is not TreeValue:
+                    cell_classes[name] = _class_position(type(cell), classes, new_classes)
+    if cell_classes:
+        fields['cell_classes'] = cell_classes
+    if getattr(node, '__dict__', None):
+        fields['__dict__'] = node.__dict__
+
+    return (
+        parent_position, kind, _class_position(type(node), classes, new_classes), node._state,
+        tuple(values), tuple(styles) if styled else None, fields or None
+    )
+
+
+def _cell_style(cell):
+    """Returns the styling of `cell` as a tuple, or None if it has none."""
+    color = cell._color
+    if color is not None:
+        color = (tuple(color._internal_rgb), color._special) if color._internal_rgb or color._special else None
+    font = cell._font
+    if font is not None:
+        font = font._font
+
+    style = (
+        cell._display_value, color, font, cell._icon_resource, cell._tooltip,
+        cell._input_region, cell._cell_command, cell._batch_command, cell._datatype,
+        cell._use_cell_command_for_display, cell._cache_display
+    )
+    return None if style == _DEFAULT_STYLE else style
+
+
+def _style_cells(columns, names, styles):
+    for name, style in zip(names, styles):
+        if style is not None:
+            _style_cell(columns[name], style)
+
+
+def _style_cell(cell, style):
+    """Applies a tuple returned by `_cell_style()` to a new cell."""
+    (display_value, color, font, icon_resource, tooltip, input_region, cell_command,
+     batch_command, datatype, use_cell_command_for_display, cache_display) = style
+
+    if color is not None:
+        cell._color = Color()
+        cell._color._internal_rgb = list(color[0])
+        cell._color._special = color[1]
+    if font is not None:
+        cell._font = Font()
+        cell._font._font = font
+
+    cell._display_value = display_value
+    cell._icon_resource = icon_resource
+    cell._tooltip = tooltip
+    cell._input_region = input_region
+    cell._region_id = TreeValue.region_id(input_region)
+    cell._cell_command = cell_command
+    cell._batch_command = batch_command
+    cell._datatype = datatype
+    cell._use_cell_command_for_display = use_cell_command_for_display
+    cell._cache_display = cache_display
+
+
+def _dump(value, stream):
+    try:
+        marshal.dump(value, stream, _MARSHAL_VERSION)
+    except ValueError:
+        raise Exception('Snapshots can only hold values, display values, tooltips, meta and '
+                        'node attributes made of None, booleans, numbers, strings, tuples, '
+                        'lists and dicts.')
+
+
+def _load(stream, path):
+    try:
+        return marshal.load(stream)
+    except (EOFError, ValueError, TypeError):
+        raise Exception('Snapshot %s is truncated or corrupt.' % path)
@@ -0,0 +1,86 @@
+# python
+
+"""Iterative tree walks.
+
+Each walk is a generator driven by an explicit stack (or queue), so it uses
+constant Python stack depth however deep the tree is, builds no intermediate
+lists, and stops as soon as the caller stops iterating:
+
+```
+for node in walk_preorder(Lumberjack().root):
+    if node.columns['name'].value == 'Wild Turkey':
+        break
+```
+
+All walks take the same options:
+
+- `prune`:          callable taking a node; if it returns True, the node is still
+                    visited but nothing below it is, e.g. to skip collapsed subtrees:
+                    `prune=lambda node: not node.state & fTREE_VIEW_ITEM_EXPAND`
+- `attributes`:     also visit attribute nodes (before each node's children)
+- `include_root`:   also visit the node the walk starts from
+
+`prune` never applies to the starting node. Only nodes that are loaded are
+visited; see `TreeNode().child_provider`. The walks only rely on `_children`
+and `_attributes`, so they work on `TreeNode()` and `ColumnarNode()` alike."""
+
+from collections import deque
+
+
+def walk_preorder(root, prune=None, attributes=False, include_root=False):
+    """Yields each node before its descendants, top to bottom as displayed."""
+    if include_root:
+        yield root
+
+    stack = list(reversed(root._children))
+    if attributes:
+        stack.extend(reversed(root._attributes))
+
+    while stack:
+        node = stack.pop()
+        yield node
+        if prune is None or not prune(node):
+            stack.extend(reversed(node._children))
+            if attributes:
+                stack.extend(reversed(node._attributes))
+
+
+def walk_postorder(root, prune=None, attributes=False, include_root=False):
+    """Yields each node after all of its descendants, e.g. for bottom-up deletes."""
+    # (node, whether its descendants have already been pushed)
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded or (node is not root and prune is not None and prune(node)):
+            if node is not root or include_root:
+                yield node
+            continue
+
+        stack.append((node, True))
+        stack.extend((child, False) for child in reversed(node._children))
+        if attributes:
+            stack.extend((child, False) for child in reversed(node._attributes))
+
+
+def walk_breadth_first(root, prune=None, attributes=False, include_root=False):
+    """Yields nodes tier by tier: all children of `root`, then all grandchildren, etc."""
+    if include_root:
+        yield root
+
+    queue = deque(root._attributes) if attributes else deque()
+    queue.extend(root._children)
+
+    while queue:
+        node = queue.popleft()
+        yield node
+        if prune is None or not prune(node):
+            if attributes:
+                queue.extend(node._attributes)
+            queue.extend(node._children)
+
+
+WALKS = {
+    'pre': walk_preorder,
+    'post': walk_postorder,
+    'breadth': walk_breadth_first
+}
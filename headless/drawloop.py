@@ -0,0 +1,336 @@
+# python
+
+"""MODO draw-loop simulator for benchmarking Lumberjack trees outside of MODO.
+
+Blesses the BourbonTree example kit against the headless `lx`/`lxifc`
+stand-ins, fills it with generated rows, and then walks the blessed
+`_TreeViewSubclass` the way MODO's treeview pane does:
+
+- On `NewShape`, the whole expanded hierarchy is walked with `tree_Spawn`,
+  `tree_ToChild`, `tree_Count`, `tree_SetCurrent` and `tree_ItemState`,
+  keeping a spawned cursor for every visible row.
+- On every frame, each row in the viewport is re-spawned and drawn with
+  `tree_ItemState` and `attr_GetString` per column, then hit-tested with
+  `treeview_IsInputRegion` for every column and region.
+
+Usage (Python 2.7, like MODO):
+
+    python2 headless/drawloop.py --nodes 10000 100000 --shape flat balanced
+
+Every interface call goes through the `lx.object` wrappers, so `lx.calls`
+holds an exact tally of server calls per frame.
+
+With `--columnar`, the same columns are blessed as a `ColumnarLumberjack`
+instead, to compare the columnar backend against the node-per-row tree.
+
+With `--hover`, only `treeview_IsInputRegion` is timed: a third of the rows
+get a row input region, a third a cell region, and every cell of every row
+is hit-tested against every region, as when sweeping the pointer over them.
+Only one Lumberjack can be blessed per process."""
+
+import argparse
+import os
+import runpy
+import sys
+from timeit import default_timer as clock
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+KIT = os.path.join(os.path.dirname(HERE), 'BourbonTree')
+
+sys.path.insert(0, HERE)
+sys.path.insert(1, KIT)
+
+import lx
+
+SERVER_NAME = 'bourbon_tree'
+COLUMNAR_SERVER_NAME = 'bourbon_columns'
+
+# `fTREE_VIEW_ITEM_EXPAND` in TreeNode.py
+fEXPANDED = 0x00000002
+
+
+def bless(columnar=False):
+    """Blesses the BourbonTree kit exactly like MODO would at startup, and
+    returns the `BourbonTree()` controller. Only once per process.
+
+    With `columnar`, blesses the BourbonTree columns as a `ColumnarLumberjack()`
+    instead and returns its controller."""
+    if columnar:
+        return bless_columnar()
+
+    if SERVER_NAME not in lx.servers:
+        runpy.run_path(os.path.join(KIT, 'lxserv', 'bourbon_bless.py'))
+
+    from bourbon import BourbonTree
+    return BourbonTree()
+
+
+def bless_columnar():
+    from bourbon.lumberjack import ColumnarLumberjack
+
+    class BourbonColumns(ColumnarLumberjack):
+        pass
+
+    if COLUMNAR_SERVER_NAME not in lx.servers:
+        BourbonColumns().bless(
+            viewport_type = 'vpinfo',
+            nice_name = 'Bourbon Columns',
+            internal_name = COLUMNAR_SERVER_NAME,
+            ident = 'BBCL',
+            column_definitions = {
+                'list': [
+                    {'name': 'name', 'width': -2},
+                    {'name': 'price', 'width': -1, 'typecode': 'd'}
+                ]
+            },
+            input_regions = ['(anywhere)'],
+            notifiers = []
+        )
+
+    return BourbonColumns()
+
+
+def build_tree(lumberjack, count, shape='flat', fanout=10):
+    """Fills the tree with `count` generated rows and expands all of them.
+
+    :param shape:   'flat' puts every row directly under the root,
+                    'balanced' fills a tree `fanout` children wide per node,
+                    'deep' hangs chains `fanout * 10` rows deep off the root."""
+
+    lumberjack.clear()
+
+    parents = [lumberjack.root]
+    depth = fanout * 10
+    for n in range(count):
+        if shape == 'flat':
+            parent = lumberjack.root
+        elif shape == 'balanced':
+            parent = parents[n // fanout]
+        elif shape == 'deep':
+            parent = lumberjack.root if n % depth == 0 else parents[-1]
+        else:
+            raise ValueError('Unknown tree shape: %s' % shape)
+
+        node = lumberjack.add_child(parent=parent)
+        node.columns['name'].value = 'Bourbon %d' % n
+        node.columns['price'].value = 10 + (n % 9000) / 100.0
+        node.add_state_flag(fEXPANDED)
+        parents.append(node)
+
+    lumberjack.rebuild_view()
+
+
+class DrawLoop(object):
+    """Plays the part of a MODO treeview pane for a blessed `TreeView` server.
+
+    Registers itself as a tree listener, so `notify_NewShape()` marks the
+    row cache dirty and the next frame walks the hierarchy again."""
+
+    def __init__(self, server_class, viewport_rows=40):
+        self.view = server_class()
+        self.viewport_rows = viewport_rows
+        self.rows = []
+        self.shape_dirty = True
+        self.attributes_dirty = True
+        self.shape_walks = 0
+
+        treeview = lx.object.TreeView(self.view)
+        self.column_count = treeview.ColumnCount()
+        self.region_count = len(server_class._input_regions)
+
+        self.view.lport_AddListener(self)
+
+    # Tree listener
+    # -------------
+
+    def tlist_NewShape(self):
+        self.shape_dirty = True
+
+    def tlist_NewAttributes(self):
+        self.attributes_dirty = True
+
+    # Walking
+    # -------
+
+    def walk_shape(self):
+        """Walks every expanded tier of the tree and caches a cursor per row."""
+        rows = []
+        root = lx.object.Tree(self.view).Spawn(lx.symbol.iTREE_ROOT)
+
+        # (tier cursor, tier count, next index, depth)
+        stack = [(root, root.Count(), 0, 0)]
+        while stack:
+            tier, count, index, depth = stack.pop()
+            if index >= count:
+                continue
+
+            tier.SetCurrent(index)
+            rows.append((tier.Spawn(lx.symbol.iTREE_CURRENT), depth))
+            stack.append((tier, count, index + 1, depth))
+
+            if tier.ItemState(0) & fEXPANDED:
+                child = tier.Spawn(lx.symbol.iTREE_CHILD)
+                child_count = child.Count()
+                if child_count:
+                    child.SetCurrent(0)
+                    stack.append((child, child_count, 0, depth + 1))
+
+        self.rows = rows
+        self.shape_dirty = False
+        self.shape_walks += 1
+        return rows
+
+    def draw_frame(self, first_row=0, hover=True):
+        """Draws the rows in the viewport starting at `first_row`. With `hover`
+        enabled, every visible cell is also hit-tested against every region."""
+        if self.shape_dirty:
+            self.walk_shape()
+
+        columns = range(self.column_count)
+        regions = range(self.region_count)
+
+        for row, depth in self.rows[first_row:first_row + self.viewport_rows]:
+            cursor = row.Spawn(lx.symbol.iTREE_CURRENT)
+            cursor.ItemState(0)
+
+            attributes = lx.object.Attributes(cursor)
+            treeview = lx.object.TreeView(cursor)
+            for column in columns:
+                try:
+                    attributes.GetString(column)
+                except lx.NotImpl:
+                    pass
+
+                if hover:
+                    for region in regions:
+                        treeview.IsInputRegion(column, region)
+
+        self.attributes_dirty = False
+
+    def hover_sweep(self):
+        """Hit-tests every cell of every row against every region, as MODO does
+        while the pointer sweeps over the rows. Returns (seconds, calls)."""
+        if self.shape_dirty:
+            self.walk_shape()
+
+        columns = range(self.column_count)
+        regions = range(self.region_count)
+        # Bound up front, so the sweep times the server rather than the wrappers.
+        hit_tests = [lx.object.TreeView(row).IsInputRegion for row, depth in self.rows]
+
+        calls = 0
+        start = clock()
+        for is_input_region in hit_tests:
+            for column in columns:
+                for region in regions:
+                    is_input_region(column, region)
+            calls += len(columns) * len(regions)
+        return clock() - start, calls
+
+    def scroll(self, frames, hover=True):
+        """Draws `frames` frames scrolling evenly from the top of the tree to
+        the bottom. Returns a list of per-frame timings in seconds."""
+        if self.shape_dirty:
+            self.walk_shape()
+
+        last = max(len(self.rows) - self.viewport_rows, 0)
+        timings = []
+        for frame in range(frames):
+            first_row = last * frame // max(frames - 1, 1)
+            start = clock()
+            self.draw_frame(first_row, hover)
+            timings.append(clock() - start)
+        return timings
+
+
+def benchmark(lumberjack, server_class, count, shape, frames, viewport_rows):
+    """Builds a tree, walks it once and scrolls through it. Returns a dict of
+    timings (seconds) and average call counts per frame."""
+    start = clock()
+    build_tree(lumberjack, count, shape)
+    build_time = clock() - start
+
+    loop = DrawLoop(server_class, viewport_rows)
+
+    lx.reset_calls()
+    start = clock()
+    loop.walk_shape()
+    walk_time = clock() - start
+    walk_calls = sum(lx.calls.values())
+
+    lx.reset_calls()
+    timings = loop.scroll(frames)
+    frame_calls = dict((name, total / float(frames)) for name, total in lx.calls.items())
+
+    lumberjack.treeview.removeListenerClient(loop)
+
+    return {
+        'nodes': count,
+        'shape': shape,
+        'rows': len(loop.rows),
+        'build': build_time,
+        'walk': walk_time,
+        'walk_calls': walk_calls,
+        'frame_mean': sum(timings) / len(timings),
+        'frame_max': max(timings),
+        'frame_calls': frame_calls
+    }
+
+
+def assign_regions(lumberjack):
+    """Gives a third of the rows an input region on the row, a third one on
+    their first cell, and leaves the rest without, for `--hover`."""
+    regions = lumberjack.treeview._input_regions
+    for n, node in enumerate(lumberjack.walk()):
+        if n % 3 == 0:
+            node.input_region = regions[n % len(regions)]
+        elif n % 3 == 1:
+            node.columns['name'].input_region = regions[n % len(regions)]
+
+
+def hover_benchmark(lumberjack, server_class, count, shape, passes=5):
+    """Builds a tree with input regions and hit-tests every cell of every row
+    against every region, `passes` times. Returns the best time per call."""
+    build_tree(lumberjack, count, shape)
+    assign_regions(lumberjack)
+
+    loop = DrawLoop(server_class)
+    loop.walk_shape()
+    best = min(loop.hover_sweep() for n in range(passes))
+    lumberjack.treeview.removeListenerClient(loop)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--shape', nargs='+', default=['flat', 'balanced', 'deep'])
+    parser.add_argument('--frames', type=int, default=50)
+    parser.add_argument('--rows', type=int, default=40, help='visible rows in the viewport')
+    parser.add_argument('--columnar', action='store_true', help='use the columnar backend')
+    parser.add_argument('--hover', action='store_true',
+                        help='only time treeview_IsInputRegion across every cell of every row')
+    args = parser.parse_args(argv)
+
+    lumberjack = bless(args.columnar)
+    server_class = lx.servers[COLUMNAR_SERVER_NAME if args.columnar else SERVER_NAME][0]
+
+    for count in args.nodes:
+        for shape in args.shape:
+            if args.hover:
+                seconds, calls = hover_benchmark(lumberjack, server_class, count, shape)
+                print('%8d nodes %-9s hover sweep %7.3fs  %d IsInputRegion calls  %6.2fus/call' % (
+                    count, shape, seconds, calls, seconds / calls * 1e6))
+                continue
+
+            result = benchmark(lumberjack, server_class, count, shape, args.frames, args.rows)
+            calls = result['frame_calls']
+            print('%(nodes)8d nodes %(shape)-9s build %(build)7.3fs  walk %(walk)7.3fs '
+                  '(%(walk_calls)d calls)  frame %(frame_mean_ms)6.2fms mean %(frame_max_ms)6.2fms max' % dict(
+                      result, frame_mean_ms=result['frame_mean'] * 1000, frame_max_ms=result['frame_max'] * 1000))
+            print('%28s calls/frame %d: %s' % ('', sum(calls.values()), ', '.join(
+                '%s %d' % (name, calls[name]) for name in sorted(calls))))
+
+
+if __name__ == '__main__':
+    main()
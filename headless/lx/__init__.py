@@ -0,0 +1,51 @@
+# python
+
+"""Headless stand-in for MODO's `lx` module.
+
+Lumberjack imports `lx` and `lxifc` at import time, which means none of it
+can be loaded outside of MODO. Put the `headless` folder on `sys.path` ahead
+of everything else and these modules will stand in for the real thing, so that
+trees can be built, blessed, walked and timed on a plain Python 2.7 install.
+
+Only the parts of the SDK that Lumberjack actually touches are faked. Every
+call that goes through one of the `lx.object` wrappers is tallied in
+`lx.calls`, keyed by the server method name (e.g. `tree_Count`), which is
+how the draw-loop simulator measures calls per frame."""
+
+import sys
+from collections import defaultdict
+
+import symbol
+import object
+import service
+
+
+# Tally of every server method invoked through an `lx.object` wrapper,
+# e.g. {'tree_Count': 12, 'attr_GetString': 240}. Reset with `reset_calls()`.
+calls = defaultdict(int)
+
+# Everything passed to `lx.bless()`, keyed by server name: {name: (class, tags)}
+servers = {}
+
+
+class NotImpl(Exception):
+    """Raised by `lx.notimpl()`. MODO treats this as LXe_NOTIMPL and falls
+    back on whatever default behavior the interface has."""
+    pass
+
+
+def notimpl():
+    raise NotImpl()
+
+
+def out(*args):
+    sys.stdout.write(" ".join(str(arg) for arg in args) + "\n")
+
+
+def bless(cls, name, tags=None):
+    """Records the server instead of registering it with MODO."""
+    servers[name] = (cls, tags or {})
+
+
+def reset_calls():
+    calls.clear()
@@ -0,0 +1,109 @@
+# python
+
+"""The subset of `lx.object` used by Lumberjack.
+
+In MODO, `lx.object.Tree(obj)` and friends wrap a COM object and expose its
+interface methods without their server prefix, so `Tree.Count()` lands in
+`tree_Count()` on the Python server. The wrappers here do the same thing for
+plain Python instances and tally each call in `lx.calls`."""
+
+import lx
+
+
+class _Interface(object):
+    """Wraps a server instance and forwards unprefixed method names to it."""
+
+    _prefix = ""
+
+    def __init__(self, obj=None):
+        self._obj = None
+        if obj is not None:
+            self.set(obj)
+
+    def set(self, obj):
+        if isinstance(obj, _Interface):
+            obj = obj._obj
+        self._obj = obj
+
+    def test(self):
+        return self._obj is not None
+
+    def __peekobj__(self):
+        return self._obj
+
+    def __getattr__(self, name):
+        method_name = self._prefix + name
+        method = getattr(self._obj, method_name)
+        calls = lx.calls
+
+        def call(*args):
+            calls[method_name] += 1
+            return method(*args)
+
+        return call
+
+
+class Tree(_Interface):
+    _prefix = "tree_"
+
+
+class TreeView(_Interface):
+    _prefix = "treeview_"
+
+
+class Attributes(_Interface):
+    _prefix = "attr_"
+
+
+class TreeListener(_Interface):
+    _prefix = "tlist_"
+
+
+class Drop(_Interface):
+    _prefix = "drop_"
+
+
+class ValueStore(object):
+    """Backing storage for a value array, as returned by
+    `lx.service.Command().CreateQueryObject()`."""
+
+    def __init__(self, datatype=None):
+        self.datatype = datatype
+        self.values = []
+
+
+class ValueArray(object):
+    """Shares its storage with whatever it is `set()` to, like the COM original."""
+
+    def __init__(self, store=None):
+        self._store = ValueStore()
+        if store is not None:
+            self.set(store)
+
+    def set(self, store):
+        if isinstance(store, ValueArray):
+            store = store._store
+        self._store = store
+
+    def Count(self):
+        return len(self._store.values)
+
+    def AddString(self, value):
+        self._store.values.append(str(value))
+
+    def GetString(self, index):
+        return self._store.values[index]
+
+
+class AddDropAction(object):
+    """Collects the actions offered by a drop server's `drop_ActionList()`."""
+
+    def __init__(self):
+        self.actions = []
+
+    def set(self, obj):
+        if isinstance(obj, AddDropAction):
+            self.actions = obj.actions
+
+    def AddAction(self, action, message):
+        self.actions.append((action, message))
@@ -0,0 +1,12 @@
+# python
+
+"""The subset of `lx.service` used by Lumberjack."""
+
+import object as lxobject
+
+
+class Command:
+
+    def CreateQueryObject(self, datatype):
+        """Returns an empty value store, as consumed by `lx.object.ValueArray().set()`."""
+        return lxobject.ValueStore(datatype)
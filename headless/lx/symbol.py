@@ -0,0 +1,28 @@
+# python
+
+"""The subset of `lx.symbol` constants used by Lumberjack."""
+
+# Server tags
+sSRV_USERNAME = "server.username"
+sTREEVIEW_TYPE = "treeview.type"
+sINMAP_DEFINE = "inmap.define"
+sDROP_SOURCETYPE = "drop.sourceType"
+sDROP_ACTIONNAMES = "drop.actionNames"
+
+# Value types
+sTYPE_STRING = "string"
+sTYPE_FLOAT = "float"
+sTYPE_INTEGER = "integer"
+sTYPE_BOOLEAN = "boolean"
+
+# `tree_Spawn()` modes
+iTREE_CURRENT = 0
+iTREE_PARENT = 1
+iTREE_CHILD = 2
+iTREE_ROOT = 3
+
+# `treeview_Select()` modes
+iTREEVIEW_SELECT_PRIMARY = 0
+iTREEVIEW_SELECT_ADD = 1
+iTREEVIEW_SELECT_REMOVE = 2
+iTREEVIEW_SELECT_CLEAR = 3
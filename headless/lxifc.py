@@ -0,0 +1,30 @@
+# python
+
+"""Headless stand-in for MODO's `lxifc` module.
+
+The real interface base classes are old-style classes that only exist so that
+MODO can find the prefixed methods on a blessed server. These do the same."""
+
+
+class TreeView:
+    pass
+
+
+class Tree:
+    pass
+
+
+class ListenerPort:
+    pass
+
+
+class Attributes:
+    pass
+
+
+class TreeListener:
+    pass
+
+
+class Drop:
+    pass
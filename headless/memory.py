@@ -0,0 +1,92 @@
+# python
+
+"""Memory benchmark for Lumberjack trees.
+
+Fills the BourbonTree example kit with generated rows and reports:
+
+- bytes per node, counting every object reachable from the tree (nodes, cells,
+  containers, styles, values) exactly once
+- garbage-collector-tracked objects per node
+- the time taken by a full `gc.collect()` pass with the tree alive
+
+Usage (Python 2.7, like MODO):
+
+    python2 headless/memory.py --nodes 200000
+
+Run it against two checkouts to compare representations."""
+
+import argparse
+import gc
+import sys
+import types
+from timeit import default_timer as clock
+
+import drawloop
+
+
+# Shared, long-lived objects that aren't part of any one tree.
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType,
+                  types.BuiltinFunctionType, property, staticmethod, classmethod)
+
+
+def deep_size(root):
+    """Returns (bytes, object count) for everything reachable from `root`."""
+    seen = set()
+    stack = [root]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SKIPPED_TYPES):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(gc.get_referents(obj))
+    return size, len(seen)
+
+
+def measure(lumberjack, count, shape):
+    lumberjack.clear()
+    gc.collect()
+    tracked_before = len(gc.get_objects())
+
+    drawloop.build_tree(lumberjack, count, shape)
+
+    gc.collect()
+    tracked = len(gc.get_objects()) - tracked_before
+
+    # Class-level state (controller, column definitions) isn't reachable from
+    # the nodes themselves, so only the tree is counted.
+    size, objects = deep_size(lumberjack.root)
+
+    start = clock()
+    gc.collect()
+    collect_time = clock() - start
+
+    return {
+        'nodes': count,
+        'shape': shape,
+        'bytes_per_node': size / float(count),
+        'objects_per_node': objects / float(count),
+        'tracked_per_node': tracked / float(count),
+        'collect': collect_time
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[200000])
+    parser.add_argument('--shape', nargs='+', default=['flat', 'balanced'])
+    parser.add_argument('--columnar', action='store_true', help='use the columnar backend')
+    args = parser.parse_args(argv)
+
+    lumberjack = drawloop.bless(args.columnar)
+
+    for count in args.nodes:
+        for shape in args.shape:
+            print('%(nodes)8d nodes %(shape)-9s %(bytes_per_node)7.0f bytes/node  '
+                  '%(objects_per_node)5.1f objects/node  %(tracked_per_node)5.1f gc-tracked/node  '
+                  'gc.collect() %(collect).3fs' % measure(lumberjack, count, shape))
+
+
+if __name__ == '__main__':
+    main()
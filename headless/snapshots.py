@@ -0,0 +1,196 @@
+# python
+
+"""Snapshot benchmark for Lumberjack trees.
+
+Builds the BourbonTree example kit's tree from generated rows the way a kit
+would at startup, then saves it with `Lumberjack().save_snapshot()` and
+reloads it with `load_snapshot()`, and reports:
+
+- the time to build the tree with `add_child()` calls, as `drawloop` does
+- the time to build it with one `add_children()` call per parent
+- the time to save and to load the snapshot, and its size on disk
+
+Every load is checked against the tree it was saved from.
+
+With `--mapped`, a `ColumnarLumberjack` catalog of collapsed folders is
+written with `save_snapshot()` and opened with `map_snapshot()` instead, and
+the time to map it and draw the first frame is compared with rebuilding it,
+along with the resident memory it takes (on Linux).
+
+Usage (Python 2.7, like MODO):
+
+    python2 headless/snapshots.py --nodes 50000 200000
+    python2 headless/snapshots.py --mapped --nodes 1000000"""
+
+import argparse
+import gc
+import lx
+import os
+import resource
+import shutil
+import tempfile
+from timeit import default_timer as clock
+
+import drawloop
+
+
+def rows(count, shape, fanout=10):
+    """Returns {parent position: ([positions], [rows])} for the tree
+    `drawloop.build_tree()` builds, positions counting nodes from 1 in the
+    order it creates them, 0 being the root."""
+    children = {}
+    depth = fanout * 10
+    for n in range(count):
+        if shape == 'flat':
+            parent = 0
+        elif shape == 'balanced':
+            parent = n // fanout
+        elif shape == 'deep':
+            parent = 0 if n % depth == 0 else n
+        else:
+            raise ValueError('Unknown tree shape: %s' % shape)
+        positions, parent_rows = children.setdefault(parent, ([], []))
+        positions.append(n + 1)
+        parent_rows.append(('Bourbon %d' % n, 10 + (n % 9000) / 100.0))
+    return children
+
+
+def build_bulk(lumberjack, children):
+    """Builds the same tree as `drawloop.build_tree()` with `add_children()`."""
+    lumberjack.clear()
+    nodes = {0: lumberjack.root}
+    # Parents always come before their children.
+    for parent in sorted(children):
+        positions, parent_rows = children[parent]
+        for position, node in zip(positions, lumberjack.add_children(nodes[parent], parent_rows)):
+            node.add_state_flag(drawloop.fEXPANDED)
+            nodes[position] = node
+    lumberjack.rebuild_view()
+
+
+def contents(lumberjack):
+    return [(node.path, node.state, node.columns['name'].value, node.columns['price'].value)
+            for node in lumberjack.walk()]
+
+
+def timed(function, *args):
+    gc.collect()
+    start = clock()
+    result = function(*args)
+    return clock() - start, result
+
+
+def measure(lumberjack, count, shape, path):
+    replay, _ = timed(drawloop.build_tree, lumberjack, count, shape)
+    bulk, _ = timed(build_bulk, lumberjack, rows(count, shape))
+    expected = contents(lumberjack)
+
+    save, _ = timed(lumberjack.save_snapshot, path)
+    lumberjack.clear()
+    load, loaded = timed(lumberjack.load_snapshot, path)
+
+    if loaded != count or contents(lumberjack) != expected:
+        raise Exception('Snapshot of %d %s nodes did not load back the same tree.' % (count, shape))
+
+    return {
+        'nodes': count,
+        'shape': shape,
+        'replay': replay,
+        'bulk': bulk,
+        'save': save,
+        'load': load,
+        'size': os.path.getsize(path)
+    }
+
+
+def resident_bytes():
+    """Current resident memory of the process, or None where unknown."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        return None
+
+
+def build_catalog(lumberjack, count, folder_size=1000):
+    """Fills a `ColumnarLumberjack` with `count` rows in collapsed folders."""
+    lumberjack.clear()
+    folders = lumberjack.add_children(None, [('Folder %d' % n, 0.0) for n in range(0, count, folder_size)])
+    for n, folder in enumerate(folders):
+        first = n * folder_size
+        folder.add_children([('Preset %d' % m, m / 100.0) for m in range(first, min(first + folder_size, count))])
+    lumberjack.rebuild_view()
+
+
+def first_frame(lumberjack):
+    """Walks the shape and draws one frame, as MODO does when a view opens."""
+    server_class = lx.servers[drawloop.COLUMNAR_SERVER_NAME][0]
+    loop = drawloop.DrawLoop(server_class)
+    loop.draw_frame()
+    lumberjack.treeview.removeListenerClient(loop)
+
+
+def measure_mapped(lumberjack, count, path):
+    build, _ = timed(build_catalog, lumberjack, count)
+    lumberjack.save_snapshot(path)
+    lumberjack.clear()
+    gc.collect()
+
+    before = resident_bytes()
+    start = clock()
+    lumberjack.map_snapshot(path)
+    opened = clock() - start
+    first_frame(lumberjack)
+    mapped = clock() - start
+    after = resident_bytes()
+
+    if len(lumberjack.root.children) != (count + 999) // 1000:
+        raise Exception('Mapped catalog of %d rows did not open with every folder.' % count)
+    lumberjack.clear()
+
+    return {
+        'nodes': count,
+        'build': build,
+        'open': opened,
+        'mapped': mapped,
+        'size': os.path.getsize(path),
+        'resident': None if before is None else after - before
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[50000, 200000])
+    parser.add_argument('--shape', nargs='+', default=['flat', 'balanced', 'deep'])
+    parser.add_argument('--mapped', action='store_true',
+                        help='map a read-only columnar catalog instead of loading a tree')
+    args = parser.parse_args(argv)
+
+    lumberjack = drawloop.bless(args.mapped)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'tree.snapshot')
+
+    try:
+        if args.mapped:
+            for count in args.nodes:
+                result = measure_mapped(lumberjack, count, path)
+                print('%(nodes)8d rows  build %(build)6.3fs  map %(open_ms)6.2fms  map + first frame '
+                      '%(mapped_ms)6.2fms  %(size_mb)6.1fMB file  %(resident_kb)s resident after mapping' % dict(
+                          result, open_ms=result['open'] * 1000, mapped_ms=result['mapped'] * 1000,
+                          size_mb=result['size'] / 1048576.0,
+                          resident_kb='?' if result['resident'] is None else '%dKB' % (result['resident'] // 1024)))
+            return
+
+        for count in args.nodes:
+            for shape in args.shape:
+                result = measure(lumberjack, count, shape, path)
+                print('%(nodes)8d nodes %(shape)-9s add_child %(replay)6.3fs  add_children %(bulk)6.3fs  '
+                      'save %(save)6.3fs  load %(load)6.3fs  %(size_mb)5.1fMB  '
+                      'load is %(speedup).1fx faster than add_child' % dict(
+                          result, size_mb=result['size'] / 1048576.0, speedup=result['replay'] / result['load']))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+# python
+
+"""Behavior tests for Lumberjack, run against the BourbonTree example kit
+blessed the same way as in MODO (see `drawloop`).
+
+Only one Lumberjack can be blessed per process, so every test starts by
+clearing the shared tree and its column indexes.
+
+Usage (Python 2.7, like MODO):
+
+    python2 headless/tests.py"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import drawloop
+
+from bourbon.lumberjack import Lumberjack, TreeNode, TreeValue, Journal, ColumnStore, ColumnarNode
+from bourbon.lumberjack import ColumnIndex, HashIndex, SortedIndex, PrefixIndex
+from bourbon.lumberjack import fTREE_VIEW_ITEM_EXPAND, mROW_COLOR
+
+lumberjack = drawloop.bless()
+
+
+class LumberjackTest(unittest.TestCase):
+
+    def setUp(self):
+        self.lumberjack = lumberjack
+        Lumberjack._column_indexes = {}
+        lumberjack.clear()
+
+    def tearDown(self):
+        Lumberjack._column_indexes = {}
+        lumberjack.clear()
+
+    def add(self, name, parent=None):
+        node = self.lumberjack.add_child(parent=parent) if parent else self.lumberjack.add_child()
+        node.columns['name'].value = name
+        return node
+
+    def names(self, nodes):
+        return [node.columns['name'].value for node in nodes]
+
+
+class IndexTest(LumberjackTest):
+
+    def build(self):
+        return [self.add(name) for name in 'abcd']
+
+    def assertOrder(self, siblings, names):
+        self.assertEqual(self.names(siblings), list(names))
+        self.assertEqual([node.index for node in siblings], range(len(siblings)))
+
+    def test_negative_index(self):
+        a, b, c, d = self.build()
+        a.index = -1
+        self.assertOrder(self.lumberjack.root.children, 'bcad')
+        d.index = -10
+        self.assertOrder(self.lumberjack.root.children, 'dbca')
+
+    def test_index_past_end(self):
+        a, b, c, d = self.build()
+        a.index = 10
+        self.assertOrder(self.lumberjack.root.children, 'bcda')
+        c.index = 3
+        self.assertOrder(self.lumberjack.root.children, 'bdac')
+
+
+class FindTest(LumberjackTest):
+
+    def build(self):
+        a = self.add('x')
+        attribute = a.add_attribute()
+        attribute.columns['name'].value = 'x'
+        c = self.add('x', a)
+        self.add('y', c)
+
+        # Never part of the tree.
+        tail_command = self.lumberjack.create_child_node()
+        tail_command.columns['name'].value = 'x'
+        self.lumberjack.root.tail_commands = [tail_command]
+        TreeNode().columns['name'].value = 'x'
+        return a, c
+
+    def test_indexed_find_matches_scan(self):
+        a, c = self.build()
+        scanned = self.lumberjack.find('name', 'x')
+        self.assertEqual(scanned, [a, c])
+
+        Lumberjack._column_indexes = {'name': (HashIndex(), SortedIndex(), PrefixIndex())}
+        self.lumberjack.clear()
+        a, c = self.build()
+        self.assertEqual(self.lumberjack.find('name', 'x'), [a, c])
+        self.assertEqual(self.lumberjack.find('name', '^x$', regex=True), [a, c])
+        self.assertEqual(set(self.lumberjack.find_range('name', 'x', 'x')), set([a, c]))
+        self.assertEqual(set(self.lumberjack.find_prefix('name', 'x')), set([a, c]))
+        self.assertEqual(a.find_in_descendants('name', 'x'), [c])
+
+    def test_index_follows_edits(self):
+        Lumberjack._column_indexes = {'name': (HashIndex(),)}
+        a, c = self.build()
+        c.columns['name'].value = 'z'
+        self.assertEqual(self.lumberjack.find('name', 'x'), [a])
+        self.assertEqual(self.lumberjack.find('name', 'z'), [c])
+
+        c.delete()
+        self.assertEqual(self.lumberjack.find('name', 'z'), [])
+        self.assertEqual(self.names(self.lumberjack.find('name', 'y')), ['y'])
+
+        a.delete_descendants()
+        self.assertEqual(self.lumberjack.find('name', 'y'), [])
+
+        new = self.lumberjack.add_children(a, [('x',), ('w',)])
+        self.assertEqual(self.lumberjack.find('name', 'x'), [a, new[0]])
+
+        self.lumberjack.reconcile(None, [{'name': 'x'}, {'name': 'v', 'children': [{'name': 'u'}]}], key='name')
+        self.assertEqual(self.names(self.lumberjack.find('name', 'u')), ['u'])
+
+    def test_base_index_tracks_nodes(self):
+        Lumberjack._column_indexes = {'name': (ColumnIndex(),)}
+        a, c = self.build()
+        c.columns['name'].value = 'z'
+        self.assertEqual(set(Lumberjack._column_indexes['name'][0].nodes()), set([a, c, c.children[0]]))
+        c.delete()
+        self.assertEqual(len(Lumberjack._column_indexes['name'][0]), 2)
+
+
+class DragTest(LumberjackTest):
+
+    def drag(self):
+        treeview = self.lumberjack.treeview
+        source_type = treeview.treeview_SupportedDragDropSourceTypes(0)
+        if not source_type:
+            return None
+        # The drop server's key comes first, then the ids of the dragged nodes.
+        payload = treeview.treeview_GetDragDropSourceObject(0, source_type)
+        return [payload.GetString(n) for n in range(1, payload.Count())]
+
+    def test_drag_offers_the_payload_nodes(self):
+        a = self.add('a')
+        b = self.add('b', a)
+        attribute = a.add_attribute()
+        self.assertEqual(self.drag(), None)
+
+        self.lumberjack.select([attribute])
+        self.assertEqual(self.drag(), None)
+
+        self.lumberjack.select([attribute, b, a])
+        self.assertEqual(self.drag(), [str(a.id), str(b.id)])
+
+
+class FilterTest(LumberjackTest):
+
+    def build(self):
+        fruit = self.add('fruit')
+        for name in ('apple', 'berry', 'cherry'):
+            self.add(name, fruit)
+        return fruit
+
+    def test_refining_matches_full_search(self):
+        self.build()
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'r')), ['fruit', 'berry', 'cherry'])
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'rr')), ['berry', 'cherry'])
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'err')), ['berry', 'cherry'])
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'che')), ['cherry'])
+
+    def test_refining_after_rename(self):
+        fruit = self.build()
+        self.lumberjack.filter('name', 'a')
+        fruit.children[1].columns['name'].value = 'apricot'
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'ap')), ['apple', 'apricot'])
+
+    def test_refining_after_replacing_columns(self):
+        fruit = self.build()
+        self.lumberjack.filter('name', 'a')
+        berry = fruit.children[1]
+        berry.columns = dict(berry.columns, name=TreeValue(value='banana'))
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'an')), ['banana'])
+
+    def test_refining_after_add(self):
+        fruit = self.build()
+        self.lumberjack.filter('name', 'ap')
+        self.add('apex', fruit)
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'ape')), ['apex'])
+
+    def test_refining_after_move(self):
+        fruit = self.build()
+        self.lumberjack.filter('name', 'e')
+        self.lumberjack.move_nodes([fruit.children[0]], self.lumberjack.root, 0)
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'e')), ['apple', 'berry', 'cherry'])
+        self.assertEqual(self.names(self.lumberjack.filter('name', 'er')), ['berry', 'cherry'])
+        self.lumberjack.clear_filter()
+        self.assertFalse(self.lumberjack.filtered)
+
+
+class SnapshotTest(LumberjackTest):
+
+    def setUp(self):
+        super(SnapshotTest, self).setUp()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'tree.snapshot')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        super(SnapshotTest, self).tearDown()
+
+    def contents(self):
+        return [(node.path, node.is_attribute, node.state, node.row_color, node.meta,
+                 node.columns['name'].value, node.columns['name'].tooltip)
+                for node in self.lumberjack.walk(attributes=True)]
+
+    def build(self):
+        a = self.add('a')
+        a.row_color = 'red'
+        a.meta['note'] = (1, 2.5, u'three')
+        b = self.add('b', a)
+        b.columns['name'].tooltip = 'tip'
+        attribute = a.add_attribute()
+        attribute.columns['name'].value = 'attribute'
+        self.add('c')
+        self.lumberjack.select([b])
+        return a, b
+
+    def test_round_trip(self):
+        self.build()
+        expected = self.contents()
+        saved = self.lumberjack.save_snapshot(self.path)
+
+        self.lumberjack.clear()
+        self.assertEqual(self.lumberjack.load_snapshot(self.path), saved)
+        self.assertEqual(self.contents(), expected)
+        self.assertEqual(self.names(self.lumberjack.selected), ['b'])
+        self.assertEqual(self.names([self.lumberjack.primary]), ['b'])
+
+    def test_failed_save_keeps_previous_snapshot(self):
+        self.build()
+        expected = self.contents()
+        self.lumberjack.save_snapshot(self.path)
+
+        self.add('unsaveable').columns['name'].value = object()
+        self.assertRaises(Exception, self.lumberjack.save_snapshot, self.path)
+        self.assertEqual(os.listdir(self.directory), ['tree.snapshot'])
+
+        self.lumberjack.clear()
+        self.lumberjack.load_snapshot(self.path)
+        self.assertEqual(self.contents(), expected)
+
+
+class UndoTest(LumberjackTest):
+
+    def setUp(self):
+        super(UndoTest, self).setUp()
+        type(self.lumberjack).undo_budget = 1000
+        Lumberjack._journal = TreeValue._journal = Journal(self.lumberjack)
+        self.build()
+
+    def build(self):
+        self.fruit, self.veg = self.add('fruit'), self.add('veg')
+        for name in ('apple', 'berry', 'cherry'):
+            self.add(name, self.fruit)
+        leek = self.add('leek', self.veg)
+        for name in ('size', 'colour'):
+            leek.add_attribute().columns['name'].value = name
+        self.lumberjack.journal.clear()
+
+    def tearDown(self):
+        type(self.lumberjack).undo_budget = None
+        Lumberjack._journal = TreeValue._journal = None
+        super(UndoTest, self).tearDown()
+
+    def contents(self):
+        return [(node.path, node.is_attribute, node.row_color, node.columns['name'].value)
+                for node in self.lumberjack.walk(attributes=True)]
+
+    def added(self, name, parent):
+        # Adding and naming a node are separate edits unless grouped.
+        with self.lumberjack.transaction('Add'):
+            return self.add(name, parent)
+
+    def assertRoundTrips(self, edit):
+        before = self.contents()
+        edit()
+        after = self.contents()
+        self.assertNotEqual(before, after)
+
+        self.assertTrue(self.lumberjack.undo())
+        self.assertEqual(self.contents(), before)
+        self.assertTrue(self.lumberjack.redo())
+        self.assertEqual(self.contents(), after)
+        self.assertTrue(self.lumberjack.undo())
+        self.assertEqual(self.contents(), before)
+
+    def test_edits_round_trip(self):
+        apple, berry, cherry = self.fruit.children
+        leek = self.veg.children[0]
+        self.assertRoundTrips(lambda: setattr(berry.columns['name'], 'value', 'blueberry'))
+        self.assertRoundTrips(lambda: setattr(self.fruit, 'row_color', 'red'))
+        self.assertRoundTrips(lambda: self.added('date', self.fruit))
+        self.assertRoundTrips(lambda: self.lumberjack.add_children(self.veg, [('kale',), ('okra',)], 0))
+        self.assertRoundTrips(lambda: leek.add_attribute())
+        self.assertRoundTrips(berry.delete)
+        # Deleting a node moves its children up into its place.
+        self.assertRoundTrips(self.fruit.delete)
+        self.assertRoundTrips(leek.attributes[0].delete)
+        self.assertRoundTrips(self.fruit.delete_descendants)
+        self.assertRoundTrips(leek.delete_attributes)
+        self.assertRoundTrips(lambda: setattr(cherry, 'index', 0))
+        self.assertRoundTrips(lambda: setattr(apple, 'path', [1, 0]))
+        self.assertRoundTrips(lambda: self.lumberjack.move_nodes([cherry, leek], self.fruit, 1))
+        self.assertRoundTrips(lambda: setattr(leek.attributes[0], 'index', 1))
+        self.assertFalse(self.lumberjack.journal.can_undo)
+
+    def test_undo_keeps_indexes_and_ids(self):
+        Lumberjack._column_indexes = {'name': (HashIndex(),)}
+        self.lumberjack.clear()
+        self.build()
+        berry = self.fruit.children[1]
+        berry_id = berry.id
+
+        self.fruit.delete_descendants()
+        self.assertEqual(self.lumberjack.find('name', 'berry'), [])
+        self.assertEqual(self.lumberjack.node_for_id(berry_id), None)
+
+        self.lumberjack.undo()
+        self.assertEqual(self.lumberjack.find('name', 'berry'), [berry])
+        self.assertEqual(self.lumberjack.find('name', 'size'), [])
+        self.assertTrue(self.lumberjack.node_for_id(berry_id) is berry)
+
+    def test_transaction_is_one_step(self):
+        before = self.contents()
+        with self.lumberjack.transaction('Tidy'):
+            self.fruit.columns['name'].value = 'fruits'
+            self.fruit.children[0].delete()
+            self.add('fig', self.fruit)
+            self.fruit.row_color = 'green'
+        self.assertEqual(self.lumberjack.journal.undo_label, 'Tidy')
+        self.assertEqual(len(self.lumberjack.journal), 1)
+
+        self.lumberjack.undo()
+        self.assertEqual(self.contents(), before)
+        self.assertEqual(self.lumberjack.journal.redo_label, 'Tidy')
+
+    def test_failed_transaction_rolls_back(self):
+        self.fruit.columns['name'].value = 'fruits'
+        before = self.contents()
+        try:
+            with self.lumberjack.transaction('Broken'):
+                self.veg.columns['name'].value = 'vegetables'
+                self.fruit.delete()
+                self.add('fig')
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(self.contents(), before)
+        self.assertEqual(len(self.lumberjack.journal), 1)
+
+    def test_new_edit_discards_redo(self):
+        self.fruit.columns['name'].value = 'fruits'
+        self.lumberjack.undo()
+        self.veg.columns['name'].value = 'vegetables'
+        self.assertFalse(self.lumberjack.journal.can_redo)
+        self.assertFalse(self.lumberjack.redo())
+
+    def test_budget_evicts_oldest(self):
+        type(self.lumberjack).undo_budget = 3
+        for n in range(5):
+            self.fruit.columns['name'].value = 'fruit %d' % n
+        self.assertEqual(len(self.lumberjack.journal), 3)
+        while self.lumberjack.undo():
+            pass
+        self.assertEqual(self.fruit.columns['name'].value, 'fruit 1')
+
+        self.lumberjack.add_children(self.veg, [('kale',)] * 4)
+        self.assertFalse(self.lumberjack.journal.can_undo)
+        self.assertEqual(self.lumberjack.journal.cost, 0)
+
+
+class StateTest(unittest.TestCase):
+
+    def nodes(self):
+        store = ColumnStore([{'name': 'name'}])
+        row = store.add_rows(0, [('a',)])[0]
+        return TreeNode(), ColumnarNode(store, row)
+
+    def test_state_flags_keep_row_color(self):
+        for node in self.nodes():
+            node.row_color = 'red'
+            node.add_state_flag(fTREE_VIEW_ITEM_EXPAND | mROW_COLOR)
+            self.assertEqual(node.row_color, 'red')
+            self.assertTrue(node.state & fTREE_VIEW_ITEM_EXPAND)
+
+            node.state = mROW_COLOR
+            self.assertEqual(node.row_color, 'red')
+            self.assertFalse(node.state & fTREE_VIEW_ITEM_EXPAND)
+
+
+class ColumnStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ColumnStore([{'name': 'name'}, {'name': 'note'}])
+
+    def cells(self, rows):
+        return [tuple(self.store._values[n][row] for n in range(2)) for row in rows]
+
+    def positions(self):
+        siblings = self.store._children[0]
+        self.assertEqual([self.store._positions[row] for row in siblings], range(len(siblings)))
+        return [self.store._values[0][row] for row in siblings]
+
+    def test_short_rows_get_defaults(self):
+        short = self.store.add_rows(0, [('x',), ('y',)])
+        full = self.store.add_rows(0, [('p', 'q')])
+        mixed = self.store.add_rows(0, [('r',), {'note': 's'}])
+        self.assertEqual(self.cells(short + full + mixed),
+                         [('x', None), ('y', None), ('p', 'q'), ('r', None), (None, 's')])
+
+    def test_move_row(self):
+        a, b, c, d = self.store.add_rows(0, [(name,) for name in 'abcd'])
+        self.store.move_row(a, -1)
+        self.assertEqual(self.positions(), list('bcad'))
+        self.store.move_row(b, 10)
+        self.assertEqual(self.positions(), list('cadb'))
+        self.store.move_row(b, -10)
+        self.assertEqual(self.positions(), list('bcad'))
+
+    def test_find_in_descendants_is_in_tree_order(self):
+        a, b, c, d = self.store.add_rows(0, [('x',), ('y',), ('y',), ('x',)])
+        e = self.store.add_rows(c, [('x',)])[0]
+        f = self.store.add_rows(0, [('x',)], 0)[0]
+        self.store.move_row(d, 1)
+        self.store.delete_row(b)
+
+        def found(row):
+            return [node._row for node in ColumnarNode(self.store, row).find_in_descendants('name', 'x')]
+
+        self.assertEqual(found(0), [f, d, a, e])
+        self.assertEqual(found(c), [e])
+
+
+if __name__ == '__main__':
+    unittest.main()
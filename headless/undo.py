@@ -0,0 +1,120 @@
+# python
+
+"""Undo benchmark for Lumberjack trees.
+
+Fills the BourbonTree example kit with generated rows, with an `undo_budget`
+so that edits are journaled, then makes a round of edits (renames, colors,
+adds, deletes and moves) and reports:
+
+- the time to make the edits with the journal recording them
+- the time to undo all of them and to redo all of them
+- the units of history kept, against the budget
+- the time to `copy.deepcopy()` the tree once, as a copy-before-every-edit
+  scheme would for each of those edits
+
+Every undo and redo is checked against the tree as it was.
+
+Usage (Python 2.7, like MODO):
+
+    python2 headless/undo.py --nodes 10000 100000"""
+
+import argparse
+import copy
+import gc
+import sys
+from timeit import default_timer as clock
+
+import drawloop
+
+
+def contents(lumberjack):
+    return [(node.path, node.row_color, node.columns['name'].value) for node in lumberjack.walk()]
+
+
+def edit(lumberjack, edits):
+    """Makes `edits` edits of every kind, spread out over the tree, each one
+    its own transaction."""
+    parents = [node for node in lumberjack.walk() if node._children]
+    for n in range(edits):
+        parent = parents[(n * 7) % len(parents)]
+        dest = parents[(n * 11) % len(parents)]
+        kind = n % 5 if parent.children else 2
+        if kind == 4 and (dest is parent.children[0] or dest.is_descendant_of(parent.children[0])):
+            kind = 0
+
+        if kind == 0:
+            parent.children[0].columns['name'].value = 'Edited %d' % n
+        elif kind == 1:
+            parent.row_color = 'orange'
+        elif kind == 2:
+            with lumberjack.transaction('Add'):
+                node = parent.add_child()
+                node.columns['name'].value = 'Added %d' % n
+        elif kind == 3:
+            parent.children[-1].delete()
+        else:
+            lumberjack.move_nodes([parent.children[0]], dest, 0)
+
+
+def timed(function, *args):
+    gc.collect()
+    start = clock()
+    result = function(*args)
+    return clock() - start, result
+
+
+def measure(lumberjack, count, edits):
+    lumberjack.clear()
+    drawloop.build_tree(lumberjack, count, 'balanced')
+    lumberjack.journal.clear()
+    before = contents(lumberjack)
+
+    record, _ = timed(edit, lumberjack, edits)
+    after = contents(lumberjack)
+    kept = len(lumberjack.journal)
+    cost = lumberjack.journal.cost
+
+    undo, _ = timed(lambda: [lumberjack.undo() for n in range(kept)])
+    if kept == edits and contents(lumberjack) != before:
+        raise Exception('Undoing %d edits did not restore the tree of %d nodes.' % (edits, count))
+    redo, _ = timed(lambda: [lumberjack.redo() for n in range(kept)])
+    if contents(lumberjack) != after:
+        raise Exception('Redoing %d edits did not restore the edited tree of %d nodes.' % (edits, count))
+
+    deep_copy, _ = timed(copy.deepcopy, lumberjack.root)
+
+    return {
+        'nodes': count,
+        'edits': edits,
+        'kept': kept,
+        'cost': cost,
+        'record': record,
+        'undo': undo,
+        'redo': redo,
+        'copy': deep_copy
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--nodes', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--edits', type=int, default=1000)
+    parser.add_argument('--budget', type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    # The budget has to be in place before the kit is blessed.
+    from bourbon import BourbonTree
+    BourbonTree.undo_budget = args.budget
+    lumberjack = drawloop.bless()
+
+    # Deep copies recurse through the whole hierarchy.
+    sys.setrecursionlimit(100000)
+
+    for count in args.nodes:
+        result = measure(lumberjack, count, args.edits)
+        print('%(nodes)8d nodes  %(edits)d edits %(record)6.3fs  undo %(undo)6.3fs  redo %(redo)6.3fs  '
+              '%(kept)d kept, %(cost)d units  one deepcopy %(copy)6.3fs' % result)
+
+
+if __name__ == '__main__':
+    main()